@@ -0,0 +1,70 @@
+"""
+Compares parsing into a forest by value against parsing by token class (see `Parser` and `TokenClassifier`), on the
+wide grammars, whose rules are restarted by most values, and on `tests/minpy.grammar`, whose are not.
+
+    python -m benchmarks.classify [--tokens N] [--widths N ...] [--repeat N]
+"""
+
+from .grammars import *
+
+from derpgen.grammar.compile import compile_grammar
+from derpgen.grammar.lexer import compile_lexer
+from derpgen.grammar.parse import parse_tokens
+from derpgen.grammar.pwd import *
+from derpgen.grammar.tokenize import tokenize_text
+from derpgen.utility import ParseSession
+
+from argparse import ArgumentParser
+from json import dumps
+from time import perf_counter
+from typing import Iterator, Tuple
+
+
+def cases(tokens: int, widths: Tuple[int, ...]) -> Iterator[Tuple[str, str, str]]:
+    # Generates the name, the grammar text and the source text of each case.
+    for width in widths:
+        yield f'wide-{width}', wide_grammar(width), wide_source(tokens, width)
+        yield f'fields-{width}', fields_grammar(width), fields_source(tokens // 2, width)
+    with open('tests/minpy.grammar') as f:
+        yield 'minpy', f.read(), minpy_source(tokens)
+
+
+def measure(name: str, grammar_text: str, source: str, classify: bool, repeat: int) -> dict:
+    grammar = parse_tokens(tokenize_text(grammar_text))
+    values = list(compile_lexer(grammar).values(source))
+    seconds = []
+    parses = 0
+    for _ in range(repeat):
+        # Each run starts from a freshly compiled grammar, so that none of its work is shared with the previous one.
+        g = compile_grammar(grammar).start
+        start = perf_counter()
+        parser = Parser(g, ParseSession(forest=True), classify=classify)
+        parser.feed_many(values)
+        forest = parser.forest()
+        seconds.append(perf_counter() - start)
+        parses = 0 if forest is None else count_trees(forest)
+    return {
+        'case': name,
+        'mode': 'class' if classify else 'value',
+        'tokens': len(values),
+        'parses': parses,
+        'seconds': round(min(seconds), 4),
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=1000)
+    parser.add_argument('--widths', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--repeat', type=int, default=3, help='keep the fastest of this many runs')
+    args = parser.parse_args()
+    for name, grammar_text, source in cases(args.tokens, tuple(args.widths)):
+        by_value = measure(name, grammar_text, source, False, args.repeat)
+        by_class = measure(name, grammar_text, source, True, args.repeat)
+        by_class['speedup'] = round(by_value['seconds'] / by_class['seconds'], 2) if by_class['seconds'] else None
+        print(dumps(by_value))
+        print(dumps(by_class))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures the cost of a single dispatch through `match` and `match_pred`, compared to calling the clause function
+directly. The results are printed as JSON, in nanoseconds per call.
+
+    python -m benchmarks.dispatch [--calls N]
+"""
+
+from derpgen.grammar.pwd.grammar import *
+from derpgen.grammar.pwd.tree import Leaf
+from derpgen.utility import match, match_pred
+
+from argparse import ArgumentParser
+from json import dumps
+from timeit import repeat
+
+
+# Tables in the shape of those used by the PwD functions, with clauses doing no work of their own.
+matcher = match({
+    Nil: lambda _, c:          0,
+    Eps: lambda _, c, ts:      1,
+    Tok: lambda _, c, t:       2,
+    Pat: lambda _, c, p:       3,
+    Rep: lambda g_, c, g:      4,
+    Alt: lambda _, c, g1, g2:  5,
+    Seq: lambda _, c, g1, g2:  6,
+    Red: lambda _, c, g, f:    7,
+    Ref: lambda g_, c, n, rd:  8,
+}, Grammar, ('g_', 'c'))
+
+
+pred_matcher = match_pred({
+    Nil: {lambda:           True:                   lambda g_:      g_},
+    Eps: {lambda:           True:                   lambda g_:      g_},
+    Tok: {lambda t:         t is None:              0,
+          lambda:           True:                   lambda g_:      g_},
+    Pat: {lambda:           True:                   lambda g_:      g_},
+    Rep: {lambda:           True:                   lambda g:       g},
+    Alt: {lambda g1:        g1 is None:             0,
+          lambda g2:        g2 is None:             0,
+          lambda:           True:                   lambda g1, g2:  g2},
+    Seq: {lambda g1, g2:    g1 is None or g2 is None: 0,
+          lambda:           True:                   lambda g1, g2:  g2},
+    Red: {lambda:           True:                   lambda g, f:    g},
+    Ref: {lambda:           True:                   lambda g_:      g_},
+}, ('g_',))
+
+
+def direct(g_, c):
+    return 6
+
+
+def measure(calls: int) -> dict:
+    g = Seq(Tok('a'), Alt(Tok('b'), Eps([Leaf('c')])))
+
+    def ns_per_call(stmt: str) -> float:
+        best = min(repeat(stmt, globals={**globals(), 'g': g}, number=calls, repeat=5))
+        return round(best / calls * 1e9, 1)
+
+    return {
+        'calls': calls,
+        'direct_ns': ns_per_call('direct(g, "a")'),
+        'match_ns': ns_per_call('matcher(g, "a")'),
+        'match_pred_ns': ns_per_call('pred_matcher(g)'),
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200_000)
+    args = parser.parse_args()
+    print(dumps(measure(args.calls), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Compares parsing an ambiguous grammar into lists of trees against parsing it into a shared packed parse forest. The
+number of parses grows exponentially with the number of operators, while the forest does not.
+
+    python -m benchmarks.forest [--operators N ...] [--timeout S]
+"""
+
+from .grammars import *
+
+from derpgen.grammar.pwd import *
+from derpgen.utility import ParseSession
+
+from argparse import ArgumentParser
+from json import dumps
+from time import perf_counter
+
+
+def measure(operators: int, forest: bool) -> dict:
+    values = ambiguous_tokens(operators)
+    start = perf_counter()
+    parser = Parser(ambiguous_grammar(), ParseSession(forest=forest))
+    parser.feed_many(values)
+    if forest:
+        f = parser.forest()
+        parses = 0 if f is None else count_trees(f)
+    else:
+        parses = len(parser.finish())
+    return {
+        'mode': 'forest' if forest else 'trees',
+        'operators': operators,
+        'tokens': len(values),
+        'parses': parses,
+        'seconds': round(perf_counter() - start, 4),
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--operators', type=int, nargs='+', default=[4, 8, 10, 12, 20, 28])
+    parser.add_argument('--timeout', type=float, default=2.0,
+                        help='skip larger inputs in a mode once it takes longer than this many seconds')
+    args = parser.parse_args()
+    for forest in (False, True):
+        for operators in args.operators:
+            result = measure(operators, forest)
+            print(dumps(result))
+            if result['seconds'] > args.timeout:
+                break
+
+
+if __name__ == '__main__':
+    main()
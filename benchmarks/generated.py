@@ -0,0 +1,76 @@
+"""
+Compares parsing with a parser module generated from a grammar file (see `derpgen.generate`) against parsing with the
+grammar compiled by `compile_grammar` (see `parse`), on `tests/minpy.grammar`.
+
+    python -m benchmarks.generated [--tokens N ...] [--repeat N]
+"""
+
+from .grammars import *
+
+from derpgen.generate import generate_parser_module
+from derpgen.grammar.compile import compile_grammar
+from derpgen.grammar.lexer import compile_lexer
+from derpgen.grammar.parse import parse_tokens
+from derpgen.grammar.pwd import *
+from derpgen.grammar.tokenize import tokenize_text
+
+from argparse import ArgumentParser
+from json import dumps
+from time import perf_counter
+from types import ModuleType
+from typing import List
+
+
+GRAMMAR_FILE = 'tests/minpy.grammar'
+
+
+def load_generated(source: str) -> ModuleType:
+    # The module is executed from its source, so that no file needs to be written.
+    module = ModuleType('generated')
+    exec(compile(source, f'<generated from {GRAMMAR_FILE}>', 'exec'), module.__dict__)
+    return module
+
+
+def measure(tokens: int, repeat: int) -> List[dict]:
+    with open(GRAMMAR_FILE) as f:
+        grammar = parse_tokens(tokenize_text(f.read()))
+    source = generate_parser_module(GRAMMAR_FILE)
+    values = list(compile_lexer(grammar).values(minpy_source(tokens)))
+    results = []
+    for engine in ('pwd', 'generated'):
+        seconds = []
+        parses = 0
+        for _ in range(repeat):
+            # Each run starts from a freshly built grammar, so that none of its work is shared with the previous one.
+            if engine == 'pwd':
+                g = compile_grammar(grammar).start
+                start = perf_counter()
+                parses = len(parse(values, g))
+            else:
+                module = load_generated(source)
+                start = perf_counter()
+                parses = len(module.parse(values))
+            seconds.append(perf_counter() - start)
+        results.append({
+            'engine': engine,
+            'tokens': len(values),
+            'parses': parses,
+            'seconds': round(min(seconds), 4),
+        })
+    return results
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tokens', type=int, nargs='+', default=[1000, 5000])
+    parser.add_argument('--repeat', type=int, default=3, help='keep the fastest of this many runs')
+    args = parser.parse_args()
+    for tokens in args.tokens:
+        interpreted, generated = measure(tokens, args.repeat)
+        generated['speedup'] = round(interpreted['seconds'] / generated['seconds'], 2) if generated['seconds'] else None
+        print(dumps(interpreted))
+        print(dumps(generated))
+
+
+if __name__ == '__main__':
+    main()
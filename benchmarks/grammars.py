@@ -0,0 +1,174 @@
+"""
+Grammars and input generators for the benchmarks: hand-built PwD grammars with their values, and grammar files (or the
+text of grammars) with their source text.
+"""
+
+from derpgen.grammar.pwd import *
+
+from random import Random
+from re import compile as re_compile
+from typing import Iterator, List
+
+
+__all__ = [
+    'arithmetic_grammar', 'arithmetic_tokens', 'ambiguous_grammar', 'ambiguous_tokens',
+    'identifiers', 'arithmetic_source', 'minpy_source',
+    'LEFT_RECURSION_GRAMMAR', 'left_recursion_source', 'AMBIGUOUS_GRAMMAR', 'ambiguous_source',
+    'wide_grammar', 'wide_source', 'fields_grammar', 'fields_source',
+]
+
+
+def arithmetic_grammar() -> Grammar:
+    """Builds the grammar of `tests/arithmetic.grammar`, taking the tokens' text as values."""
+    d: GrammarDict = {}
+    expr = ref('expr', d)
+    term = ref('term', d)
+    factor = ref('factor', d)
+    d['expr'] = alt(term, seq(expr, alt('+', '-'), term))
+    d['term'] = alt(factor, seq(term, alt('*', '/'), factor))
+    d['factor'] = alt(pat(re_compile(r'-?\d+')), seq('(', expr, ')'))
+    return expr
+
+
+def arithmetic_tokens(n: int, seed: int = 0) -> List[str]:
+    """Generates a random, valid arithmetic expression of at least `n` tokens."""
+    rng = Random(seed)
+    tokens: List[str] = []
+    depth = 0
+    while True:
+        # Each iteration emits an operand, optionally opening or closing groups around it.
+        while rng.random() < 0.2:
+            tokens.append('(')
+            depth += 1
+        tokens.append(str(rng.randrange(100)))
+        while depth and rng.random() < 0.3:
+            tokens.append(')')
+            depth -= 1
+        if len(tokens) >= n:
+            break
+        tokens.append(rng.choice('+-*/'))
+    tokens.extend(')' * depth)
+    return tokens
+
+
+def ambiguous_grammar() -> Grammar:
+    """Builds the grammar `e ::= e OP e | NUM`, the shape of `BinOpExpr` in `tests/minpy.grammar`."""
+    d: GrammarDict = {}
+    e = ref('e', d)
+    d['e'] = alt(seq(e, '+', e), pat(re_compile(r'\d+')))
+    return e
+
+
+def ambiguous_tokens(operators: int) -> List[str]:
+    """Generates an expression with the given number of operators, which has Catalan(`operators`) parses."""
+    return ['1'] + ['+', '1'] * operators
+
+
+########
+# Source text for grammar files and for the text of grammars. Tokens are separated by spaces, so that they are lexed
+# the same way whatever the grammar's tokens.
+########
+
+
+MINPY_KEYWORDS = {'if', 'else', 'while', 'def', 'pass', 'return', 'break', 'continue'}
+
+
+def identifiers(n: int) -> List[str]:
+    """Generates `n` distinct lowercase identifiers, none of which is a keyword of `tests/minpy.grammar`."""
+    names: List[str] = []
+    i = 0
+    while len(names) < n:
+        name = ''
+        k = i
+        while True:
+            name += chr(ord('a') + k % 26)
+            k //= 26
+            if not k:
+                break
+        if name not in MINPY_KEYWORDS:
+            names.append(name)
+        i += 1
+    return names
+
+
+def arithmetic_source(n: int, seed: int = 0) -> str:
+    """Generates the text of an expression of `tests/arithmetic.grammar` of at least `n` tokens."""
+    return ' '.join(arithmetic_tokens(n, seed))
+
+
+def minpy_source(n: int) -> str:
+    """
+    Generates the text of a function of `tests/minpy.grammar` of at least `n` tokens: its body nests a loop, a
+    conditional and a return around calls, whose arguments are distinct identifiers.
+    """
+    names = iter(identifiers(n))
+
+    def arguments(k: int) -> str:
+        return ' , '.join(next(names) for _ in range(k))
+
+    k = max(1, n // 8)
+    return (f"def {next(names)} ( {arguments(k)} ) {{ while {next(names)} ( {arguments(k)} ) {{ "
+            f"if {next(names)} ( {arguments(k)} ) {{ return {next(names)} ( {arguments(k)} ) }} else {{ pass }} }} }}")
+
+
+# Deep left recursion: the trees are chains as long as the input.
+LEFT_RECURSION_GRAMMAR = """%rules%
+
+chain ::= Link chain 'a'
+        | End 'a'
+
+%start% chain
+"""
+
+
+def left_recursion_source(n: int) -> str:
+    return ' '.join('a' * n)
+
+
+# Highly ambiguous: an input with n operators has Catalan(n) parses.
+AMBIGUOUS_GRAMMAR = r"""%rules%
+
+e ::= Add lhs:e '+' rhs:e
+    | Num value:NUM
+
+%tokens%
+
+NUM ^= '\d+'
+
+%start% e
+"""
+
+
+def ambiguous_source(operators: int) -> str:
+    return ' + '.join('1' * (operators + 1))
+
+
+def production_names(width: int) -> Iterator[str]:
+    # Production names cannot contain digits, so they are numbered with letters.
+    return (''.join(chr(ord('a') + (i // 26 ** j) % 26) for j in (2, 1, 0)) for i in range(width))
+
+
+def wide_grammar(width: int) -> str:
+    """Builds the text of a grammar of a repetition of an alternation of `width` keywords."""
+    names = production_names(width)
+    productions = '\n     | '.join(f"K{name} 'k{i}'" for i, name in enumerate(names))
+    return f"%rules%\n\nitems ::= Items items:{{item}}\n\nitem ::= {productions}\n\n%start% items\n"
+
+
+def wide_source(n: int, width: int, seed: int = 0) -> str:
+    rng = Random(seed)
+    return ' '.join(f"k{rng.randrange(width)}" for _ in range(n))
+
+
+def fields_grammar(width: int) -> str:
+    """Builds the text of a grammar of a repetition of `width` kinds of fields, each a keyword followed by a number."""
+    names = production_names(width)
+    productions = '\n     | '.join(f"F{name} 'k{i}' value:NUM" for i, name in enumerate(names))
+    return (f"%rules%\n\nfields ::= Fields fields:{{field}}\n\nfield ::= {productions}\n\n%tokens%\n\nNUM ^= '\\d+'\n\n"
+            f"%start% fields\n")
+
+
+def fields_source(n: int, width: int, seed: int = 0) -> str:
+    """Generates `n` fields of random kinds, whose numbers are all distinct."""
+    rng = Random(seed)
+    return ' '.join(f"k{rng.randrange(width)} {i}" for i in range(n))
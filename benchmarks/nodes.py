@@ -0,0 +1,68 @@
+"""
+Measures grammar node allocations, peak traced memory and peak RSS while parsing arithmetic expressions, with and
+without hash-consing of grammar nodes. Each configuration runs in a fresh interpreter so that peak RSS is meaningful.
+
+    python -m benchmarks.nodes [--tokens N]
+"""
+
+from .grammars import *
+
+from derpgen.grammar.pwd import *
+from derpgen.grammar.pwd.grammar import Grammar
+from derpgen.utility import ParseSession
+
+from argparse import ArgumentParser
+from json import dumps, loads
+from resource import getrusage, RUSAGE_SELF
+from subprocess import check_output
+from sys import executable
+from time import perf_counter
+
+import tracemalloc
+
+
+def measure(tokens: int, hash_cons: bool) -> dict:
+    # Count node constructions by wrapping the shared initializer of all nodes.
+    allocations = 0
+    post_init = Grammar.__post_init__
+
+    def counting_post_init(self):
+        nonlocal allocations
+        allocations += 1
+        post_init(self)
+
+    Grammar.__post_init__ = counting_post_init
+    g = arithmetic_grammar()
+    values = arithmetic_tokens(tokens)
+    tracemalloc.start()
+    start = perf_counter()
+    trees = parse(values, g, ParseSession(hash_cons=hash_cons))
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'hash_cons': hash_cons,
+        'tokens': len(values),
+        'trees': len(trees),
+        'node_allocations': allocations,
+        'peak_traced_bytes': peak,
+        'peak_rss_kb': getrusage(RUSAGE_SELF).ru_maxrss,
+        'seconds': round(elapsed, 4),
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=150)
+    parser.add_argument('--child', choices=('on', 'off'), help='run a single configuration in this process')
+    args = parser.parse_args()
+    if args.child is not None:
+        print(dumps(measure(args.tokens, args.child == 'on')))
+        return
+    for mode in ('off', 'on'):
+        out = check_output([executable, '-m', 'benchmarks.nodes', '--tokens', str(args.tokens), '--child', mode])
+        print(dumps(loads(out)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares recognizing the source text of `tests/arithmetic.grammar` (see `recognize`), which builds no trees, against
+parsing it into a list of trees and into a forest.
+
+    python -m benchmarks.recognize [--tokens N ...] [--repeat N]
+"""
+
+from .grammars import *
+
+from derpgen.grammar.compile import compile_grammar
+from derpgen.grammar.lexer import compile_lexer
+from derpgen.grammar.parse import parse_tokens
+from derpgen.grammar.pwd import *
+from derpgen.grammar.tokenize import tokenize_text
+
+from argparse import ArgumentParser
+from json import dumps
+from time import perf_counter
+from typing import Callable, Dict, List
+
+
+GRAMMAR_FILE = 'tests/arithmetic.grammar'
+
+
+MODES: Dict[str, Callable[[List[str], Grammar], object]] = {
+    'parse': lambda values, g: len(parse(values, g)),
+    'forest': lambda values, g: parse_forest(values, g) is not None,
+    'recognize': lambda values, g: recognize(values, g),
+}
+
+
+def measure(mode: str, tokens: int, repeat: int) -> dict:
+    with open(GRAMMAR_FILE) as f:
+        grammar = parse_tokens(tokenize_text(f.read()))
+    values = list(compile_lexer(grammar).values(arithmetic_source(tokens)))
+    seconds = []
+    result = None
+    for _ in range(repeat):
+        # Each run starts from a freshly compiled grammar, so that none of its work is shared with the previous one.
+        g = compile_grammar(grammar).start
+        start = perf_counter()
+        result = MODES[mode](values, g)
+        seconds.append(perf_counter() - start)
+    return {
+        'mode': mode,
+        'tokens': len(values),
+        'result': result,
+        'seconds': round(min(seconds), 4),
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tokens', type=int, nargs='+', default=[100, 300, 1000])
+    parser.add_argument('--repeat', type=int, default=3, help='keep the fastest of this many runs')
+    args = parser.parse_args()
+    for tokens in args.tokens:
+        results = [measure(mode, tokens, args.repeat) for mode in MODES]
+        baseline = results[0]['seconds']
+        for result in results:
+            result['speedup'] = round(baseline / result['seconds'], 2) if result['seconds'] else None
+            print(dumps(result))
+
+
+if __name__ == '__main__':
+    main()
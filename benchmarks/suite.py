@@ -0,0 +1,267 @@
+"""
+Runs the benchmark suite over the bundled grammars and a few pathological ones, measuring each phase of parsing
+separately: lexing the source, building the grammar (which includes compacting it and solving its FIRST sets, as
+`Parser` does), deriving and compacting for each token, the nullability fixed point of the final derivative, and
+extracting the parses. Unless disabled, the memory used and the size of the derivatives (in nodes, and in nodes gained
+per token) are measured as well. Either engine can be measured: `pwd`, or `cubic` (see `CubicParser`), which compacts
+as it derives, so that its compaction is timed along with its derivation, and which always parses into a forest.
+Results are printed (or written) as JSON.
+Two sets of results can be compared, in which case the metrics which got worse by more than a threshold are reported as
+regressions, and the exit status is 1 if there are any.
+
+    python -m benchmarks.suite [--cases NAME ...] [--engine E] [--scale X] [--repeat N] [--no-memory] [--output FILE]
+    python -m benchmarks.suite --compare BASELINE.json RESULTS.json [--threshold F]
+"""
+
+from .grammars import *
+
+from derpgen.grammar.compile import compile_grammar
+from derpgen.grammar.lexer import compile_lexer
+from derpgen.grammar.parse import parse_tokens
+from derpgen.grammar.pwd import *
+from derpgen.grammar.pwd.cubic import derive_step
+from derpgen.grammar.pwd.stats import measure_grammar
+from derpgen.grammar.tokenize import tokenize_text
+from derpgen.utility import ParseSession
+
+from argparse import ArgumentParser
+from json import dumps, load
+from platform import platform, python_implementation, python_version
+from time import perf_counter
+from typing import Callable, Dict, List, NamedTuple
+
+import sys
+import tracemalloc
+
+
+Case = NamedTuple('Case', [('grammar', Callable[[], str]),
+                           ('source', Callable[[int], str]),
+                           ('size', int),
+                           ('forest', bool)])
+
+
+def read_grammar(grammar_file: str) -> Callable[[], str]:
+    def read() -> str:
+        with open(grammar_file) as f:
+            return f.read()
+    return read
+
+
+# Sizes are in tokens, except for the ambiguous grammar, whose size is its number of operators. Ambiguous parses are
+# extracted from a forest, as there are too many to list.
+CASES: Dict[str, Case] = {
+    'arithmetic': Case(read_grammar('tests/arithmetic.grammar'), arithmetic_source, 300, False),
+    'minpy': Case(read_grammar('tests/minpy.grammar'), minpy_source, 200, False),
+    'left_recursion': Case(lambda: LEFT_RECURSION_GRAMMAR, left_recursion_source, 500, False),
+    'ambiguous': Case(lambda: AMBIGUOUS_GRAMMAR, ambiguous_source, 12, True),
+    'wide': Case(lambda: wide_grammar(200), lambda n: wide_source(n, 200), 300, False),
+}
+
+
+ENGINES = ('pwd', 'cubic')
+
+
+# Metrics compared between runs. For all of them, lower is better.
+COMPARED_METRICS = ('tokenize_s', 'build_s', 'derive_s', 'compact_s', 'nullable_s', 'extract_s', 'total_s',
+                    'peak_traced_bytes', 'max_nodes', 'mean_nodes', 'growth_per_token')
+
+# Time differences below this many seconds are noise, whatever their ratio.
+MIN_SECONDS = 0.002
+
+
+def prepare(g: Grammar, session: ParseSession) -> Grammar:
+    # Compacts a grammar and solves its FIRST sets, as `Parser` does before consuming any value.
+    with session:
+        g = make_compact(g)
+        first_set(g)
+    return g
+
+
+def consume(g: Grammar, c: str, engine: str, position: int) -> Grammar:
+    # Consumes a value in the current session.
+    if engine == 'cubic':
+        return derive_step(g, c, position)
+    return make_compact(derive(g, c))
+
+
+def extract(g: Grammar, forest: bool) -> int:
+    # Extracts the parses of a final derivative in the current session, and counts them.
+    if forest:
+        forests = pack(parse_null_forest(g))
+        return count_trees(forests[0]) if forests else 0
+    return len(parse_null(g))
+
+
+def run_case(case: Case, size: int, engine: str) -> dict:
+    # The grammar's text is parsed and compiled without being checked, as `tests/arithmetic.grammar` declares tokens
+    # it does not use.
+    text = case.grammar()
+    forest = case.forest or engine == 'cubic'
+    session = ParseSession(forest=forest)
+    start = perf_counter()
+    grammar = parse_tokens(tokenize_text(text))
+    g = prepare(compile_grammar(grammar).start, session)
+    build_s = perf_counter() - start
+    lexer = compile_lexer(grammar)
+    source = case.source(size)
+    start = perf_counter()
+    values = list(lexer.values(source))
+    tokenize_s = perf_counter() - start
+    derive_s = compact_s = 0.0
+    for i, c in enumerate(values):
+        with session:
+            start = perf_counter()
+            if engine == 'cubic':
+                g = derive_step(g, c, i)
+                derived = perf_counter()
+            else:
+                d = derive(g, c)
+                derived = perf_counter()
+                g = make_compact(d)
+            compact_s += perf_counter() - derived
+            derive_s += derived - start
+        session.collect()
+    # Nullability is computed in a fresh session, so that none of it is memoized yet.
+    with ParseSession():
+        start = perf_counter()
+        is_nullable(g)
+        nullable_s = perf_counter() - start
+    with session:
+        start = perf_counter()
+        parses = extract(g, forest)
+        extract_s = perf_counter() - start
+    return {
+        'tokens': len(values),
+        'parses': parses,
+        'tokenize_s': tokenize_s,
+        'build_s': build_s,
+        'derive_s': derive_s,
+        'compact_s': compact_s,
+        'nullable_s': nullable_s,
+        'extract_s': extract_s,
+        'total_s': tokenize_s + build_s + derive_s + compact_s + nullable_s + extract_s,
+    }
+
+
+def run_memory(case: Case, size: int, engine: str) -> dict:
+    # Tracing memory slows everything down, so memory and nodes are measured in a separate run from the timings.
+    grammar = parse_tokens(tokenize_text(case.grammar()))
+    values = list(compile_lexer(grammar).values(case.source(size)))
+    forest = case.forest or engine == 'cubic'
+    session = ParseSession(forest=forest)
+    max_nodes = total_nodes = 0
+    tracemalloc.start()
+    try:
+        g = prepare(compile_grammar(grammar).start, session)
+        start_nodes = measure_grammar(g)[0]
+        for i, c in enumerate(values):
+            with session:
+                g = consume(g, c, engine, i)
+            session.collect()
+            nodes = measure_grammar(g)[0]
+            max_nodes = max(max_nodes, nodes)
+            total_nodes += nodes
+        with session:
+            extract(g, forest)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # The size of the derivatives is what the time taken by each token depends on.
+    final_nodes = measure_grammar(g)[0]
+    return {
+        'peak_traced_bytes': peak,
+        'max_nodes': max_nodes,
+        'final_nodes': final_nodes,
+        'mean_nodes': round(total_nodes / max(1, len(values)), 2),
+        'growth_per_token': round((final_nodes - start_nodes) / max(1, len(values)), 4),
+    }
+
+
+def measure(case: Case, scale: float, repeat: int, memory: bool, engine: str) -> dict:
+    size = max(1, round(case.size * scale))
+    result: dict = {'size': size}
+    try:
+        runs = [run_case(case, size, engine) for _ in range(repeat)]
+        # The fastest run of each phase is the least disturbed by the rest of the system.
+        result.update(runs[0])
+        for key in result:
+            if key.endswith('_s'):
+                result[key] = round(min(run[key] for run in runs), 6)
+        result['derive_us_per_token'] = round(result['derive_s'] / max(1, result['tokens']) * 1e6, 2)
+        result['compact_us_per_token'] = round(result['compact_s'] / max(1, result['tokens']) * 1e6, 2)
+        if memory:
+            result.update(run_memory(case, size, engine))
+    except (RecursionError, MemoryError) as e:
+        result['error'] = f"{e.__class__.__name__}: {e}"
+    return result
+
+
+def run_suite(names: List[str], scale: float, repeat: int, memory: bool, engine: str = 'pwd') -> dict:
+    return {
+        'meta': {
+            'python': f"{python_implementation()} {python_version()}",
+            'platform': platform(),
+            'engine': engine,
+            'scale': scale,
+            'repeat': repeat,
+        },
+        'cases': {name: measure(CASES[name], scale, repeat, memory, engine) for name in names},
+    }
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> dict:
+    """Compares the metrics of the cases found in both sets of results."""
+    comparison: dict = {}
+    regressions = 0
+    for name, new in results['cases'].items():
+        old = baseline['cases'].get(name)
+        if old is None:
+            continue
+        if 'error' in old or 'error' in new:
+            comparison[name] = {'error': {'old': old.get('error'), 'new': new.get('error')}}
+            regressions += 'error' in new and 'error' not in old
+            continue
+        metrics = {}
+        for metric in COMPARED_METRICS:
+            if metric not in old or metric not in new:
+                continue
+            ratio = new[metric] / old[metric] if old[metric] else float('inf') if new[metric] else 1.0
+            noise = metric.endswith('_s') and new[metric] - old[metric] < MIN_SECONDS
+            regression = ratio > 1 + threshold and not noise
+            metrics[metric] = {'old': old[metric], 'new': new[metric], 'ratio': round(ratio, 3),
+                               'regression': regression}
+            regressions += regression
+        comparison[name] = metrics
+    return {'threshold': threshold, 'regressions': regressions, 'cases': comparison}
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--engine', choices=ENGINES, default='pwd', help='the parsing engine to measure')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the size of each input')
+    parser.add_argument('--repeat', type=int, default=3, help='keep the fastest of this many runs of each phase')
+    parser.add_argument('--no-memory', action='store_true', help='skip measuring memory and node counts')
+    parser.add_argument('--output', help='write the results to this file instead of printing them')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'RESULTS'), help='compare two sets of results')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative increase of a metric which counts as a regression')
+    args = parser.parse_args()
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = load(f)
+        with open(args.compare[1]) as f:
+            results = load(f)
+        comparison = compare(baseline, results, args.threshold)
+        print(dumps(comparison, indent=2))
+        sys.exit(1 if comparison['regressions'] else 0)
+    results = run_suite(args.cases, args.scale, args.repeat, not args.no_memory, args.engine)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(dumps(results, indent=2))
+    else:
+        print(dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
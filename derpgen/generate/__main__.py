@@ -0,0 +1,23 @@
+"""
+Generates a standalone parser module for a grammar file.
+
+    python -m derpgen.generate GRAMMAR_FILE [-o MODULE_FILE]
+"""
+
+from .module import *
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('grammar_file')
+    parser.add_argument('-o', '--output', help='the module to write (by default, the grammar file\'s name with .py)')
+    args = parser.parse_args()
+    output = args.output if args.output is not None else str(Path(args.grammar_file).with_suffix('.py'))
+    write_parser_module(args.grammar_file, output)
+
+
+if __name__ == '__main__':
+    main()
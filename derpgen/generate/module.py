@@ -0,0 +1,258 @@
+from derpgen.grammar import *
+from derpgen.grammar.compile import Bind, Collect, Construct, Gather, Node, RuleValue, TokenValue
+from derpgen.grammar.pwd import (Alt, Branch, BranchLeft, BranchRight, Compose, Empty, Eps, Grammar, Leaf, Nil, Pat,
+                                 Red, Ref, Rep, Seq, Tok)
+
+from . import runtime
+
+from inspect import getsource
+from typing import Any, Callable, Dict, List
+
+
+__all__ = ['generate_parser_module', 'write_parser_module', 'CodeGenerationException']
+
+
+class CodeGenerationException(Exception):
+    pass
+
+
+class ReservedNameException(CodeGenerationException):
+    def __init__(self, name: str):
+        super().__init__(f"Production name is reserved in generated modules: {name}")
+
+
+class UnsupportedReductionException(CodeGenerationException):
+    def __init__(self, f: Callable):
+        super().__init__(f"Reduction cannot be generated: {f!r}")
+
+
+class UnsupportedTreeException(CodeGenerationException):
+    def __init__(self, t: Any):
+        super().__init__(f"Tree cannot be generated: {t!r}")
+
+
+# Public names of the runtime, which productions cannot use.
+RESERVED_NAMES = {'Empty', 'Leaf', 'Branch', 'Node', 'Parser', 'parse', 'START', 'RULES'}
+
+
+def generate_parser_module(grammar_file: str) -> str:
+    """
+    Returns the source of a standalone Python module which parses according to a grammar file. The module consists of
+    the runtime (see `derpgen.generate.runtime`), a class for each of the grammar's named productions, a function for
+    each production which builds its class from the parts it matched, and the grammar itself, prebuilt as runtime nodes.
+    """
+    grammar = build_grammar_from_file(grammar_file)
+    compiled = compile_grammar(grammar)
+    generator = ModuleGenerator(grammar)
+    return generator.generate(grammar_file, compiled)
+
+
+def write_parser_module(grammar_file: str, module_file: str):
+    source = generate_parser_module(grammar_file)
+    with open(module_file, 'w') as f:
+        f.write(source)
+
+
+def field_names(production: NamedProduction) -> List[str]:
+    # Rules and declared tokens matched without a name are implicitly named after themselves (see `Construct`). Other
+    # fields are named by the pattern matches found anywhere within the production.
+    names: List[str] = []
+
+    def add(name: str):
+        if name not in names:
+            names.append(name)
+
+    def visit(ast: AST):
+        if isinstance(ast, PatternMatch):
+            add(ast.name)
+            visit(ast.match)
+        elif isinstance(ast, Sequence):
+            for sub_ast in ast.asts:
+                visit(sub_ast)
+        elif isinstance(ast, ParameterizedSequence):
+            visit(ast.sequence)
+            visit(ast.parameter)
+
+    for part in production.parts:
+        if isinstance(part, RuleMatch):
+            add(part.rule)
+        elif isinstance(part, DeclaredToken):
+            add(part.token)
+    for part in production.parts:
+        visit(part)
+    return names
+
+
+def binds_only_itself(part: AST) -> bool:
+    # Whether the part is a pattern match whose only binding is its own, so that the binding is known statically.
+    def has_bindings(ast: AST) -> bool:
+        if isinstance(ast, PatternMatch):
+            return True
+        elif isinstance(ast, Sequence):
+            return any(map(has_bindings, ast.asts))
+        elif isinstance(ast, ParameterizedSequence):
+            return has_bindings(ast.sequence) or has_bindings(ast.parameter)
+        return False
+    return isinstance(part, PatternMatch) and not has_bindings(part.match)
+
+
+class ModuleGenerator:
+    def __init__(self, grammar: ParsedGrammar):
+        self.productions: Dict[str, NamedProduction] = {}
+        for rule in grammar.rules.values():
+            for production in rule.productions:
+                if isinstance(production, NamedProduction):
+                    if production.name in RESERVED_NAMES:
+                        raise ReservedNameException(production.name)
+                    self.productions[production.name] = production
+        self.lines: List[str] = []
+        self.names: Dict[int, str] = {}
+        self.rule_names: Dict[str, str] = {}
+        self.reductions: Dict[str, str] = {}
+
+    def generate(self, grammar_file: str, compiled: CompiledGrammar) -> str:
+        # The runtime's docstring is replaced by the module's own.
+        runtime_source = getsource(runtime).split('"""', 2)[2].strip()
+        out = [
+            f'"""Parser for {grammar_file}, generated by derpgen. Do not edit."""',
+            "",
+            runtime_source,
+            "",
+            "",
+            "########",
+            "# Productions.",
+            "########",
+        ]
+        for name, production in self.productions.items():
+            out.extend(self.generate_production(name, production))
+        # Rules are declared before they are built, since they may refer to each other.
+        out.extend(["", "", "########", "# Grammar.", "########", ""])
+        for rule_name in compiled.rules:
+            self.rule_names[rule_name] = var = f"_rule_{rule_name}"
+            out.append(f"{var} = _Ref({rule_name!r})")
+        for rule_name, g in compiled.rules.items():
+            name = self.emit(g)
+            self.lines.append(f"{self.rule_names[rule_name]}.g = {name}")
+        start = self.emit(compiled.start)
+        out.extend(self.lines)
+        out.extend([
+            "",
+            f"START = {start}",
+            "RULES = {" + ', '.join(f"{n!r}: {v}" for n, v in self.rule_names.items()) + "}",
+            "",
+            "__all__ = ['Node', 'Parser', 'parse', 'START', 'RULES', " +
+            ', '.join(repr(name) for name in self.productions) + "]",
+            "",
+        ])
+        return '\n'.join(out)
+
+    def generate_production(self, name: str, production: NamedProduction) -> List[str]:
+        # The production's function reads the captures of its parts from the right-nested tree of the sequence, and
+        # assigns the fields in the same order as `Construct`: implicitly named parts first, then bindings.
+        out = ["", "", f"class {name}(Node):"]
+        out.append(f"    __slots__ = {tuple(field_names(production))!r}")
+        out.extend(["", "", f"def _build_{name}(t):"])
+        # Literals have no fields, so their captures are skipped.
+        parts = production.parts
+        for i, part in enumerate(parts[:-1]):
+            if not isinstance(part, Literal):
+                out.append(f"    c{i} = t.left")
+            out.append(f"    t = t.right")
+        if not isinstance(parts[-1], Literal):
+            out.append(f"    c{len(parts) - 1} = t")
+        out.append(f"    node = {name}()")
+        for i, part in enumerate(parts):
+            if isinstance(part, RuleMatch):
+                out.append(f"    node.{part.rule} = c{i}[0]")
+            elif isinstance(part, DeclaredToken):
+                out.append(f"    node.{part.token} = c{i}[0]")
+        for i, part in enumerate(parts):
+            if binds_only_itself(part):
+                out.append(f"    node.{part.name} = c{i}[0]")
+            elif not isinstance(part, (Literal, DeclaredToken, RuleMatch)):
+                out.append(f"    for name, value in c{i}[1]:")
+                out.append(f"        setattr(node, name, value)")
+        out.append(f"    return node")
+        return out
+
+    def emit(self, g: Grammar) -> str:
+        """Emits the construction of a node, after those of its children, and returns the name of its variable."""
+        name = self.names.get(id(g))
+        if name is not None:
+            return name
+        cls = g.__class__
+        if cls is Nil:
+            return '_NIL'
+        elif cls is Ref:
+            return self.rule_names[g.n]
+        elif cls is Eps:
+            expr = f"_Eps([{', '.join(map(self.tree, g.ts))}])"
+        elif cls is Tok:
+            expr = f"_Tok({g.t!r})"
+        elif cls is Pat:
+            expr = f"_Pat(_re_compile({g.p.pattern!r}, {g.p.flags!r}))"
+        elif cls is Rep:
+            expr = f"_Rep({self.emit(g.g)})"
+        elif cls is Alt:
+            expr = f"_Alt({self.emit(g.g1)}, {self.emit(g.g2)})"
+        elif cls is Seq:
+            expr = f"_Seq({self.emit(g.g1)}, {self.emit(g.g2)})"
+        elif cls is Red:
+            expr = f"_Red({self.emit(g.g)}, {self.reduction(g.f)})"
+        else:
+            raise RuntimeError(f"Unknown grammar class: {cls.__name__}")
+        name = self.names[id(g)] = f"_g{len(self.names)}"
+        self.lines.append(f"{name} = {expr}")
+        return name
+
+    def reduction(self, f: Callable) -> str:
+        cls = f.__class__
+        if cls is TokenValue:
+            return '_token_value'
+        elif cls is RuleValue:
+            return '_rule_value'
+        elif cls is Construct:
+            return f"_build_{f.name}"
+        elif cls is Bind:
+            expr = f"_bind({f.name!r})"
+        elif cls is Gather:
+            expr = f"_gather({f.n!r})"
+        elif cls is Collect:
+            expr = f"_collect({f.separated!r})"
+        # The constructors of the grammar fold single parses into reductions, and fuse reductions of reductions (see
+        # `seq` and `red`), so compiled grammars hold those reductions too.
+        elif cls is BranchLeft:
+            expr = f"_branch_left({self.tree(f.left)})"
+        elif cls is BranchRight:
+            expr = f"_branch_right({self.tree(f.right)})"
+        elif cls is Compose:
+            expr = f"_Compose({self.reduction(f.f)}, {self.reduction(f.g)})"
+        else:
+            raise UnsupportedReductionException(f)
+        # Reductions with the same parameters are shared.
+        name = self.reductions.get(expr)
+        if name is None:
+            name = self.reductions[expr] = f"_f{len(self.reductions)}"
+            self.lines.append(f"{name} = {expr}")
+        return name
+
+    def tree(self, t: Any) -> str:
+        """Returns an expression which builds a tree (or a capture) held by the grammar out of the runtime's classes."""
+        cls = t.__class__
+        if cls is Empty:
+            return "Empty()"
+        elif cls is Leaf:
+            return f"Leaf({self.tree(t.value)})"
+        elif cls is Branch:
+            return f"Branch({self.tree(t.left)}, {self.tree(t.right)})"
+        elif cls is Node:
+            if t.name not in self.productions:
+                raise UnsupportedTreeException(t)
+            return f"{t.name}(" + ', '.join(f"{n}={self.tree(v)}" for n, v in t.fields.items()) + ")"
+        elif cls is tuple:
+            return "(" + ''.join(f"{self.tree(v)}, " for v in t) + ")"
+        elif cls is list:
+            return "[" + ', '.join(map(self.tree, t)) + "]"
+        elif t is None or cls in (str, int, float, bool):
+            return repr(t)
+        raise UnsupportedTreeException(t)
@@ -0,0 +1,727 @@
+"""
+The runtime of the parser modules generated by `derpgen.generate`. Its source is copied into each generated module, so
+it must not import anything from `derpgen`.
+
+Derivatives and compactions are taken as by `derpgen.grammar.pwd`: the constructors of derived nodes apply the
+compaction rules which only depend on the classes of their children, FIRST sets prune the nodes which cannot derive a
+value, and both are computed with explicit stacks. The fixed points (emptiness, nullability, the empty parses and the
+FIRST sets) are computed by a single non-recursive worklist solver. Results are memoized on the nodes themselves.
+"""
+
+from functools import lru_cache as _lru_cache
+from operator import methodcaller as _methodcaller
+from re import compile as _re_compile
+from typing import Any, Callable, Iterable, List, Optional
+from weakref import ref as _weak_ref
+
+
+########
+# Trees.
+########
+
+
+class Empty:
+    __slots__ = ()
+
+    def __eq__(self, other) -> bool:
+        return other.__class__ is Empty
+
+    def __hash__(self) -> int:
+        return 0
+
+    def __repr__(self) -> str:
+        return 'Empty()'
+
+
+class Leaf:
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __eq__(self, other) -> bool:
+        return other.__class__ is Leaf and self.value == other.value
+
+    def __repr__(self) -> str:
+        return f"Leaf({self.value!r})"
+
+
+class Branch:
+    __slots__ = ('left', 'right')
+
+    def __init__(self, left: Any, right: Any):
+        self.left = left
+        self.right = right
+
+    def __eq__(self, other) -> bool:
+        return other.__class__ is Branch and self.left == other.left and self.right == other.right
+
+    def __repr__(self) -> str:
+        return f"Branch({self.left!r}, {self.right!r})"
+
+
+class Node:
+    """The base class of the classes of a grammar's productions. Each field is a slot, which is None until bound."""
+
+    __slots__ = ()
+
+    def __init__(self, **fields: Any):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def __eq__(self, other) -> bool:
+        return (other.__class__ is self.__class__ and
+                all(getattr(self, name) == getattr(other, name) for name in self.__slots__))
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+
+########
+# Reductions.
+########
+
+
+def _branch_left(t1: Any) -> Callable[[Any], Any]:
+    return lambda t2: Branch(t1, t2)
+
+
+def _branch_right(t2: Any) -> Callable[[Any], Any]:
+    return lambda t1: Branch(t1, t2)
+
+
+class _Compose:
+    # The reduction which applies `g`, then `f`. Reductions of reductions are fused into compositions, which nest as
+    # deeply as the input does, so they are applied with an explicit stack.
+    __slots__ = ('f', 'g')
+
+    def __init__(self, f: Callable[[Any], Any], g: Callable[[Any], Any]):
+        self.f = f
+        self.g = g
+
+    def __call__(self, t: Any) -> Any:
+        stack = [self]
+        while stack:
+            f = stack.pop()
+            if f.__class__ is _Compose:
+                stack.append(f.f)
+                stack.append(f.g)
+            else:
+                t = f(t)
+        return t
+
+
+# Parses are reduced to captures: pairs of a value and of a tuple of (name, value) bindings of fields.
+
+
+def _token_value(t: Leaf) -> tuple:
+    return t.value, ()
+
+
+def _rule_value(t: Node) -> tuple:
+    return t, ()
+
+
+def _bind(name: str) -> Callable[[tuple], tuple]:
+    def bind(c: tuple) -> tuple:
+        return c[0], c[1] + ((name, c[0]),)
+    return bind
+
+
+def _gather(n: int) -> Callable[[Any], tuple]:
+    def gather(t: Any) -> tuple:
+        values = []
+        bindings = ()
+        for _ in range(n - 1):
+            c = t.left
+            values.append(c[0])
+            bindings += c[1]
+            t = t.right
+        values.append(t[0])
+        return (values[0] if n == 1 else values), bindings + t[1]
+    return gather
+
+
+def _collect(separated: bool) -> Callable[[Any], tuple]:
+    def collect(t: Any) -> tuple:
+        values = []
+        bindings = ()
+        first = True
+        while t.__class__ is Branch:
+            c = t.left
+            if separated and not first:
+                c = c.right
+            values.append(c[0])
+            bindings += c[1]
+            first = False
+            t = t.right
+        return values, bindings
+    return collect
+
+
+########
+# Grammars.
+########
+
+
+class _Grammar:
+    # The memoized derivative is kept for the most recent value only, and the memoized derivative and compaction are
+    # weak references, so that a node does not keep the grammars derived from it alive. The facts found by fixed points
+    # are stored on the nodes too, and most of those of derivatives are settled as they are built (see `_settle`).
+    __slots__ = ('_dc', '_dv', '_cv', '_empty', '_nullable', '_pn', '_first', '__weakref__')
+
+    def __init__(self):
+        self._dc = _NO_VALUE
+        self._dv = None
+        self._cv = None
+        self._empty = None
+        self._nullable = None
+        self._pn = None
+        self._first = None
+
+    def children(self) -> tuple:
+        return ()
+
+    def is_empty(self) -> bool:
+        v = self._empty
+        return _solve(self, '_empty', True, _EMPTY_RULE) if v is None else v
+
+    def is_nullable(self) -> bool:
+        v = self._nullable
+        return _solve(self, '_nullable', False, _NULLABLE_RULE) if v is None else v
+
+    def parse_null(self) -> list:
+        v = self._pn
+        return _solve(self, '_pn', [], _PARSE_NULL_RULE) if v is None else v
+
+    def first_set(self) -> tuple:
+        v = self._first
+        return _solve(self, '_first', _NO_FIRST, _FIRST_RULE) if v is None else v
+
+    # The rules below compute a node's value from the current values of its children, which are stored in the same
+    # attributes as the final values. The values of leaves are known when they are built, so they have no rules.
+
+    def _empty_rule(self) -> bool:
+        raise NotImplementedError
+
+    def _nullable_rule(self) -> bool:
+        raise NotImplementedError
+
+    def _parse_null_rule(self) -> list:
+        raise NotImplementedError
+
+    def _first_rule(self) -> tuple:
+        raise NotImplementedError
+
+
+_NO_VALUE = object()
+_EMPTY_RULE = _methodcaller('_empty_rule')
+_NULLABLE_RULE = _methodcaller('_nullable_rule')
+_PARSE_NULL_RULE = _methodcaller('_parse_null_rule')
+_FIRST_RULE = _methodcaller('_first_rule')
+
+
+def _solve(root: _Grammar, attr: str, bottom: Any, rule: Callable[[_Grammar], Any]) -> Any:
+    # Finds the least fixed point of `rule` over the nodes reachable from `root` whose values are not known yet. Each of
+    # them starts at `bottom`, and a node is re-evaluated whenever the value of one of its children changes.
+    setattr(root, attr, bottom)
+    parents = {id(root): []}
+    nodes = [root]
+    stack = [root]
+    while stack:
+        g = stack.pop()
+        for child in g.children():
+            child_parents = parents.get(id(child))
+            if child_parents is not None:
+                child_parents.append(g)
+            elif getattr(child, attr) is None:
+                setattr(child, attr, bottom)
+                parents[id(child)] = [g]
+                nodes.append(child)
+                stack.append(child)
+    worklist = nodes
+    while worklist:
+        g = worklist.pop()
+        v = rule(g)
+        if v != getattr(g, attr):
+            setattr(g, attr, v)
+            worklist.extend(parents[id(g)])
+    return getattr(root, attr)
+
+
+# FIRST sets are pairs of the literal values and of the patterns a grammar's parses can start with. A value which is in
+# none of them cannot be derived by the grammar, so `_derive` skips the nodes whose sets are known not to hold it.
+
+_NO_FIRST = (frozenset(), frozenset())
+
+
+def _union_first(f1: tuple, f2: tuple) -> tuple:
+    if not f2[0] and not f2[1]:
+        return f1
+    if not f1[0] and not f1[1]:
+        return f2
+    return f1[0] | f2[0], f1[1] | f2[1]
+
+
+@_lru_cache(maxsize=4096)
+def _matches(p: Any, c: Any) -> bool:
+    # Values are tested against the same patterns at many nodes, and usually by more than one derivative.
+    return p.fullmatch(c) is not None
+
+
+class _Nil(_Grammar):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__()
+        self._empty = True
+        self._nullable = False
+        self._pn = []
+        self._first = _NO_FIRST
+
+
+_NIL = _Nil()
+
+
+class _Eps(_Grammar):
+    __slots__ = ('ts',)
+
+    def __init__(self, ts: list):
+        super().__init__()
+        self.ts = ts
+        self._empty = False
+        self._nullable = True
+        self._pn = ts
+        self._first = _NO_FIRST
+
+
+class _Tok(_Grammar):
+    __slots__ = ('t',)
+
+    def __init__(self, t: Any):
+        super().__init__()
+        self.t = t
+        self._empty = False
+        self._nullable = False
+        self._pn = []
+        self._first = (frozenset((t,)), frozenset())
+
+
+class _Pat(_Grammar):
+    __slots__ = ('p',)
+
+    def __init__(self, p: Any):
+        super().__init__()
+        self.p = p
+        self._empty = False
+        self._nullable = False
+        self._pn = []
+        self._first = (frozenset(), frozenset((p,)))
+
+
+class _Rep(_Grammar):
+    __slots__ = ('g',)
+
+    def __init__(self, g: _Grammar):
+        super().__init__()
+        self.g = g
+        self._empty = False
+        self._nullable = True
+        self._pn = [Empty()]
+
+    def children(self) -> tuple:
+        return self.g,
+
+    def _first_rule(self) -> tuple:
+        return self.g._first
+
+
+class _Alt(_Grammar):
+    __slots__ = ('g1', 'g2')
+
+    def __init__(self, g1: _Grammar, g2: _Grammar):
+        super().__init__()
+        self.g1 = g1
+        self.g2 = g2
+
+    def children(self) -> tuple:
+        return self.g1, self.g2
+
+    def _empty_rule(self) -> bool:
+        return self.g1._empty and self.g2._empty
+
+    def _nullable_rule(self) -> bool:
+        return self.g1._nullable or self.g2._nullable
+
+    def _parse_null_rule(self) -> list:
+        return self.g1._pn + self.g2._pn
+
+    def _first_rule(self) -> tuple:
+        return _union_first(self.g1._first, self.g2._first)
+
+
+class _Seq(_Grammar):
+    __slots__ = ('g1', 'g2')
+
+    def __init__(self, g1: _Grammar, g2: _Grammar):
+        super().__init__()
+        self.g1 = g1
+        self.g2 = g2
+
+    def children(self) -> tuple:
+        return self.g1, self.g2
+
+    def _empty_rule(self) -> bool:
+        return self.g1._empty or self.g2._empty
+
+    def _nullable_rule(self) -> bool:
+        return self.g1._nullable and self.g2._nullable
+
+    def _parse_null_rule(self) -> list:
+        return [Branch(t1, t2) for t1 in self.g1._pn for t2 in self.g2._pn]
+
+    def _first_rule(self) -> tuple:
+        # The set of the right side is found even when it is not needed, so that the sets of all of the nodes of a
+        # grammar are solved together.
+        return _union_first(self.g1._first, self.g2._first) if self.g1.is_nullable() else self.g1._first
+
+
+class _Red(_Grammar):
+    __slots__ = ('g', 'f')
+
+    def __init__(self, g: _Grammar, f: Callable[[Any], Any]):
+        super().__init__()
+        self.g = g
+        self.f = f
+
+    def children(self) -> tuple:
+        return self.g,
+
+    def _empty_rule(self) -> bool:
+        return self.g._empty
+
+    def _nullable_rule(self) -> bool:
+        return self.g._nullable
+
+    def _parse_null_rule(self) -> list:
+        f = self.f
+        return [f(t) for t in self.g._pn]
+
+    def _first_rule(self) -> tuple:
+        return self.g._first
+
+
+class _Ref(_Grammar):
+    """A reference to a rule, which allows grammars to be cyclic. The target is assigned after construction."""
+
+    __slots__ = ('name', 'g')
+
+    def __init__(self, name: str, g: Optional[_Grammar] = None):
+        super().__init__()
+        self.name = name
+        self.g = g
+
+    def children(self) -> tuple:
+        return self.g,
+
+    def _empty_rule(self) -> bool:
+        return self.g._empty
+
+    def _nullable_rule(self) -> bool:
+        return self.g._nullable
+
+    def _parse_null_rule(self) -> list:
+        return self.g._pn
+
+    def _first_rule(self) -> tuple:
+        return self.g._first
+
+
+def _settle(g: _Grammar) -> _Grammar:
+    # Most nodes are built out of nodes whose nullability and FIRST set are already settled, so those of the new node
+    # follow from them directly, without solving a fixed point. Facts which depend on a child which is not settled
+    # (e.g., a rule which is still being built) are left to the fixed points.
+    cls = g.__class__
+    if cls is _Alt or cls is _Seq:
+        n1 = g.g1._nullable
+        n2 = g.g2._nullable
+        if cls is _Alt:
+            g._nullable = True if n1 or n2 else None if n1 is None or n2 is None else False
+        else:
+            g._nullable = False if n1 is False or n2 is False else None if n1 is None or n2 is None else True
+        f1 = g.g1._first
+        if f1 is not None and (cls is _Alt or n1 is not None):
+            if cls is _Seq and not n1:
+                g._first = f1
+            else:
+                f2 = g.g2._first
+                if f2 is not None:
+                    g._first = _union_first(f1, f2)
+    elif cls is _Red:
+        g._nullable = g.g._nullable
+        g._first = g.g._first
+    else:
+        g._first = g.g._first
+    return g
+
+
+# The constructors of derivatives and compactions apply the compaction rules which only depend on the classes of the
+# node's children: `Nil` children are dropped, `Eps` children with a single tree are folded into reductions, and
+# reductions of `Eps` nodes and of reductions are applied and fused.
+
+
+def _star(g: _Grammar) -> _Grammar:
+    if g.__class__ is _Nil or g.__class__ is _Eps:
+        return _Eps([Empty()])
+    return _settle(_Rep(g))
+
+
+def _alt(g1: _Grammar, g2: _Grammar) -> _Grammar:
+    cls1 = g1.__class__
+    cls2 = g2.__class__
+    if cls1 is _Nil:
+        return g2
+    if cls2 is _Nil:
+        return g1
+    if cls1 is _Eps and cls2 is _Eps:
+        return _Eps(g1.ts + g2.ts)
+    return _settle(_Alt(g1, g2))
+
+
+def _seq(g1: _Grammar, g2: _Grammar) -> _Grammar:
+    cls1 = g1.__class__
+    cls2 = g2.__class__
+    if cls1 is _Nil or cls2 is _Nil:
+        return _NIL
+    if cls1 is _Eps and len(g1.ts) == 1:
+        return _red(g2, _branch_left(g1.ts[0]))
+    if cls2 is _Eps and len(g2.ts) == 1:
+        return _red(g1, _branch_right(g2.ts[0]))
+    return _settle(_Seq(g1, g2))
+
+
+def _red(g: _Grammar, f: Callable[[Any], Any]) -> _Grammar:
+    cls = g.__class__
+    if cls is _Nil:
+        return _NIL
+    if cls is _Eps:
+        return _Eps([f(t) for t in g.ts])
+    if cls is _Red:
+        return _settle(_Red(g.g, _Compose(f, g.f)))
+    return _settle(_Red(g, f))
+
+
+# Derivatives and compactions are taken with explicit stacks, so that the depth of the recursion does not grow with the
+# nesting of the input. Each node is visited twice: once to schedule its children, and once to build its result from
+# theirs. The derivatives and compactions of rules are rules too, which are kept only when a recursive occurrence of the
+# rule refers back to them.
+
+
+def _derive(g: _Grammar, c: Any) -> _Grammar:
+    refs = {}
+    tied = set()
+    work = [(g, None)]
+    built = []
+    while work:
+        g, frame = work.pop()
+        cls = g.__class__
+        if frame is None:
+            first = g._first
+            if first is not None and c not in first[0] and not any(_matches(p, c) for p in first[1]):
+                built.append(_NIL)
+                continue
+            if g._dv is not None and g._dc == c:
+                d = g._dv()
+                if d is not None:
+                    built.append(d)
+                    continue
+            if cls is _Tok:
+                d = _Eps([Leaf(c)]) if c == g.t else _NIL
+            elif cls is _Pat:
+                d = _Eps([Leaf(c)]) if _matches(g.p, c) else _NIL
+            elif cls is _Nil or cls is _Eps:
+                d = _NIL
+            elif cls is _Alt:
+                work.append((g, True))
+                work.append((g.g2, None))
+                work.append((g.g1, None))
+                continue
+            elif cls is _Seq:
+                # The right side is only derived when the left side is nullable, which the second visit is told.
+                nullable = g.g1.is_nullable()
+                work.append((g, nullable))
+                if nullable:
+                    work.append((g.g2, None))
+                work.append((g.g1, None))
+                continue
+            elif cls is _Rep or cls is _Red:
+                work.append((g, True))
+                work.append((g.g, None))
+                continue
+            else:
+                d = refs.get(id(g))
+                if d is not None:
+                    tied.add(id(g))
+                    built.append(d)
+                    continue
+                d = _Ref(g.name)
+                work.append((g, (d, not refs)))
+                refs[id(g)] = d
+                work.append((g.g, None))
+                continue
+        elif cls is _Alt:
+            d2 = built.pop()
+            d = _alt(built.pop(), d2)
+        elif cls is _Seq:
+            if frame:
+                d2 = built.pop()
+                d = _alt(_seq(built.pop(), g.g2), _seq(_Eps(g.g1.parse_null()), d2))
+            else:
+                d = _seq(built.pop(), g.g2)
+        elif cls is _Rep:
+            d = _seq(built.pop(), g)
+        elif cls is _Red:
+            d = _red(built.pop(), g.f)
+        else:
+            d, outermost = frame
+            body = d.g = built.pop()
+            if id(g) not in tied:
+                d = body
+            if outermost:
+                refs.clear()
+                tied.clear()
+        g._dc = c
+        g._dv = _weak_ref(d)
+        built.append(d)
+    return built[0]
+
+
+def _compact(g: _Grammar) -> _Grammar:
+    # Only the emptiness of the children is left for compaction to check, as the constructors apply the other rules.
+    refs = {}
+    tied = set()
+    # Nodes to visit, with None on their first visit, and what their second visit needs otherwise.
+    work = [(g, None)]
+    built = []
+    while work:
+        g, frame = work.pop()
+        cls = g.__class__
+        if frame is None:
+            if g._cv is not None:
+                cg = g._cv()
+                if cg is not None:
+                    built.append(cg)
+                    continue
+            if cls is _Nil or cls is _Eps or cls is _Tok or cls is _Pat:
+                cg = g
+            elif cls is _Alt:
+                # Only the side which is not empty is compacted, unless neither is.
+                rule = 0 if g.g1.is_empty() else 1 if g.g2.is_empty() else 2
+                work.append((g, rule))
+                if rule != 1:
+                    work.append((g.g2, None))
+                if rule != 0:
+                    work.append((g.g1, None))
+                continue
+            elif cls is _Seq:
+                if g.g1.is_empty() or g.g2.is_empty():
+                    cg = _NIL
+                else:
+                    work.append((g, True))
+                    work.append((g.g2, None))
+                    work.append((g.g1, None))
+                    continue
+            elif cls is _Rep or cls is _Red:
+                if g.g.is_empty():
+                    cg = _Eps([Empty()]) if cls is _Rep else _NIL
+                else:
+                    work.append((g, True))
+                    work.append((g.g, None))
+                    continue
+            elif g.is_empty():
+                cg = _NIL
+            else:
+                cg = refs.get(id(g))
+                if cg is not None:
+                    tied.add(id(g))
+                    built.append(cg)
+                    continue
+                cg = _Ref(g.name)
+                work.append((g, (cg, not refs)))
+                refs[id(g)] = cg
+                work.append((g.g, None))
+                continue
+        elif cls is _Alt:
+            cg = built.pop()
+            if frame == 2:
+                cg = _alt(built.pop(), cg)
+        elif cls is _Seq:
+            cg2 = built.pop()
+            cg = _seq(built.pop(), cg2)
+        elif cls is _Rep:
+            cg = _star(built.pop())
+        elif cls is _Red:
+            cg = _red(built.pop(), g.f)
+        else:
+            cg, outermost = frame
+            body = cg.g = built.pop()
+            # A rule which was never tied back to is replaced by its body, so that the constructors can simplify the
+            # nodes which use it.
+            if id(g) not in tied:
+                cg = body
+            if outermost:
+                refs.clear()
+                tied.clear()
+            # A compacted rule is taken to be its own compaction, so that the rules reachable from the grammar are not
+            # copied each time it is compacted, and their derivatives are kept.
+            cg._cv = _weak_ref(cg)
+        g._cv = _weak_ref(cg)
+        built.append(cg)
+    return built[0]
+
+
+########
+# Parsing.
+########
+
+
+class Parser:
+    """An incremental parser. Values are fed one at a time, and the parses of the values fed so far are returned by
+    `finish`."""
+
+    def __init__(self, g: Optional[_Grammar] = None):
+        # The grammar is compacted, and its FIRST sets solved, before any value is fed, so that its derivatives start
+        # from settled nodes.
+        g = _compact(START if g is None else g)
+        g.first_set()
+        self._grammar = g
+        self._count = 0
+
+    @property
+    def count(self) -> int:
+        """The number of values consumed so far."""
+        return self._count
+
+    def feed(self, c: Any):
+        self._grammar = _compact(_derive(self._grammar, c))
+        self._count += 1
+
+    def feed_many(self, cs: Iterable[Any]):
+        for c in cs:
+            self.feed(c)
+
+    def finish(self) -> List[Any]:
+        """Returns the parses of the values consumed so far."""
+        return self._grammar.parse_null()
+
+
+def parse(values: Iterable[Any], g: Optional[_Grammar] = None) -> List[Any]:
+    """Parses the values with the start symbols of the grammar, or with `g` if it is given."""
+    parser = Parser(g)
+    parser.feed_many(values)
+    return parser.finish()
+
+
+# The generated module defines the start of its grammar.
+START: Optional[_Grammar] = None
@@ -1,3 +1,5 @@
 from .build import *
+from .compile import *
+from .lexer import *
 from .parse.ast import *
 from .parse.matcher import *
@@ -1,9 +1,13 @@
+from .cache import *
+from .compile import *
 from .parse import *
 from .tokenize import *
 from .check import *
 
+from typing import Optional
 
-__all__ = ['build_grammar_from_file', 'ParsedGrammar']
+
+__all__ = ['build_grammar_from_file', 'compile_grammar_from_file', 'ParsedGrammar', 'CompiledGrammar']
 
 
 def build_grammar_from_file(grammar_file: str) -> ParsedGrammar:
@@ -11,3 +15,30 @@ def build_grammar_from_file(grammar_file: str) -> ParsedGrammar:
     grammar = parse_tokens(tokens)
     check_grammar(grammar)
     return grammar
+
+
+def compile_grammar_from_file(grammar_file: str, use_cache: bool = True,
+                              cache_dir: Optional[str] = None) -> CompiledGrammar:
+    """
+    Builds and compiles a grammar file. Unless `use_cache` is False, the compiled grammar is cached on disk, and the
+    cache is used for as long as the file's contents are unchanged.
+
+    The file is never held in memory as a whole: it is fingerprinted in chunks to look up the cache, and then, if
+    there is no usable cache, tokenized one line at a time while it is fingerprinted again. The compiled grammar is
+    cached under the fingerprint of the text it was compiled from, even if the file changed in between.
+    """
+    if use_cache:
+        compiled = read_cached_grammar(grammar_file, file_fingerprint(grammar_file), cache_dir)
+        if compiled is not None:
+            return compiled
+    with open(grammar_file, 'rb') as f:
+        reader = FingerprintingReader(f)
+        grammar = parse_tokens(tokenize_stream(reader))
+        # The rest of the file (if the grammar ended before it) is fingerprinted too.
+        while reader.readline():
+            pass
+    check_grammar(grammar)
+    compiled = compile_grammar(grammar)
+    if use_cache:
+        write_cached_grammar(grammar_file, reader.fingerprint, compiled, cache_dir)
+    return compiled
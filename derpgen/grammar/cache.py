@@ -0,0 +1,137 @@
+from .compile import *
+
+from functools import lru_cache
+from hashlib import sha256
+from importlib import import_module
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+import os
+import pickle
+
+
+__all__ = [
+    'CACHE_VERSION', 'grammar_fingerprint', 'file_fingerprint', 'FingerprintingReader', 'read_cached_grammar',
+    'write_cached_grammar',
+]
+
+
+# Compiled grammars are cached under a fingerprint of the grammar's text. The version is part of the fingerprint, and
+# must be incremented whenever a change to the compiler or to the grammar classes makes existing caches invalid. So are
+# the sources of the modules which build compiled grammars and define the classes pickled with them, so that changing
+# them invalidates the caches even when the version is not incremented.
+CACHE_VERSION = 2
+
+
+STRUCTURE_MODULES = (
+    'derpgen.grammar.compile', 'derpgen.grammar.pwd.grammar', 'derpgen.grammar.pwd.forest',
+    'derpgen.grammar.pwd.registry', 'derpgen.grammar.pwd.tree',
+)
+
+
+PathLike = Union[str, Path]
+
+
+@lru_cache(maxsize=None)
+def structure_fingerprint() -> bytes:
+    digest = sha256()
+    for name in STRUCTURE_MODULES:
+        with open(import_module(name).__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def new_digest():
+    digest = sha256(f"derpgen-{CACHE_VERSION}\0".encode())
+    digest.update(structure_fingerprint())
+    return digest
+
+
+def grammar_fingerprint(text: bytes) -> str:
+    digest = new_digest()
+    digest.update(text)
+    return digest.hexdigest()
+
+
+def file_fingerprint(grammar_file: PathLike, chunk_size: int = 1 << 16) -> str:
+    """Returns the fingerprint of a grammar file, which is read in chunks rather than as a whole."""
+    digest = new_digest()
+    with open(grammar_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FingerprintingReader:
+    """
+    Reads the lines of a binary stream (see `tokenize_stream`), and fingerprints them as they are read, so that the
+    fingerprint is that of the text which was actually read.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.digest = new_digest()
+
+    def readline(self) -> bytes:
+        line = self.stream.readline()
+        self.digest.update(line)
+        return line
+
+    @property
+    def fingerprint(self) -> str:
+        return self.digest.hexdigest()
+
+
+def cache_path(grammar_file: PathLike, fingerprint: str, cache_dir: Optional[PathLike] = None) -> Path:
+    # By default, caches are kept in a `__pycache__` directory beside the grammar, as Python does for bytecode.
+    grammar_file = Path(grammar_file)
+    directory = grammar_file.parent / '__pycache__' if cache_dir is None else Path(cache_dir)
+    return directory / f"{grammar_file.stem}.{fingerprint[:16]}.grammar.pickle"
+
+
+def read_cached_grammar(grammar_file: PathLike, fingerprint: str,
+                        cache_dir: Optional[PathLike] = None) -> Optional[CompiledGrammar]:
+    """
+    Returns the cached compiled grammar with the given fingerprint, or None if there is no usable cache. A cache which
+    cannot be loaded is deleted.
+    """
+    path = cache_path(grammar_file, fingerprint, cache_dir)
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    try:
+        with f:
+            cached_fingerprint, grammar = pickle.load(f)
+    except Exception:
+        # A truncated or corrupt cache can fail to unpickle in any number of ways, none of which are worth more than
+        # compiling the grammar again.
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            pass
+        return None
+    if cached_fingerprint != fingerprint or not isinstance(grammar, CompiledGrammar):
+        return None
+    return grammar
+
+
+def write_cached_grammar(grammar_file: PathLike, fingerprint: str, grammar: CompiledGrammar,
+                         cache_dir: Optional[PathLike] = None):
+    """
+    Caches a compiled grammar, replacing any caches of previous versions of the grammar file. Failing to write the cache
+    is not an error, since the grammar can always be compiled again.
+    """
+    path = cache_path(grammar_file, fingerprint, cache_dir)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that concurrent readers never see a partially written cache.
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
+            pickle.dump((fingerprint, grammar), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        for stale_path in path.parent.glob(f"{Path(grammar_file).stem}.*.grammar.pickle"):
+            if stale_path != path:
+                stale_path.unlink(missing_ok=True)
+    except OSError:
+        pass
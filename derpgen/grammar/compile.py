@@ -0,0 +1,228 @@
+from .parse import *
+from .pwd import *
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+__all__ = ['compile_grammar', 'CompiledGrammar', 'Node', 'CompilerException']
+
+
+class CompilerException(Exception):
+    pass
+
+
+class UnsupportedSequenceException(CompilerException):
+    def __init__(self, sequence_type: SequenceType):
+        super().__init__(f"Sequences of type {sequence_type.name} cannot be parameterized.")
+
+
+CompiledGrammar = NamedTuple('CompiledGrammar', [('rules', GrammarDict),
+                                                 ('start', Grammar)])
+
+
+@dataclass
+class Node(Tree):
+    """The result of parsing a named production: the production's name, and the values of its fields."""
+    name: str
+    fields: Dict[str, Any]
+
+
+########
+# Reductions.
+#
+# The trees of the compiled grammar are reduced to captures: pairs of a value and of a tuple of the (name, value)
+# bindings of the named fields found within it. The reductions are classes rather than closures so that compiled grammars
+# can be pickled.
+########
+
+
+Bindings = Tuple[Tuple[str, Any], ...]
+Capture = Tuple[Any, Bindings]
+
+
+NO_CAPTURE: Capture = (None, ())
+EMPTY_LIST_CAPTURE: Capture = ([], ())
+
+
+class TokenValue:
+    """Captures the value of a token."""
+
+    def __call__(self, t: Leaf) -> Capture:
+        return t.value, ()
+
+
+class RuleValue:
+    """Captures the result of a rule."""
+
+    def __call__(self, t: Node) -> Capture:
+        return t, ()
+
+
+class Bind:
+    """Binds the value of a capture to a name."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __call__(self, c: Capture) -> Capture:
+        value, bindings = c
+        return value, bindings + ((self.name, value),)
+
+
+def gather(t: Tree, n: int) -> Tuple[List[Any], Bindings]:
+    # Collects the captures of a sequence of `n` parts, which are nested to the right.
+    values = []
+    bindings: Bindings = ()
+    for _ in range(n - 1):
+        value, part_bindings = t.left
+        values.append(value)
+        bindings += part_bindings
+        t = t.right
+    value, part_bindings = t
+    values.append(value)
+    return values, bindings + part_bindings
+
+
+class Gather:
+    """Captures a sequence of parts. A sequence of one part captures that part's value instead of a list."""
+
+    def __init__(self, n: int):
+        self.n = n
+
+    def __call__(self, t: Tree) -> Capture:
+        values, bindings = gather(t, self.n)
+        return (values[0] if self.n == 1 else values), bindings
+
+
+class Collect:
+    """
+    Captures the list of the values of a repetition, which is nested to the right and ends with an `Empty` tree. When
+    the repetition is `separated`, each element after the first is preceded by the capture of a separator, which is not
+    part of the list.
+    """
+
+    def __init__(self, separated: bool = False):
+        self.separated = separated
+
+    def __call__(self, t: Tree) -> Capture:
+        values = []
+        bindings: Bindings = ()
+        first = True
+        while t.__class__ is Branch:
+            c = t.left
+            if self.separated and not first:
+                c = c.right
+            value, part_bindings = c
+            values.append(value)
+            bindings += part_bindings
+            first = False
+            t = t.right
+        return values, bindings
+
+
+class Construct:
+    """
+    Builds the `Node` of a production from the captures of its parts. Parts whose `implicit_names` are not None are
+    bound to those names in addition to any names they bind themselves. When a name is bound more than once, the last
+    binding is kept.
+    """
+
+    def __init__(self, name: str, implicit_names: Tuple[Optional[str], ...]):
+        self.name = name
+        self.implicit_names = implicit_names
+
+    def __call__(self, t: Tree) -> Node:
+        values, bindings = gather(t, len(self.implicit_names))
+        fields: Dict[str, Any] = {}
+        for (value, implicit_name) in zip(values, self.implicit_names):
+            if implicit_name is not None:
+                fields[implicit_name] = value
+        fields.update(bindings)
+        return Node(self.name, fields)
+
+
+########
+# Compilation.
+#
+# Input values are the text of tokens: literals match their own text, and declared tokens match according to their
+# matchers in the grammar's tokens section.
+########
+
+
+def compile_grammar(grammar: ParsedGrammar) -> CompiledGrammar:
+    """Compiles a parsed grammar into a PwD grammar whose parses are the `Node`s of the grammar's start symbols."""
+    rules: GrammarDict = {}
+    for name, rule in grammar.rules.items():
+        rules[name] = alt(*(compile_production(production, grammar, rules) for production in rule.productions))
+    start = alt(*(ref(symbol, rules) for symbol in sorted(grammar.start_symbols)))
+    return CompiledGrammar(rules, start)
+
+
+def compile_production(production: Production, grammar: ParsedGrammar, rules: GrammarDict) -> Grammar:
+    if isinstance(production, AliasProduction):
+        return ref(production.alias, rules)
+    elif isinstance(production, NamedProduction):
+        # Rules and declared tokens which are matched without a name are named after themselves.
+        implicit_names = []
+        for part in production.parts:
+            if isinstance(part, RuleMatch):
+                implicit_names.append(part.rule)
+            elif isinstance(part, DeclaredToken):
+                implicit_names.append(part.token)
+            else:
+                implicit_names.append(None)
+        parts = [compile_part(part, grammar, rules) for part in production.parts]
+        return red(seq(*parts), Construct(production.name, tuple(implicit_names)))
+    else:
+        raise RuntimeError(f"Unknown AST class: {production.__class__.__name__}")
+
+
+def compile_part(part: AST, grammar: ParsedGrammar, rules: GrammarDict) -> Grammar:
+    if isinstance(part, Literal):
+        return red(tok(part.string), TokenValue())
+    elif isinstance(part, DeclaredToken):
+        matcher = grammar.token_matchers[part.token]
+        if isinstance(matcher, LiteralMatcher):
+            return red(tok(matcher.literal), TokenValue())
+        return red(pat(matcher.pattern), TokenValue())
+    elif isinstance(part, RuleMatch):
+        return red(ref(part.rule, rules), RuleValue())
+    elif isinstance(part, PatternMatch):
+        return red(compile_part(part.match, grammar, rules), Bind(part.name))
+    elif isinstance(part, Sequence):
+        return compile_sequence(part, grammar, rules)
+    elif isinstance(part, ParameterizedSequence):
+        return compile_parameterized_sequence(part, grammar, rules)
+    else:
+        raise RuntimeError(f"Unknown AST class: {part.__class__.__name__}")
+
+
+def compile_sequence(sequence: Sequence, grammar: ParsedGrammar, rules: GrammarDict) -> Grammar:
+    if sequence.type is SequenceType.ALTERNATING:
+        return alt(*(compile_part(part, grammar, rules) for part in sequence.asts))
+    element = red(seq(*(compile_part(part, grammar, rules) for part in sequence.asts)), Gather(len(sequence.asts)))
+    if sequence.type is SequenceType.PLAIN:
+        return element
+    elif sequence.type is SequenceType.OPTIONAL:
+        return alt(element, eps([NO_CAPTURE]))
+    elif sequence.type is SequenceType.REPETITION:
+        return red(rep(element), Collect())
+    elif sequence.type is SequenceType.NONEMPTY_REPETITION:
+        return red(seq(element, rep(element)), Collect())
+    else:
+        raise RuntimeError(f"Unknown sequence type: {sequence.type.name}")
+
+
+def compile_parameterized_sequence(sequence: ParameterizedSequence, grammar: ParsedGrammar,
+                                   rules: GrammarDict) -> Grammar:
+    # The parameter of a repetition separates its elements.
+    sequence_type = sequence.sequence.type
+    if sequence_type is not SequenceType.REPETITION and sequence_type is not SequenceType.NONEMPTY_REPETITION:
+        raise UnsupportedSequenceException(sequence_type)
+    element = compile_sequence(Sequence(SequenceType.PLAIN, sequence.sequence.asts), grammar, rules)
+    separator = compile_sequence(sequence.parameter, grammar, rules)
+    elements = red(seq(element, rep(seq(separator, element))), Collect(separated=True))
+    if sequence_type is SequenceType.NONEMPTY_REPETITION:
+        return elements
+    return alt(elements, eps([EMPTY_LIST_CAPTURE]))
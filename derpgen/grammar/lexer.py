@@ -0,0 +1,197 @@
+from .parse import *
+
+from codecs import getincrementaldecoder
+from mmap import mmap
+from re import DOTALL, IGNORECASE, MULTILINE, VERBOSE, compile as re_compile, escape
+from typing import BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Pattern, TextIO, Tuple, Union
+
+
+__all__ = ['compile_lexer', 'Lexer', 'Lexeme', 'LexerException']
+
+
+class LexerException(Exception):
+    def __init__(self, offset: int, text: str):
+        super().__init__(f"No token matches at offset {offset}: {text!r}")
+        self.offset = offset
+
+
+Lexeme = NamedTuple('Lexeme', [('kind', str),
+                               ('text', str),
+                               ('offset', int)])
+
+
+Stream = Union[TextIO, BinaryIO, mmap]
+
+
+# Inline flags for the flags of a pattern which can be scoped to part of a larger pattern.
+SCOPED_FLAGS = ((IGNORECASE, 'i'), (MULTILINE, 'm'), (DOTALL, 's'), (VERBOSE, 'x'))
+
+
+# Backreferences, by number or by name. Escaped backslashes are skipped, so that they are not taken for the start of one.
+BACKREFERENCE = re_compile(r'\\\\|\\[1-9]|\(\?P=')
+
+
+def is_embeddable(pattern: Pattern) -> bool:
+    # Whether a pattern means the same within a larger pattern: its group names could clash with others, and its
+    # backreferences would refer to the groups of the larger pattern. (Backreferences are found conservatively.)
+    return not pattern.groupindex and all(m.group() == '\\\\' for m in BACKREFERENCE.finditer(pattern.pattern))
+
+
+def collect_literals(grammar: ParsedGrammar) -> List[str]:
+    # The literals of the rules, in order of first appearance.
+    literals: Dict[str, None] = {}
+
+    def visit(ast: AST):
+        if isinstance(ast, Literal):
+            literals[ast.string] = None
+        elif isinstance(ast, PatternMatch):
+            visit(ast.match)
+        elif isinstance(ast, Sequence):
+            for sub_ast in ast.asts:
+                visit(sub_ast)
+        elif isinstance(ast, ParameterizedSequence):
+            visit(ast.sequence)
+            visit(ast.parameter)
+        elif isinstance(ast, NamedProduction):
+            for part in ast.parts:
+                visit(part)
+
+    for rule in grammar.rules.values():
+        for production in rule.productions:
+            visit(production)
+    return list(literals)
+
+
+def compile_lexer(grammar: ParsedGrammar, skip: str = r'\s+') -> 'Lexer':
+    """
+    Builds a lexer for the tokens of a grammar: the literals of its rules, and the tokens declared in its tokens
+    section. Text matching `skip` (whitespace, by default) is skipped between tokens.
+    """
+    # Literals are their own kind, as in compiled grammars, unless a declared token matches the same literal.
+    literals: Dict[str, str] = {literal: literal for literal in collect_literals(grammar)}
+    regexes: List[Tuple[str, Pattern]] = []
+    for name, matcher in grammar.token_matchers.items():
+        if isinstance(matcher, LiteralMatcher):
+            literals[matcher.literal] = name
+        else:
+            regexes.append((name, matcher.pattern))
+    return Lexer(literals, regexes, skip)
+
+
+class Lexer:
+    """
+    A longest-match scanner for a set of literals and of regular expressions, each of which is a kind of token. Between
+    tokens, text matching the `skip` pattern is skipped. When more than one kind matches the longest text, literals are
+    preferred over expressions (so that keywords are not taken for identifiers), and expressions are preferred in the
+    order they are given. Kinds which only match empty text are never chosen.
+
+    All kinds are combined into a single pattern, in the manner of the master pattern of `derpgen.grammar.tokenize`, so
+    that each token is found with one match, which also skips the text before it. The literals share a single
+    alternative, ordered from the longest to the shortest, which matches the longest of them. Alternatives are told
+    apart by the names of their groups, so any groups of the `skip` pattern and of the expressions are left alone.
+    Expressions with named groups or backreferences are matched on their own instead, at the start of each token, since
+    those only hold within them.
+    """
+
+    def __init__(self, literals: Dict[str, str], regexes: List[Tuple[str, Pattern]], skip: str = r'\s+'):
+        self.literals = dict(literals)
+        self.regexes = list(regexes)
+        parts = [f"(?:{skip})?"]
+        # The alternatives, in order of preference: the name of the group of each alternative of the combined pattern,
+        # or else the expression matched on its own, along with the kind of its tokens (None for the literals).
+        alternatives: List[Tuple[Union[str, Pattern], Optional[str]]] = []
+        if literals:
+            literal_alternatives = '|'.join(map(escape, sorted(literals, key=len, reverse=True)))
+            parts.append(f"(?:(?=(?P<_k{len(alternatives)}>{literal_alternatives}))|)")
+            alternatives.append((f'_k{len(alternatives)}', None))
+        for name, pattern in regexes:
+            if not is_embeddable(pattern):
+                alternatives.append((pattern, name))
+                continue
+            flags = ''.join(letter for flag, letter in SCOPED_FLAGS if pattern.flags & flag)
+            regex = f"(?{flags}:{pattern.pattern})" if flags else pattern.pattern
+            parts.append(f"(?:(?=(?P<_k{len(alternatives)}>{regex}))|)")
+            alternatives.append((f'_k{len(alternatives)}', name))
+        self._pattern = re_compile(''.join(parts))
+        # Each entry is the index of a group of the combined pattern, or an expression matched on its own, and a kind.
+        self._groups = tuple((self._pattern.groupindex[a] if isinstance(a, str) else a, kind)
+                             for a, kind in alternatives)
+
+    def _scan(self, text: str, read: Optional[Callable[[], str]] = None, window: int = 0,
+              lexemes: bool = True) -> Iterator[Union[Lexeme, str]]:
+        # Scans `text`, extended with chunks returned by `read` (when given) until it returns an empty chunk. A token
+        # is only matched once `window` characters past its start are buffered, or the input has ended, so that no
+        # pattern can see the end of a chunk instead of the text which follows it. Unless `lexemes` is set, only the
+        # text of the tokens is generated.
+        match = self._pattern.match
+        groups = self._groups
+        literals = self.literals
+        base = 0
+        pos = 0
+        end = len(text)
+        while True:
+            if read is not None and end - pos < window:
+                chunk = read()
+                if chunk:
+                    text = text[pos:] + chunk
+                    base += pos
+                    pos = 0
+                    end = len(text)
+                    continue
+                read = None
+            spans = match(text, pos).regs
+            start = spans[0][1]
+            if start == end:
+                return
+            # Take the longest match. Alternatives which do not match have an end of -1.
+            token_end = start
+            kind: Optional[str] = None
+            for group, candidate_kind in groups:
+                if group.__class__ is int:
+                    group_end = spans[group][1]
+                else:
+                    m = group.match(text, start)
+                    group_end = -1 if m is None else m.end()
+                if group_end > token_end:
+                    token_end = group_end
+                    kind = candidate_kind or ''
+            if kind is None:
+                raise LexerException(base + start, text[start:start + 20])
+            token = text[start:token_end]
+            yield Lexeme(kind or literals[token], token, base + start) if lexemes else token
+            pos = token_end
+
+    def tokens(self, text: str) -> Iterator[Lexeme]:
+        """Generates the tokens of a text."""
+        return self._scan(text)
+
+    def tokens_from_stream(self, stream: Stream, chunk_size: int = 1 << 20) -> Iterator[Lexeme]:
+        """
+        Generates the tokens of a file object or a memory-mapped file, which is read `chunk_size` characters (or bytes)
+        at a time and never held in memory as a whole. Binary streams are decoded as UTF-8. Tokens, along with the text
+        skipped before them and the text which their patterns need to see past them, must be shorter than `chunk_size`.
+        """
+        return self._scan('', stream_reader(stream, chunk_size), chunk_size)
+
+    def values(self, text: str) -> Iterator[str]:
+        """Generates the text of each of the tokens of a text, which are the values parsed by compiled grammars."""
+        return self._scan(text, lexemes=False)
+
+    def values_from_stream(self, stream: Stream, chunk_size: int = 1 << 20) -> Iterator[str]:
+        return self._scan('', stream_reader(stream, chunk_size), chunk_size, lexemes=False)
+
+
+def stream_reader(stream: Stream, chunk_size: int) -> Callable[[], str]:
+    decoder = getincrementaldecoder('utf-8')()
+
+    def read() -> str:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not isinstance(chunk, bytes):
+                return chunk
+            # A chunk may end within a character, in which case it decodes to less, or even to nothing.
+            text = decoder.decode(chunk, final=not chunk)
+            if text or not chunk:
+                return text
+
+    return read
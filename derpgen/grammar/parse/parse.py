@@ -1,13 +1,13 @@
 from .parser import *
 from ..tokenize import Token
 
-from typing import List
+from typing import Iterable
 
 
 __all__ = ['parse_tokens']
 
 
-def parse_tokens(tokens: List[Token]) -> ParsedGrammar:
+def parse_tokens(tokens: Iterable[Token]) -> ParsedGrammar:
     parser = Parser(tokens)
     return parser.parse()
 
@@ -2,8 +2,9 @@ from .ast import *
 from .matcher import *
 from ..tokenize import *
 
+from collections import deque
 from re import compile as re_compile
-from typing import Dict, List, NamedTuple, Optional, Set
+from typing import Deque, Dict, Iterable, Iterator, NamedTuple, Optional, Set
 
 
 __all__ = ['Parser', 'ParsedGrammar', 'RuleDict', 'TokenMatcherDict', 'StartSymbolSet']
@@ -24,14 +25,15 @@ class EndOfRule(Exception):
 
 
 class Parser:
-    def __init__(self, tokens: List[Token]):
-        # The parser ignores whitespace and comments.
-        self.tokens = list(filter(lambda t: (t.type not in TokenTypeClasses.WHITESPACE and
-                                             t.type not in TokenTypeClasses.COMMENTS),
-                                  tokens))
-        if not self.tokens:
+    def __init__(self, tokens: Iterable[Token]):
+        # The parser ignores whitespace and comments. Tokens are consumed from the stream as the parser advances, and
+        # only the current token and the lookahead are buffered.
+        self.tokens: Iterator[Token] = filter(lambda t: (t.type not in TokenTypeClasses.WHITESPACE and
+                                                         t.type not in TokenTypeClasses.COMMENTS),
+                                              tokens)
+        self.buffer: Deque[Token] = deque()
+        if not self.fill(1):
             raise ValueError  # TODO
-        self.index = 0
         self.rules: RuleDict = {}
         self.token_matchers: TokenMatcherDict = {}
         self.start_symbols: StartSymbolSet = set()
@@ -41,9 +43,20 @@ class Parser:
             'start':    self.parse_start,
         }
 
+    def fill(self, n: int) -> bool:
+        """Buffers the next `n` tokens, returning whether there were enough of them."""
+        while len(self.buffer) < n:
+            token = next(self.tokens, None)
+            if token is None:
+                return False
+            self.buffer.append(token)
+        return True
+
     @property
     def token(self) -> Token:
-        return self.tokens[self.index]
+        if not self.fill(1):
+            raise IndexError("no tokens remain")
+        return self.buffer[0]
 
     @property
     def has_tokens(self) -> bool:
@@ -51,12 +64,15 @@ class Parser:
 
     @property
     def next_token(self) -> Optional[Token]:
-        if self.index + 1 >= len(self.tokens):
+        if not self.fill(2):
             return None
-        return self.tokens[self.index + 1]
+        return self.buffer[1]
 
     def advance(self, increment: int = 1):
-        self.index += increment
+        for _ in range(increment):
+            if not self.fill(1):
+                break
+            self.buffer.popleft()
 
     def parse(self) -> ParsedGrammar:
         while self.has_tokens:
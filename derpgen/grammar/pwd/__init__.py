@@ -1,3 +1,9 @@
+from .batch import *
+from .classes import *
+from .cubic import *
+from .forest import *
 from .grammar import *
 from .pwd import *
+from .registry import *
+from .stats import *
 from .tree import *
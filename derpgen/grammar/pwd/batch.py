@@ -0,0 +1,139 @@
+from .grammar import *
+from .pwd import *
+from .tree import *
+
+from derpgen.utility import ParseSession
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from os import cpu_count
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+
+__all__ = ['parse_many', 'parse_shared', 'SharedParses']
+
+
+Value = TypeVar('Value')
+
+
+# Each worker process loads the grammar once, when it starts, and keeps it for all of the inputs it parses. What the
+# grammar learns about itself (e.g., the nullability and FIRST sets of its nodes) is kept along with it, so later inputs
+# are parsed faster. Inputs are parsed as if by `parse`, each in a fresh session.
+worker_grammar: Optional[Grammar] = None
+
+
+def load_worker_grammar(data: bytes):
+    global worker_grammar
+    worker_grammar = loads(data)
+
+
+def parse_in_worker(values: List[Value]) -> List[Tree[Value]]:
+    return parse(values, worker_grammar)
+
+
+def parse_many(inputs: Iterable[Iterable[Value]], g: Grammar, workers: Optional[int] = None,
+               window: Optional[int] = None) -> Iterator[List[Tree[Value]]]:
+    """
+    Parses each of the inputs like `parse`, in a pool of `workers` processes (as many as there are processors, by
+    default), and generates their parse trees in the order of the inputs.
+
+    The grammar is pickled, so its reductions must be picklable: the reductions of compiled grammars are, and other
+    functions can be registered under a name (see `register_reduction`). The values of the inputs and the trees of their
+    parses must be picklable too. Inputs are read as they are needed: at most `window` of them (twice the number of
+    workers, by default) are being parsed or waiting to be generated at any time, so the inputs can be any iterable.
+    """
+    if workers is None:
+        workers = cpu_count() or 1
+    if window is None:
+        window = 2 * workers
+    data = dumps(g, protocol=HIGHEST_PROTOCOL)
+    with ProcessPoolExecutor(workers, initializer=load_worker_grammar, initargs=(data,)) as executor:
+        pending: Deque[Future] = deque()
+        values = iter(inputs)
+        for input_values in islice(values, window):
+            pending.append(executor.submit(parse_in_worker, list(input_values)))
+        while pending:
+            trees = pending.popleft().result()
+            for input_values in islice(values, 1):
+                pending.append(executor.submit(parse_in_worker, list(input_values)))
+            yield trees
+
+
+class TrieNode:
+    """A prefix shared by some of the inputs of a batch: the next values which follow it, and the inputs it ends."""
+
+    __slots__ = ('children', 'ends')
+
+    def __init__(self):
+        self.children: Dict[Any, TrieNode] = {}
+        self.ends: List[int] = []
+
+
+def build_trie(inputs: Iterable[Iterable[Value]]) -> Tuple[TrieNode, int, int]:
+    # Returns the trie of the inputs, their number, and their total number of values.
+    root = TrieNode()
+    count = total = 0
+    for index, values in enumerate(inputs):
+        node = root
+        for c in values:
+            child = node.children.get(c)
+            if child is None:
+                child = node.children[c] = TrieNode()
+            node = child
+            total += 1
+        node.ends.append(index)
+        count = index + 1
+    return root, count, total
+
+
+class SharedParses:
+    """
+    The parse trees of each of a batch of inputs (see `parse_shared`), in the order of the inputs, along with the work
+    saved by sharing their prefixes: `values` is the total number of values in the inputs, and `derived` the number of
+    values which were actually consumed. The rest were either part of a prefix which had already been consumed, or
+    followed a prefix which the grammar could not accept.
+    """
+
+    def __init__(self, parses: List[List[Tree[Value]]], values: int, derived: int):
+        self.parses = parses
+        self.values = values
+        self.derived = derived
+
+    @property
+    def saved(self) -> int:
+        """The number of values which did not need to be consumed."""
+        return self.values - self.derived
+
+    def __repr__(self) -> str:
+        return f"SharedParses({len(self.parses)} inputs, {self.derived} of {self.values} values derived)"
+
+
+def parse_shared(inputs: Iterable[Iterable[Value]], g: Grammar,
+                 session: Optional[ParseSession] = None) -> SharedParses:
+    """
+    Parses each of the inputs like `parse`, deriving each prefix they share only once. The inputs are arranged in a trie
+    (so their values must be hashable), which is walked depth first by a `Parser`, forked wherever the inputs diverge
+    (see `Parser.fork`). All of the inputs are parsed in the same session, which is a fresh one unless one is given.
+    """
+    root, count, total = build_trie(inputs)
+    parses: List[List[Tree[Value]]] = [[] for _ in range(count)]
+    derived = 0
+    stack: List[Tuple[Parser[Value], TrieNode]] = [(Parser(g, session), root)]
+    while stack:
+        parser, node = stack.pop()
+        for index in node.ends:
+            parses[index] = parser.finish()
+        children = list(node.children.items())
+        for i, (c, child) in enumerate(children):
+            # The last child takes over the parser, which no other will need.
+            child_parser = parser if i == len(children) - 1 else parser.fork()
+            derived += 1
+            try:
+                child_parser.feed(c)
+            except ParseException:
+                # The inputs which start with the child's prefix have no parses, which they already hold.
+                continue
+            stack.append((child_parser, child))
+    return SharedParses(parses, total, derived)
@@ -0,0 +1,103 @@
+from .grammar import *
+
+from typing import Any, Dict, FrozenSet, List, Pattern, Set, Tuple
+
+
+__all__ = ['TokenClass', 'TokenClassifier']
+
+
+# Most of the values a grammar is fed are told apart by no more than which of its `Tok` and `Pat` leaves they match:
+# any two identifiers, say, match the same pattern and none of the literals. Such values have the same derivatives, up
+# to the values stored in their leaves. A classifier partitions values into token classes up front, so that derivatives can be
+# taken with respect to a class instead of a value. See `Parser` for how the values are then restored.
+#
+# Derivatives are only memoized on the nodes they were taken of, and only while they are in use, which is rarely longer
+# than the value they consume. Each class therefore also keeps the derivatives of the nodes of the grammar with respect
+# to itself, which are reused whenever a value of the class meets the same node again. There are at most as many of
+# these as there are nodes, so the memory they take does not grow with the input.
+
+
+class TokenClass:
+    """
+    The values which match the same leaves of a grammar: the literal of the `Tok` leaves they are equal to, if any, and
+    the patterns of the `Pat` leaves they match. Classes are interned by their classifier, so they are compared by
+    identity. `derivatives` maps the ids of the grammar's `nodes` to their derivatives with respect to the class.
+    """
+
+    __slots__ = ('literal', 'patterns', 'nodes', 'derivatives')
+
+    def __init__(self, literal: Tuple[Any, ...], patterns: FrozenSet[Pattern], nodes: FrozenSet[int]):
+        # The literal is wrapped in a tuple, which is empty for values equal to none of the literals.
+        self.literal = literal
+        self.patterns = patterns
+        self.nodes = nodes
+        self.derivatives: Dict[int, Grammar] = {}
+
+    def matches_tok(self, t: Any) -> bool:
+        return bool(self.literal) and self.literal[0] == t
+
+    def matches_pat(self, p: Pattern) -> bool:
+        return p in self.patterns
+
+    def __repr__(self) -> str:
+        literal = repr(self.literal[0]) if self.literal else '-'
+        return f"TokenClass({literal}, {sorted(p.pattern for p in self.patterns)})"
+
+
+def scan(g: Grammar) -> Tuple[Set[Any], Set[Pattern], Set[int]]:
+    # Collects the literals and patterns of the leaves reachable from a grammar, and the ids of all of its nodes.
+    literals: Set[Any] = set()
+    patterns: Set[Pattern] = set()
+    seen: Set[int] = set()
+    stack: List[Grammar] = [g]
+    while stack:
+        g = stack.pop()
+        if id(g) in seen:
+            continue
+        seen.add(id(g))
+        cls = g.__class__
+        if cls is Tok:
+            literals.add(g.t)
+        elif cls is Pat:
+            patterns.add(g.p)
+        elif cls is Rep or cls is Red:
+            stack.append(g.g)
+        elif cls is Alt or cls is Seq:
+            stack.append(g.g1)
+            stack.append(g.g2)
+        elif cls is Ref:
+            stack.append(g.rd[g.n])
+    return literals, patterns, seen
+
+
+class TokenClassifier:
+    """
+    Maps values to the token classes of a grammar. Each distinct value is classified once: its class is cached, so
+    classifying the values of an input costs a dictionary lookup for values which have been seen before.
+    """
+
+    def __init__(self, g: Grammar):
+        # The grammar is kept so that the ids of its nodes stay valid.
+        self.grammar = g
+        self.literals, patterns, nodes = scan(g)
+        self.patterns = tuple(patterns)
+        self.nodes = frozenset(nodes)
+        self._classes: Dict[Tuple[Tuple[Any, ...], FrozenSet[Pattern]], TokenClass] = {}
+        self._cache: Dict[Any, TokenClass] = {}
+
+    def classify(self, value: Any) -> TokenClass:
+        c = self._cache.get(value)
+        if c is None:
+            literal = (value,) if value in self.literals else ()
+            matched = frozenset(p for p in self.patterns if p.fullmatch(value))
+            key = (literal, matched)
+            c = self._classes.get(key)
+            if c is None:
+                c = self._classes[key] = TokenClass(literal, matched, self.nodes)
+            self._cache[value] = c
+        return c
+
+    @property
+    def classes(self) -> List[TokenClass]:
+        """The classes of the values classified so far."""
+        return list(self._classes.values())
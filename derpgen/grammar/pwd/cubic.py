@@ -0,0 +1,181 @@
+from .forest import *
+from .grammar import *
+from .grammar import settled_first
+from .pwd import *
+from .pwd import derive_tok, derive_pat, in_first
+from .tree import *
+
+from derpgen.utility import ParseSession
+
+from typing import Any, Iterable, List, Optional, Set, Tuple, TypeVar
+from weakref import ref as weak_ref
+
+
+__all__ = ['CubicParser', 'parse_cubic']
+
+
+Value = TypeVar('Value')
+
+
+# The engine of Adams et al., "On the Complexity and Performance of Parsing with Derivatives" (PLDI 2016), which they
+# show to take cubic time in the worst case. It differs from the one in `pwd` in three ways:
+#
+# - Each node memoizes a single derivative, keyed by the position of the value it was taken for instead of by the value.
+#   Each node is derived at most once per position, and a lookup is a single identity test.
+# - Derivatives are compacted as they are built: the children of each node are derived first, and the node is then
+#   built from them by the grammar's constructors, which apply the compaction rules. A node which is empty by the time
+#   it is derived, or whose FIRST set is settled and does not hold the value (see `first_set`), derives to `Nil`. There
+#   is no separate compaction pass.
+# - Nullability is a fixed point which is computed once for each node and stored on it (see `fix`), so each node is
+#   only visited again while its own nullability is unsettled. The empty parses of the nullable left side of a sequence
+#   are not computed while deriving: they are deferred (see `Deferred`) until the forest is traversed, and so are only
+#   computed for the sequences which take part in a parse.
+#
+# Parses are always built into a shared packed forest, since the work of listing them is not bounded by any polynomial.
+
+
+def null_forest(g: Grammar) -> Tree[Value]:
+    # The forest of the empty parses of a nullable grammar, computed when it is first needed.
+    return Deferred(lambda: pack(parse_null_forest(g))[0])
+
+
+class Step:
+    """
+    A position in the input. The derivatives taken at the position are memoized on the nodes they were taken of, and
+    kept alive by the step until the value at the position has been consumed. Afterwards, the step is only a key.
+    `tied` holds the ids of the references whose derivatives were looked up at the step (see `derive_at`).
+    """
+
+    __slots__ = ('position', 'nodes', 'tied')
+
+    def __init__(self, position: int):
+        self.position = position
+        self.nodes: List[Grammar] = []
+        self.tied: Set[int] = set()
+
+
+def derive_step(g: Grammar, c: Value, position: int) -> Grammar:
+    """Returns the derivative of a grammar with respect to the value at a position of the input."""
+    step = Step(position)
+    d = derive_at(g, c, step)
+    # Memoized derivatives hold the steps they were taken at, which must not keep every later derivative alive.
+    step.nodes = []
+    step.tied = set()
+    return d
+
+
+def derive_at(g: Grammar, c: Value, step: Step) -> Grammar:
+    # Grammars can be as deep as the input nests, so they are derived with an explicit stack, as in `derive`: each node
+    # is visited once to look up its derivative or schedule its children, and once more to build its derivative out of
+    # theirs, which are popped off the stack of the derivatives built so far.
+    #
+    # The derivative of a rule may refer to itself, so a reference to it is memoized before its body is derived. If the
+    # body turns out to be empty, or to only accept the empty input, the reference is replaced by the body for the rest
+    # of the step. (Recursive occurrences keep referring to the body through the reference.) So is a reference which
+    # was never tied back to while the body was derived, as in `derive`: otherwise, each value of a right-recursive
+    # input would wrap the derivative in one more reference.
+    work: List[Tuple[Grammar, Any]] = [(g, None)]
+    built: List[Grammar] = []
+    while work:
+        g, frame = work.pop()
+        cls = g.__class__
+        if frame is None:
+            entry = g.step_memo
+            if entry is not None and entry[0] is step:
+                d = entry[1]()
+                if d is not None:
+                    if cls is Ref:
+                        step.tied.add(id(g))
+                    built.append(d)
+                    continue
+            if cls is Ref:
+                d = ref(g.n, {})
+                g.step_memo = (step, weak_ref(d))
+                step.nodes.append(d)
+                work.append((g, d))
+                work.append((g.rd[g.n], None))
+                continue
+            first = settled_first(g)
+            if cls is Nil or cls is Eps or (first is not None and not in_first(first, c)) or is_empty(g):
+                d = nil()
+            elif cls is Tok:
+                d = derive_tok(c, g.t)
+            elif cls is Pat:
+                d = derive_pat(c, g.p)
+            elif cls is Alt:
+                work.append((g, True))
+                work.append((g.g2, None))
+                work.append((g.g1, None))
+                continue
+            elif cls is Seq:
+                # The right side is only derived when the left side is nullable, which the second visit is told.
+                nullable = is_nullable(g.g1)
+                work.append((g, nullable))
+                if nullable:
+                    work.append((g.g2, None))
+                work.append((g.g1, None))
+                continue
+            elif cls is Rep or cls is Red:
+                work.append((g, True))
+                work.append((g.g, None))
+                continue
+            else:
+                raise RuntimeError(f"Unknown grammar class: {cls.__name__}")
+        elif cls is Ref:
+            body = frame.rd[frame.n] = built.pop()
+            if body.__class__ is Nil or body.__class__ is Eps or id(g) not in step.tied:
+                g.step_memo = (step, weak_ref(body))
+                built.append(body)
+            else:
+                built.append(frame)
+            continue
+        elif cls is Alt:
+            d2 = built.pop()
+            d = alt(built.pop(), d2)
+        elif cls is Seq:
+            if frame:
+                d2 = built.pop()
+                d = alt(seq(built.pop(), g.g2), seq(eps([null_forest(g.g1)]), d2))
+            else:
+                d = seq(built.pop(), g.g2)
+        elif cls is Rep:
+            d = seq(built.pop(), g)
+        else:
+            d = red(built.pop(), g.f)
+        g.step_memo = (step, weak_ref(d))
+        step.nodes.append(d)
+        built.append(d)
+    return built[0]
+
+
+class CubicParser(Parser[Value]):
+    """
+    An incremental parser like `Parser`, with the engine of Adams et al. (see `derpgen.grammar.pwd.cubic`), which takes
+    cubic time in the worst case. Parses are always built into a forest, so the parser's session must build forests (a
+    fresh one does, unless one is given). Parsing by token class is not supported.
+    """
+
+    def __init__(self, g: Grammar, session: Optional[ParseSession] = None):
+        if session is None:
+            session = ParseSession(forest=True)
+        elif not session.forest:
+            raise ValueError("The cubic engine requires a session which builds forests.")
+        super().__init__(g, session)
+
+    def _derive(self, c: Value) -> Grammar:
+        return derive_step(self._grammar, c, self._count)
+
+    def _is_empty(self, d: Grammar) -> bool:
+        # The emptiness of each node is solved while deriving it anyway, and that of the new one will be when the next
+        # value is consumed.
+        return is_empty(d)
+
+
+def parse_cubic(values: Iterable[Value], g: Grammar, session: Optional[ParseSession] = None) -> List[Tree[Value]]:
+    """Parses the values like `parse`, with the engine of `CubicParser`."""
+    parser = CubicParser(g, session)
+    try:
+        parser.feed_many(values)
+    except ParseException:
+        return []
+    return parser.finish()
@@ -0,0 +1,325 @@
+from .tree import *
+
+from derpgen.utility import ParseBudget
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+
+__all__ = [
+    'Packed', 'Reduction', 'Deferred', 'BranchLeft', 'BranchRight', 'Compose', 'pack', 'reduction', 'iter_trees',
+    'count_trees', 'TokenLeaf', 'TOKEN_LEAF', 'fill_tokens',
+]
+
+
+T = TypeVar('T')
+
+
+# A shared packed parse forest (SPPF) represents all of the parse trees of an input at once. Subtrees are shared by
+# reference instead of copied, ambiguities are packed into a single node instead of multiplied out, and reductions are
+# recorded instead of applied. The forest uses the same `Branch`, `Leaf`, and `Empty` nodes as plain trees, alongside
+# the two nodes below. Forests are built without duplicating subtrees, so their size stays polynomial in the input even
+# when the number of trees they represent is exponential.
+
+
+@dataclass
+class Packed(Tree):
+    """An ambiguity: each of the alternatives is a forest of possible trees for the same input."""
+    alternatives: Tuple[Tree[T], ...]
+
+
+@dataclass
+class Reduction(Tree):
+    """A reduction which has not been applied yet: `f` is applied to each of the trees of the `tree` forest."""
+    f: Callable[[Tree[T]], Tree[T]]
+    tree: Tree[T]
+
+
+class Deferred(Tree):
+    """
+    A forest which is only computed when it is first traversed, by calling `compute`. Deferred forests are compared by
+    identity, so that comparing forests which hold them does not compute them.
+    """
+
+    __slots__ = ('compute', '_forest')
+
+    def __init__(self, compute: Callable[[], Tree[T]]):
+        self.compute = compute
+        self._forest = None
+
+    @property
+    def forest(self) -> Tree[T]:
+        if self._forest is None:
+            self._forest = self.compute()
+            self.compute = None
+        return self._forest
+
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def __repr__(self) -> str:
+        return f"Deferred({self._forest!r})" if self._forest is not None else "Deferred(...)"
+
+
+@dataclass
+class TokenLeaf(Tree):
+    """
+    The leaf of a value which is not known yet: derivatives taken with respect to token classes hold this leaf instead
+    of the value they consumed. Each of the trees of a forest has one per value of the input, in input order, so the
+    values are restored by position (see `fill_tokens`).
+    """
+    pass
+
+
+TOKEN_LEAF: Tree = TokenLeaf()
+
+
+# Compaction introduces reductions of its own, which only rearrange trees. They are objects rather than closures so that
+# they can be applied to forests directly instead of being recorded, since their results are valid forests.
+
+
+class BranchLeft:
+    __slots__ = ('left',)
+
+    def __init__(self, left: Tree[T]):
+        self.left = left
+
+    def __call__(self, right: Tree[T]) -> Tree[T]:
+        return Branch(self.left, right)
+
+
+class BranchRight:
+    __slots__ = ('right',)
+
+    def __init__(self, right: Tree[T]):
+        self.right = right
+
+    def __call__(self, left: Tree[T]) -> Tree[T]:
+        return Branch(left, self.right)
+
+
+class Compose:
+    """
+    The composition of two reductions: `g` is applied first. Compositions nest as deep as the input is long (e.g., one
+    per value of a repetition), so they are applied with an explicit stack rather than by calling each other.
+    """
+
+    __slots__ = ('f', 'g')
+
+    def __init__(self, f: Callable[[Tree[T]], Tree[T]], g: Callable[[Tree[T]], Tree[T]]):
+        self.f = f
+        self.g = g
+
+    def __call__(self, t: Tree[T]) -> Tree[T]:
+        for f in composed(self):
+            t = f(t)
+        return t
+
+
+def composed(f: Callable[[Tree[T]], Tree[T]]) -> Iterator[Callable[[Tree[T]], Tree[T]]]:
+    # Generates the reductions which make up a composition, in the order they are applied.
+    stack = [f]
+    while stack:
+        f = stack.pop()
+        if f.__class__ is Compose:
+            stack.append(f.f)
+            stack.append(f.g)
+        else:
+            yield f
+
+
+# The steps which `iter_trees` takes once the trees of a node's children have been built.
+
+
+class ApplyReduction:
+    __slots__ = ('f',)
+
+    def __init__(self, f: Callable[[Tree[T]], Tree[T]]):
+        self.f = f
+
+
+BUILD_BRANCH = object()
+
+
+def pack(ts: List[Tree[T]]) -> List[Tree[T]]:
+    """Packs a list of forests into a list holding at most one forest."""
+    if len(ts) <= 1:
+        return ts
+    alternatives: List[Tree[T]] = []
+    for t in ts:
+        if t.__class__ is Packed:
+            alternatives.extend(t.alternatives)
+        else:
+            alternatives.append(t)
+    return [Packed(tuple(alternatives))]
+
+
+def reduce_forest(f: Callable[[Tree[T]], Tree[T]], t: Tree[T]) -> Tree[T]:
+    for f in composed(f):
+        cls = f.__class__
+        t = f(t) if cls is BranchLeft or cls is BranchRight else Reduction(f, t)
+    return t
+
+
+def reduction(f: Callable[[Tree[T]], Tree[T]], ts: List[Tree[T]]) -> List[Tree[T]]:
+    """Reduces each of a list of forests. Reductions other than those of compaction are recorded, not applied."""
+    return [reduce_forest(f, t) for t in ts]
+
+
+def iter_trees(forest: Tree[T], budget: Optional[ParseBudget] = None) -> Iterator[Tree[T]]:
+    """
+    Generates the trees represented by a forest, one at a time. When a budget is given, each step of the expansion ticks
+    its clock (see `ParseBudget`).
+    """
+    # Forests can be deep, so they are expanded with an explicit stack. The work left to do (forests to expand, and
+    # reductions and branches to build out of the trees they expand to) and the trees built so far are linked lists of
+    # pairs, which each choice between the alternatives of a packed node saves as they are, in O(1). Once a tree has been
+    # generated, the most recent choice resumes with its next alternative, so the trees come in the same order as if
+    # each node generated the product of those of its children.
+    choices: List[Tuple[Any, Any, Tuple[Tree[T], ...], int]] = []
+    work: Any = (forest, None)
+    built: Any = None
+    while True:
+        if budget is not None:
+            budget.tick()
+        if work is None:
+            yield built[0]
+            if not choices:
+                return
+            work, built, alternatives, i = choices.pop()
+            if i + 1 < len(alternatives):
+                choices.append((work, built, alternatives, i + 1))
+            work = (alternatives[i], work)
+            continue
+        t, work = work
+        cls = t.__class__
+        if cls is Packed:
+            alternatives = t.alternatives
+            if len(alternatives) > 1:
+                choices.append((work, built, alternatives, 1))
+            work = (alternatives[0], work)
+        elif cls is Reduction:
+            work = (t.tree, (ApplyReduction(t.f), work))
+        elif cls is Branch:
+            work = (t.left, (t.right, (BUILD_BRANCH, work)))
+        elif cls is Deferred:
+            work = (t.forest, work)
+        elif cls is ApplyReduction:
+            tree, built = built
+            built = (t.f(tree), built)
+        elif t is BUILD_BRANCH:
+            right, built = built
+            left, built = built
+            built = (Branch(left, right), built)
+        else:
+            built = (t, built)
+
+
+def count_trees(forest: Tree[T]) -> int:
+    """Counts the trees represented by a forest without building them. Shared subtrees are only counted once."""
+    counts: Dict[int, int] = {}
+    # Forests can be deep, so they are traversed with an explicit stack. Each node is visited twice: once to schedule
+    # its children, and once more to combine their counts.
+    stack: List[Tuple[Tree[T], bool]] = [(forest, False)]
+    while stack:
+        t, ready = stack.pop()
+        if id(t) in counts:
+            continue
+        cls = t.__class__
+        if cls is Packed:
+            children = t.alternatives
+        elif cls is Reduction:
+            children = (t.tree,)
+        elif cls is Deferred:
+            children = (t.forest,)
+        elif cls is Branch:
+            children = (t.left, t.right)
+        else:
+            counts[id(t)] = 1
+            continue
+        if not ready:
+            stack.append((t, True))
+            stack.extend((c, False) for c in children)
+        elif cls is Packed:
+            counts[id(t)] = sum(counts[id(c)] for c in children)
+        elif cls is Reduction or cls is Deferred:
+            counts[id(t)] = counts[id(children[0])]
+        else:
+            counts[id(t)] = counts[id(t.left)] * counts[id(t.right)]
+    return counts[id(forest)]
+
+
+def count_tokens(forest: Tree[T]) -> Dict[int, int]:
+    # Maps the id of each node of a forest to the number of token leaves in each of its trees, which is the same for all
+    # of them. The alternatives of a packed node cover the same values, so only the first one is counted.
+    counts: Dict[int, int] = {}
+    stack: List[Tuple[Tree[T], bool]] = [(forest, False)]
+    while stack:
+        t, ready = stack.pop()
+        if id(t) in counts:
+            continue
+        cls = t.__class__
+        if cls is Packed:
+            children = t.alternatives
+        elif cls is Reduction:
+            children = (t.tree,)
+        elif cls is Deferred:
+            children = (t.forest,)
+        elif cls is Branch:
+            children = (t.left, t.right)
+        else:
+            counts[id(t)] = 1 if t is TOKEN_LEAF else 0
+            continue
+        if not ready:
+            stack.append((t, True))
+            stack.extend((c, False) for c in children)
+        elif cls is Branch:
+            counts[id(t)] = counts[id(t.left)] + counts[id(t.right)]
+        else:
+            counts[id(t)] = counts[id(children[0])]
+    return counts
+
+
+def fill_tokens(forest: Tree[T], values: Sequence[T]) -> Tree[T]:
+    """
+    Returns a copy of a forest in which the token leaves are replaced by leaves of the values, in order. A subforest may
+    be shared between positions of the input, so it is copied once per position it occurs at. Subforests without token
+    leaves are kept as they are.
+    """
+    counts = count_tokens(forest)
+    if counts[id(forest)] != len(values):
+        raise ValueError(f"Forest holds {counts[id(forest)]} token leaves, but {len(values)} values were given.")
+    filled: Dict[Tuple[int, int], Tree[T]] = {}
+    stack: List[Tuple[Tree[T], int, bool]] = [(forest, 0, False)]
+    while stack:
+        t, offset, ready = stack.pop()
+        key = (id(t), offset)
+        if key in filled:
+            continue
+        if not counts[id(t)]:
+            filled[key] = t
+            continue
+        cls = t.__class__
+        if cls is Packed:
+            children = [(a, offset) for a in t.alternatives]
+        elif cls is Reduction:
+            children = [(t.tree, offset)]
+        elif cls is Deferred:
+            children = [(t.forest, offset)]
+        elif cls is Branch:
+            children = [(t.left, offset), (t.right, offset + counts[id(t.left)])]
+        else:
+            filled[key] = Leaf(values[offset])
+            continue
+        if not ready:
+            stack.append((t, offset, True))
+            stack.extend((c, o, False) for c, o in children)
+        elif cls is Packed:
+            filled[key] = Packed(tuple(filled[(id(c), o)] for c, o in children))
+        elif cls is Reduction:
+            filled[key] = Reduction(t.f, filled[(id(t.tree), offset)])
+        elif cls is Deferred:
+            filled[key] = filled[(id(t.forest), offset)]
+        else:
+            filled[key] = Branch(filled[(id(t.left), offset)], filled[(id(t.right), children[1][1])])
+    return filled[(id(forest), 0)]
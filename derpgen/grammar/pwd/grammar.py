@@ -1,13 +1,14 @@
-from .tree import Tree
+from .forest import BranchLeft, BranchRight, Compose, pack, reduction
+from .tree import Empty, Tree
 
-from derpgen.utility import has_class
+from derpgen.utility import current_session, has_class
 
 from dataclasses import dataclass
-from typing import Callable, Dict, Generic, List, Pattern, TypeVar
+from typing import Any, Callable, Dict, FrozenSet, Generic, List, NamedTuple, Optional, Pattern, Type, TypeVar
 
 
 __all__ = [
-    'Grammar', 'unit', 'GrammarDict',
+    'Grammar', 'unit', 'GrammarDict', 'FirstSet',
     'Nil', 'Eps', 'Tok', 'Pat', 'Rep', 'Alt', 'Seq', 'Red', 'Ref',
     'nil', 'eps', 'tok', 'pat', 'rep', 'alt', 'seq', 'red', 'ref',
 ]
@@ -17,9 +18,35 @@ Value = TypeVar('Value')
 RedFunc = Callable[[Tree[Value]], Tree[Value]]
 
 
+# Grammar nodes are allocated for every derivative, so they use `__slots__` instead of a `__dict__`. Each subclass lists
+# its fields as slots.
 @dataclass
 class Grammar(Generic[Value]):
-    pass
+    __slots__ = ('derive_memo', 'compact_memo', 'empty_memo', 'nullable_memo', 'null_memo', 'parse_null_memo',
+                 'forest_memo', 'first_memo', 'step_memo', '__weakref__')
+
+    def __post_init__(self):
+        # Results of the operations in `pwd` and `cubic` are memoized on the nodes they were computed for, so that they
+        # are collected along with them. These are not fields, so they are ignored by comparisons and by `match`.
+        self.derive_memo = None
+        self.compact_memo = None
+        self.empty_memo = None
+        self.nullable_memo = None
+        self.null_memo = None
+        self.parse_null_memo = None
+        self.forest_memo = None
+        self.first_memo = None
+        self.step_memo = None
+
+    # Only the fields are pickled. Memoized results belong to the process which computed them. (Dataclasses list the
+    # names of their fields in `__match_args__`.)
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__match_args__)
+
+    def __setstate__(self, state: tuple):
+        for name, v in zip(self.__match_args__, state):
+            setattr(self, name, v)
+        self.__post_init__()
 
 
 GrammarDict = Dict[str, Grammar]
@@ -27,49 +54,61 @@ GrammarDict = Dict[str, Grammar]
 
 @dataclass
 class Nil(Grammar[Value]):
-    pass
+    __slots__ = ()
+
+    def __reduce__(self) -> str:
+        # Unpickles as the shared `NIL`.
+        return 'NIL'
 
 
 @dataclass
 class Eps(Grammar[Value]):
+    __slots__ = ('ts',)
     ts: List[Tree[Value]]
 
 
 @dataclass
 class Tok(Grammar[Value]):
+    __slots__ = ('t',)
     t: Value
 
 
 @dataclass
 class Pat(Grammar[Value]):
+    __slots__ = ('p',)
     p: Pattern
 
 
 @dataclass
 class Rep(Grammar[Value]):
+    __slots__ = ('g',)
     g: Grammar
 
 
 @dataclass
 class Alt(Grammar[Value]):
+    __slots__ = ('g1', 'g2')
     g1: Grammar
     g2: Grammar
 
 
 @dataclass
 class Seq(Grammar[Value]):
+    __slots__ = ('g1', 'g2')
     g1: Grammar
     g2: Grammar
 
 
 @dataclass
 class Red(Grammar[Value]):
+    __slots__ = ('g', 'f')
     g: Grammar
     f: RedFunc
 
 
 @dataclass
 class Ref(Grammar[Value]):
+    __slots__ = ('n', 'rd')
     n: str
     rd: GrammarDict
 
@@ -85,11 +124,114 @@ def unit(x) -> Grammar:
     return x
 
 
+NIL: Grammar = Nil()
+
+
+# The literals and the patterns of the leaves which can match the first value of a non-empty input a grammar accepts
+# (see `first_set`).
+FirstSet = NamedTuple('FirstSet', [('toks', FrozenSet[Any]),
+                                   ('pats', FrozenSet[Pattern])])
+
+
+NO_FIRST: FirstSet = FirstSet(frozenset(), frozenset())
+
+
+def union_first(f1: FirstSet, f2: FirstSet) -> FirstSet:
+    if not f2.toks and not f2.pats:
+        return f1
+    if not f1.toks and not f1.pats:
+        return f2
+    return FirstSet(f1.toks | f2.toks, f1.pats | f2.pats)
+
+
+def settled_nullable(g: Grammar) -> Optional[bool]:
+    cls = g.__class__
+    if cls is Eps:
+        return True
+    if cls is Nil or cls is Tok or cls is Pat:
+        return False
+    return g.nullable_memo
+
+
+def settled_first(g: Grammar) -> Optional[FirstSet]:
+    if g.__class__ is Eps or g.__class__ is Nil:
+        return NO_FIRST
+    return g.first_memo
+
+
+def settle_facts(g: Grammar) -> Grammar:
+    # Most nodes are built by `derive` out of nodes whose nullability and FIRST set are already settled (see
+    # `is_nullable` and `first_set`), so those of the new node follow from them directly, without solving a fixed
+    # point. Facts which depend on a child which is not settled (e.g., a rule which is still being built) are left to
+    # the fixed points.
+    cls = g.__class__
+    if cls is Alt or cls is Seq:
+        n1 = settled_nullable(g.g1)
+        n2 = settled_nullable(g.g2)
+        if cls is Alt:
+            g.nullable_memo = True if n1 or n2 else None if n1 is None or n2 is None else False
+        else:
+            g.nullable_memo = False if n1 is False or n2 is False else None if n1 is None or n2 is None else True
+        f1 = settled_first(g.g1)
+        if f1 is not None and (cls is Alt or n1 is not None):
+            if cls is Seq and not n1:
+                g.first_memo = f1
+            else:
+                f2 = settled_first(g.g2)
+                if f2 is not None:
+                    g.first_memo = union_first(f1, f2)
+    elif cls is Red:
+        g.nullable_memo = settled_nullable(g.g)
+        g.first_memo = settled_first(g.g)
+    elif cls is Rep:
+        g.nullable_memo = True
+        g.first_memo = settled_first(g.g)
+    return g
+
+
+def hash_consed(cls: Type[Grammar], *parts) -> Grammar:
+    # When the current session keeps a table of nodes, structurally identical nodes are shared. Children are compared
+    # by identity, so this is cheap and applies bottom-up. Nodes built are counted against the session's budget.
+    session = current_session()
+    nodes = session.nodes
+    if nodes is None:
+        if session.budget is not None:
+            session.budget.count_node()
+        return settle_facts(cls(*parts))
+    key = (cls, *map(id, parts))
+    g = nodes.get(key)
+    if g is None:
+        if session.budget is not None:
+            session.budget.count_node()
+        g = nodes[key] = settle_facts(cls(*parts))
+    return g
+
+
+# The constructors of composite nodes compact as they build, by applying the compaction rules which only depend on the
+# classes of the node's children (see `make_compact`): `Nil` children are dropped, `Eps` children with a single tree are
+# folded into reductions, and reductions of reductions are fused. Only the classes of the children are inspected, so the
+# children may be references to rules which are not complete yet. Rules which depend on more than that (e.g., on the
+# emptiness of a cyclic grammar) are left to `make_compact`.
+#
+# Reductions of `Eps` nodes are applied as the nodes are built. When the current session builds forests, they are
+# recorded in the forest instead, as when the empty parses of a grammar are extracted. When it builds no trees at all,
+# `Eps` nodes hold none, and reductions are erased.
+
+
+def reduce_trees(f: RedFunc, ts: List[Tree[Value]]) -> List[Tree[Value]]:
+    if current_session().forest:
+        return reduction(f, ts)
+    return [f(t) for t in ts]
+
+
 def nil() -> Grammar:
-    return Nil()
+    return NIL
 
 
 def eps(ts: List[Tree[Value]]) -> Grammar:
+    budget = current_session().budget
+    if budget is not None:
+        budget.count_eps(len(ts))
     return Eps(ts)
 
 
@@ -104,33 +246,80 @@ def pat(p: Pattern) -> Grammar:
 def rep(g: Grammar) -> Grammar:
     if has_class(g, Rep):
         return g
-    return Rep(unit(g))
+    return star(unit(g))
+
+
+def star(g: Grammar) -> Grammar:
+    # The repetition of any grammar, including a repetition, which `rep` takes to be its own.
+    if g.__class__ is Nil or g.__class__ is Eps:
+        return eps([Empty()])
+    return hash_consed(Rep, g)
+
+
+def alt2(g1: Grammar, g2: Grammar) -> Grammar:
+    cls1 = g1.__class__
+    cls2 = g2.__class__
+    if cls1 is Nil:
+        return g2
+    if cls2 is Nil:
+        return g1
+    if cls1 is Eps and cls2 is Eps:
+        session = current_session()
+        if not session.trees:
+            return g1
+        ts = g1.ts + g2.ts
+        return eps(pack(ts) if session.forest else ts)
+    return hash_consed(Alt, g1, g2)
 
 
 def alt(*gs: Grammar) -> Grammar:
     if not gs:
         raise RuntimeError("No arguments given in call to alt.")
-    if len(gs) == 1:
-        return unit(gs[0])
-    res = Alt(unit(gs[-2]), unit(gs[-1]))
-    for g in reversed(gs[:-2]):
-        res = Alt(unit(g), res)
+    res = unit(gs[-1])
+    for g in reversed(gs[:-1]):
+        res = alt2(unit(g), res)
     return res
 
 
+def seq2(g1: Grammar, g2: Grammar) -> Grammar:
+    cls1 = g1.__class__
+    cls2 = g2.__class__
+    if cls1 is Nil or cls2 is Nil:
+        return NIL
+    if cls1 is Eps:
+        if not current_session().trees:
+            return g2
+        if len(g1.ts) == 1:
+            return red(g2, BranchLeft(g1.ts[0]))
+    if cls2 is Eps:
+        if not current_session().trees:
+            return g1
+        if len(g2.ts) == 1:
+            return red(g1, BranchRight(g2.ts[0]))
+    return hash_consed(Seq, g1, g2)
+
+
 def seq(*gs: Grammar) -> Grammar:
     if not gs:
         raise RuntimeError("No arguments given in call to seq.")
-    if len(gs) == 1:
-        return unit(gs[0])
-    res = Seq(unit(gs[-2]), unit(gs[-1]))
-    for g in reversed(gs[:-2]):
-        res = Seq(unit(g), res)
+    res = unit(gs[-1])
+    for g in reversed(gs[:-1]):
+        res = seq2(unit(g), res)
     return res
 
 
 def red(g: Grammar, f: RedFunc) -> Grammar:
-    return Red(unit(g), f)
+    g = unit(g)
+    cls = g.__class__
+    if cls is Nil:
+        return NIL
+    if not current_session().trees:
+        return g
+    if cls is Eps:
+        return eps(reduce_trees(f, g.ts))
+    if cls is Red:
+        return hash_consed(Red, g.g, Compose(f, g.f))
+    return hash_consed(Red, g, f)
 
 
 def ref(n: str, rd: GrammarDict) -> Grammar:
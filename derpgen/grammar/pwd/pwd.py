@@ -1,18 +1,31 @@
 from .grammar import *
+from .grammar import NIL, NO_FIRST, RedFunc, alt2, seq2, settled_first, star, union_first
+from .classes import *
+from .forest import *
+from .stats import *
+from .stats import measure_grammar
 from .tree import *
 
 from derpgen.utility import *
 
-from typing import Callable, List, TypeVar
+from copy import copy
+from functools import lru_cache
+from time import perf_counter
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, List, Optional, Pattern, Set, Tuple, Type, TypeVar
+from weakref import ref as weak_ref
 
 
-__all__ = ['is_empty', 'is_nullable', 'is_null', 'parse_null', 'derive', 'make_compact', 'parse']
+__all__ = [
+    'is_empty', 'is_nullable', 'is_null', 'parse_null', 'parse_null_forest', 'first_set', 'can_start',
+    'derive', 'make_compact', 'ParseException', 'Parser', 'parse', 'recognize', 'parse_forest', 'parse_iter',
+    'parse_first', 'count_parses',
+]
 
 
 Value = TypeVar('Value')
 
 
-is_empty: Callable[[Grammar], bool] = fix(lambda: False, EqType.Eq)(match({
+is_empty: Callable[[Grammar], bool] = fix(lambda: True, EqType.Eq, slot='empty_memo')(match({
     Nil: lambda _:          True,
     Eps: lambda _, ts:      False,
     Tok: lambda _, t:       False,
@@ -25,12 +38,12 @@ is_empty: Callable[[Grammar], bool] = fix(lambda: False, EqType.Eq)(match({
 }, Grammar))
 
 
-is_nullable: Callable[[Grammar], bool] = fix(lambda: True, EqType.Eq)(match({
+is_nullable: Callable[[Grammar], bool] = fix(lambda: False, EqType.Eq, slot='nullable_memo')(match({
     Nil: lambda _:          False,
     Eps: lambda _, ts:      True,
     Tok: lambda _, t:       False,
     Pat: lambda _, p:       False,
-    Rep: lambda _, g:       is_nullable(g) or is_empty(g),
+    Rep: lambda _, g:       True,
     Alt: lambda _, g1, g2:  is_nullable(g1) or is_nullable(g2),
     Seq: lambda _, g1, g2:  is_nullable(g1) and is_nullable(g2),
     Red: lambda _, g, f:    is_nullable(g),
@@ -38,7 +51,7 @@ is_nullable: Callable[[Grammar], bool] = fix(lambda: True, EqType.Eq)(match({
 }, Grammar))
 
 
-is_null: Callable[[Grammar], bool] = fix(lambda: True, EqType.Eq)(match({
+is_null: Callable[[Grammar], bool] = fix(lambda: True, EqType.Eq, slot='null_memo')(match({
     Nil: lambda _:          False,
     Eps: lambda _, ts:      True,
     Tok: lambda _, t:       False,
@@ -51,90 +64,639 @@ is_null: Callable[[Grammar], bool] = fix(lambda: True, EqType.Eq)(match({
 }, Grammar))
 
 
-parse_null: Callable[[Grammar], List[Tree[Value]]] = fix(list, EqType.Eq)(match({
+# The lists of trees built by `parse_null` can grow exponentially with the input (e.g., for an ambiguous grammar), so
+# they are counted against the session's budget before they are built.
+
+
+def charge_trees(trees: int):
+    budget = current_session().budget
+    if budget is not None:
+        budget.count_trees(trees)
+
+
+def null_alt(ts1: List[Tree[Value]], ts2: List[Tree[Value]]) -> List[Tree[Value]]:
+    charge_trees(len(ts1) + len(ts2))
+    return ts1 + ts2
+
+
+def null_seq(ts1: List[Tree[Value]], g2: Grammar) -> List[Tree[Value]]:
+    # The right side is only reached when the left side has parses.
+    if not ts1:
+        return []
+    ts2 = parse_null(g2)
+    charge_trees(len(ts1) * len(ts2))
+    return [Branch(t1, t2) for t1 in ts1 for t2 in ts2]
+
+
+def null_red(f: RedFunc, ts: List[Tree[Value]]) -> List[Tree[Value]]:
+    charge_trees(len(ts))
+    return [f(t) for t in ts]
+
+
+parse_null: Callable[[Grammar], List[Tree[Value]]] = fix(list, EqType.Eq, slot='parse_null_memo')(match({
     Nil: lambda _:          [],
     Eps: lambda _, ts:      ts,
     Tok: lambda _, t:       [],
     Pat: lambda _, p:       [],
     Rep: lambda _, g:       [Empty()],
-    Alt: lambda _, g1, g2:  parse_null(g1) + parse_null(g2),
-    Seq: lambda _, g1, g2:  [Branch(t1, t2) for t1 in parse_null(g1) for t2 in parse_null(g2)],
-    Red: lambda _, g, f:    [f(t) for t in parse_null(g)],
+    Alt: lambda _, g1, g2:  null_alt(parse_null(g1), parse_null(g2)),
+    Seq: lambda _, g1, g2:  null_seq(parse_null(g1), g2),
+    Red: lambda _, g, f:    null_red(f, parse_null(g)),
     Ref: lambda _, n, rd:   parse_null(rd[n]),
 }, Grammar))
 
 
+# The forest of the empty parses holds at most one tree, which packs all of them.
+parse_null_forest: Callable[[Grammar], List[Tree[Value]]] = fix(list, EqType.Eq, slot='forest_memo')(match({
+    Nil: lambda _:          [],
+    Eps: lambda _, ts:      ts,
+    Tok: lambda _, t:       [],
+    Pat: lambda _, p:       [],
+    Rep: lambda _, g:       [Empty()],
+    Alt: lambda _, g1, g2:  pack(parse_null_forest(g1) + parse_null_forest(g2)),
+    Seq: lambda _, g1, g2:  [Branch(t1, t2) for t1 in parse_null_forest(g1) for t2 in parse_null_forest(g2)],
+    Red: lambda _, g, f:    reduction(f, parse_null_forest(g)),
+    Ref: lambda _, n, rd:   parse_null_forest(rd[n]),
+}, Grammar))
+
+
+# The FIRST set of a grammar holds the literals of the `Tok` leaves and the patterns of the `Pat` leaves which can match
+# the first value of a non-empty input it accepts. A grammar derives to `Nil` with respect to any value which matches
+# none of them, so `derive` checks the set before deriving a node, and skips the nodes (and the rules, through their
+# references) which cannot accept the value. The sets are computed as a fixed point and stored on the nodes. Most of
+# those of derivatives are settled as the derivatives are built instead (see `settle_facts`). The sets may include
+# leaves which can only be reached through an empty grammar, which makes them larger than necessary, but never too
+# small.
+
+
+def first_seq(g1: Grammar, f1: FirstSet, f2: FirstSet) -> FirstSet:
+    # The set of the right side is found even when it is not needed, so that the sets of all of the nodes of a grammar
+    # are solved together, those of the nodes a derivative will start from included.
+    return union_first(f1, f2) if is_nullable(g1) else f1
+
+
+first_set: Callable[[Grammar], FirstSet] = fix(lambda: NO_FIRST, EqType.Eq, slot='first_memo')(match({
+    Nil: lambda _:          NO_FIRST,
+    Eps: lambda _, ts:      NO_FIRST,
+    Tok: lambda _, t:       FirstSet(frozenset((t,)), frozenset()),
+    Pat: lambda _, p:       FirstSet(frozenset(), frozenset((p,))),
+    Rep: lambda _, g:       first_set(g),
+    Alt: lambda _, g1, g2:  union_first(first_set(g1), first_set(g2)),
+    Seq: lambda _, g1, g2:  first_seq(g1, first_set(g1), first_set(g2)),
+    Red: lambda _, g, f:    first_set(g),
+    Ref: lambda _, n, rd:   first_set(rd[n]),
+}, Grammar))
+
+
+@lru_cache(maxsize=4096)
+def matches_pattern(p: Pattern, c: Value) -> bool:
+    # Values are tested against the same patterns at many nodes, and usually by more than one derivative.
+    return p.fullmatch(c) is not None
+
+
+def can_start(g: Grammar, c: Value) -> bool:
+    """Returns whether a value (or a token class) is in the FIRST set of a grammar."""
+    return in_first(first_set(g), c)
+
+
+def in_first(first: FirstSet, c: Value) -> bool:
+    if c.__class__ is TokenClass:
+        return (bool(c.literal) and c.literal[0] in first.toks) or not first.pats.isdisjoint(c.patterns)
+    return c in first.toks or any(matches_pattern(p, c) for p in first.pats)
+
+
+def null_parses(g: Grammar) -> List[Tree[Value]]:
+    # The empty parses of a grammar, as used in its derivatives: a forest when the session builds forests, none when it
+    # builds no trees, or else a list of trees.
+    session = current_session()
+    if not session.trees:
+        return []
+    if session.forest:
+        return parse_null_forest(g)
+    return parse_null(g)
+
+
 def mk_eps_star(g: Grammar) -> Grammar:
-    return eps(parse_null(g))
-
-
-def derive_seq(c: Value, g1: Grammar, g2: Grammar) -> Grammar:
-    if is_nullable(g1):
-        return alt(seq(derive(g1, c), g2),
-                   seq(mk_eps_star(g1), derive(g2, c)))
-    else:
-        return seq(derive(g1, c), g2)
-
-
-derive: Callable[[Grammar, Value], Grammar] = memoize(EqType.Equal, EqType.Eq)(match({
-    Nil: lambda _, c:          nil(),
-    Eps: lambda _, c, ts:      nil(),
-    Tok: lambda _, c, t:       eps([Leaf(c)]) if c == t else nil(),
-    Pat: lambda _, c, p:       eps([Leaf(c)]) if p.fullmatch(c) else nil(),
-    Rep: lambda g_, c, g:      seq(derive(g, c), g_),
-    Alt: lambda _, c, g1, g2:  alt(derive(g1, c), derive(g2, c)),
-    Seq: lambda _, c, g1, g2:  derive_seq(c, g1, g2),
-    Red: lambda _, c, g, f:    red(derive(g, c), f),
-    Ref: lambda _, c, n, rd:   derive(rd[n], c),
-}, Grammar, ('g_', 'c')))
-
-
-nullp_t: Tree[Value]
-
-
-def nullp(g: Grammar) -> bool:
-    global nullp_t
-    if is_null(g):
-        ts = parse_null(g)
-        if len(ts) == 1:
-            nullp_t = ts[0]
-            return True
-    return False
-
-
-make_compact: Callable[[Grammar], Grammar] = memoize(EqType.Eq)(match_pred({
-    Nil: {lambda:           True:                               lambda g_:      g_},
-    Eps: {lambda:           True:                               lambda g_:      g_},
-    Tok: {lambda g_:        is_empty(g_):                       lambda:         nil(),
-          lambda:           True:                               lambda g_:      g_},
-    Pat: {lambda g_:        is_empty(g_):                       lambda:         nil(),
-          lambda:           True:                               lambda g_:      g_},
-    Rep: {lambda g:         is_empty(g):                        lambda:         eps([Empty()]),
-          lambda:           True:                               lambda g:       Rep(make_compact(g))},
-    Alt: {lambda g1:        is_empty(g1):                       lambda g2:      make_compact(g2),
-          lambda g2:        is_empty(g2):                       lambda g1:      make_compact(g1),
-          lambda:           True:                               lambda g1, g2:  alt(make_compact(g1),
-                                                                                    make_compact(g2))},
-    Seq: {lambda g1, g2:    is_empty(g1) or is_empty(g2):       lambda:         nil(),
-          lambda g1:        nullp(g1):                          lambda g2:      red(make_compact(g2),
-                                                                                    lambda w2: Branch(nullp_t, w2)),
-          lambda g2:        nullp(g2):                          lambda g1:      red(make_compact(g1),
-                                                                                    lambda w1: Branch(w1, nullp_t)),
-          lambda:           True:                               lambda g1, g2:  seq(make_compact(g1),
-                                                                                    make_compact(g2))},
-    Red: {lambda g:         g.__class__ is Eps:                 lambda g, f:    eps([f(t) for t in g.ts]),
-          lambda g:         g.__class__ is Seq and nullp(g.g1): lambda f, g:    red(make_compact(g.g2),
-                                                                                    lambda t: f(Branch(nullp_t, t))),
-          lambda g:         g.__class__ is Red:                 lambda g, f:    red(make_compact(g.g),
-                                                                                    lambda t: g.f(t)),
-          lambda:           True:                               lambda g, f:    red(make_compact(g), f)},
-    Ref: {lambda:           True:                               lambda n, rd:   make_compact(rd[n])},
-}, ('g_',)))
-
-
-def parse(values: List[Value], g: Grammar) -> List[Tree[Value]]:
-    if not values:
-        return parse_null(g)
-    else:
-        c, *cs = values
-        return parse(cs, make_compact(derive(g, c)))
+    return eps(null_parses(g))
+
+
+# Derivatives with respect to a token class hold the placeholder `TOKEN_LEAF` instead of the value, so that they are the
+# same for all of the values of the class. The derivatives of the nodes of the grammar the parser started from are kept
+# by the class (see `TokenClass`), and the others are memoized like those with respect to values.
+
+
+def leaf_trees(c: Value) -> List[Tree[Value]]:
+    return [Leaf(c)] if current_session().trees else []
+
+
+def derive_tok(c: Value, t: Value) -> Grammar:
+    if c.__class__ is TokenClass:
+        return eps([TOKEN_LEAF]) if c.matches_tok(t) else nil()
+    return eps(leaf_trees(c)) if c == t else nil()
+
+
+def derive_pat(c: Value, p: Pattern) -> Grammar:
+    if c.__class__ is TokenClass:
+        return eps([TOKEN_LEAF]) if c.matches_pat(p) else nil()
+    return eps(leaf_trees(c)) if matches_pattern(p, c) else nil()
+
+
+# Grammars can be as deep as the input nests (each open group of an input leaves a pending `Seq` around the derivative,
+# say), so derivatives are taken with an explicit stack, as forests are expanded (see `iter_trees`), and the depth of
+# the recursion does not depend on the grammar. Each node is visited twice: once to look up its derivative, or else to
+# schedule its children, and once more to build its derivative out of theirs, which are popped off the stack of the
+# derivatives built so far. A node shared by several parents is looked up once for each of them, as it would be by a
+# recursive derivation.
+#
+# Rules may refer to themselves, so the derivative of a reference is itself a reference, which is registered before the
+# rule's body is derived. Recursive occurrences of the rule are then tied back to it instead of being derived again.
+# Registrations are only needed while the outermost reference is being derived; afterwards, the derivatives are
+# memoized on the references themselves. A derivative which was never tied back to is not recursive, and is replaced
+# by its body. Otherwise, each value of a right-recursive input would wrap the derivative in one more reference, and the
+# derivatives would grow with the input.
+#
+# Derivatives are memoized in the `derive_memo` slot of the nodes, as by `memoize` (with weak references, so that they
+# are collected along with their other references), and their lookups are counted under the name `derive`.
+
+
+def derive(g: Grammar, c: Value) -> Grammar:
+    session = current_session()
+    tag = session.tag
+    stats = session.stats
+    classified = c.__class__ is TokenClass
+    args = (c,)
+    refs: Dict[int, Grammar] = {}
+    tied: Set[int] = set()
+    # Nodes to visit, with None on their first visit, and what their second visit needs otherwise.
+    work: List[Tuple[Grammar, Any]] = [(g, None)]
+    built: List[Grammar] = []
+    while work:
+        g, frame = work.pop()
+        cls = g.__class__
+        if frame is None:
+            first = settled_first(g)
+            if first is not None and not in_first(first, c):
+                built.append(NIL)
+                continue
+            if classified and id(g) in c.nodes:
+                d = c.derivatives.get(id(g))
+                if d is not None:
+                    built.append(d)
+                    continue
+            entry = g.derive_memo
+            if entry is not None and entry[0] is tag and entry[1][0] == c:
+                d = entry[2]()
+                if d is not None:
+                    if stats is not None:
+                        stats.count_hit('derive')
+                    if classified and id(g) in c.nodes:
+                        c.derivatives[id(g)] = d
+                    built.append(d)
+                    continue
+            if stats is not None:
+                stats.count_miss('derive')
+            if cls is Tok:
+                d = derive_tok(c, g.t)
+            elif cls is Pat:
+                d = derive_pat(c, g.p)
+            elif cls is Alt:
+                work.append((g, True))
+                work.append((g.g2, None))
+                work.append((g.g1, None))
+                continue
+            elif cls is Seq:
+                # The right side is only derived when the left side is nullable, which the second visit is told.
+                nullable = is_nullable(g.g1)
+                work.append((g, nullable))
+                if nullable:
+                    work.append((g.g2, None))
+                work.append((g.g1, None))
+                continue
+            elif cls is Rep or cls is Red:
+                work.append((g, True))
+                work.append((g.g, None))
+                continue
+            else:
+                d = refs.get(id(g))
+                if d is not None:
+                    tied.add(id(g))
+                    built.append(d)
+                    continue
+                d = ref(g.n, {})
+                work.append((g, (d, not refs)))
+                refs[id(g)] = d
+                work.append((g.rd[g.n], None))
+                continue
+        elif cls is Alt:
+            d2 = built.pop()
+            d = alt2(built.pop(), d2)
+        elif cls is Seq:
+            if frame:
+                d2 = built.pop()
+                d = alt2(seq2(built.pop(), g.g2), seq2(mk_eps_star(g.g1), d2))
+            else:
+                d = seq2(built.pop(), g.g2)
+        elif cls is Rep:
+            d = seq2(built.pop(), g)
+        elif cls is Red:
+            d = red(built.pop(), g.f)
+        else:
+            d, outermost = frame
+            body = d.rd[d.n] = built.pop()
+            if id(g) not in tied:
+                d = body
+            if outermost:
+                refs.clear()
+                tied.clear()
+        g.derive_memo = (tag, args, weak_ref(d))
+        if classified and id(g) in c.nodes:
+            c.derivatives[id(g)] = d
+        built.append(d)
+    return built[0]
+
+
+# The compaction rules are those of Adams et al., "On the Complexity and Performance of Parsing with Derivatives" (PLDI
+# 2016). Those which only depend on the classes of a node's children are applied by the grammar's constructors (see
+# `alt`, `seq`, `red` and `star`), so compacting a node amounts to pruning its empty children and building it again
+# from the compactions of the others. Derivatives are built by the same constructors, so they are already compacted up
+# to emptiness, which is a fixed point over the whole grammar, and rules, which are copied.
+#
+# The names of the rules of `make_compact`, in the order in which they are tried, under which they are counted by
+# sessions which count operations.
+COMPACTION_RULES: Dict[Type[Grammar], Tuple[str, ...]] = {
+    Nil: ('Nil',),
+    Eps: ('Eps',),
+    Tok: ('Tok/empty', 'Tok'),
+    Pat: ('Pat/empty', 'Pat'),
+    Rep: ('Rep/empty', 'Rep'),
+    Alt: ('Alt/empty-left', 'Alt/empty-right', 'Alt'),
+    Seq: ('Seq/empty', 'Seq'),
+    Red: ('Red/empty', 'Red'),
+    Ref: ('Ref/empty', 'Ref'),
+}
+
+
+def compaction_rule(g: Grammar) -> int:
+    # The index of the first of the rules of the node's class which applies to it.
+    cls = g.__class__
+    if cls is Nil or cls is Eps:
+        return 0
+    if cls is Alt:
+        return 0 if is_empty(g.g1) else 1 if is_empty(g.g2) else 2
+    if cls is Seq:
+        return 0 if is_empty(g.g1) or is_empty(g.g2) else 1
+    if cls is Rep or cls is Red:
+        return 0 if is_empty(g.g) else 1
+    return 0 if is_empty(g) else 1
+
+
+# Grammars are compacted with an explicit stack, like derivatives (see `derive`), and rules are copied like their
+# derivatives are. Compactions are memoized in the `compact_memo` slot of the nodes, and their lookups are counted under
+# the name `make_compact`.
+
+
+def make_compact(g: Grammar) -> Grammar:
+    session = current_session()
+    tag = session.tag
+    stats = session.stats
+    refs: Dict[int, Grammar] = {}
+    tied: Set[int] = set()
+    # Nodes to visit, with None on their first visit, and the index of the rule which applies to them otherwise.
+    work: List[Tuple[Grammar, Any]] = [(g, None)]
+    built: List[Grammar] = []
+    while work:
+        g, frame = work.pop()
+        cls = g.__class__
+        if frame is None:
+            entry = g.compact_memo
+            if entry is not None and entry[0] is tag:
+                cg = entry[2]()
+                if cg is not None:
+                    if stats is not None:
+                        stats.count_hit('make_compact')
+                    built.append(cg)
+                    continue
+            rule = compaction_rule(g)
+            if stats is not None:
+                stats.count_miss('make_compact')
+                stats.count_rule(COMPACTION_RULES[cls][rule])
+            if cls is Nil or cls is Eps:
+                cg = g
+            elif cls is Alt:
+                # Only the side which is not empty is compacted, unless neither is.
+                work.append((g, rule))
+                if rule != 1:
+                    work.append((g.g2, None))
+                if rule != 0:
+                    work.append((g.g1, None))
+                continue
+            elif rule == 0:
+                cg = eps([Empty()]) if cls is Rep else nil()
+            elif cls is Tok or cls is Pat:
+                cg = g
+            elif cls is Seq:
+                work.append((g, rule))
+                work.append((g.g2, None))
+                work.append((g.g1, None))
+                continue
+            elif cls is Rep or cls is Red:
+                work.append((g, rule))
+                work.append((g.g, None))
+                continue
+            else:
+                cg = refs.get(id(g))
+                if cg is not None:
+                    tied.add(id(g))
+                    built.append(cg)
+                    continue
+                cg = ref(g.n, {})
+                work.append((g, (cg, not refs)))
+                refs[id(g)] = cg
+                work.append((g.rd[g.n], None))
+                continue
+        elif cls is Alt:
+            cg = built.pop()
+            if frame == 2:
+                cg = alt2(built.pop(), cg)
+        elif cls is Seq:
+            cg2 = built.pop()
+            cg = seq2(built.pop(), cg2)
+        elif cls is Rep:
+            cg = star(built.pop())
+        elif cls is Red:
+            cg = red(built.pop(), g.f)
+        else:
+            cg, outermost = frame
+            body = cg.rd[cg.n] = built.pop()
+            # A rule which was never tied back to (e.g., one which compacts to `Nil` or `Eps`) is replaced by its body,
+            # so that the constructors can simplify the nodes which use it, and the derivatives of right-recursive
+            # grammars stay bounded (see `derive`).
+            if id(g) not in tied:
+                cg = body
+            if outermost:
+                refs.clear()
+                tied.clear()
+            # A compacted rule is taken to be its own compaction. Otherwise, the rules reachable from the grammar would
+            # be copied each time it is compacted, and everything known about them (their derivatives included) would
+            # be lost.
+            cg.compact_memo = (tag, (), weak_ref(cg))
+        g.compact_memo = (tag, (), weak_ref(cg))
+        built.append(cg)
+    return built[0]
+
+
+class ParseException(Exception):
+    """
+    Raised by a `Parser` fed a value which the grammar cannot accept at that point of the input: `index` is the position
+    of the value in the input, `grammar` the last derivative which could still accept more input, and `expected` the
+    FIRST set of that derivative (see `first_set`), i.e., the literals and patterns which the value could have matched.
+    """
+
+    def __init__(self, index: int, value: Value, grammar: Grammar, expected: FirstSet):
+        super().__init__(f"Unexpected value {value!r} at index {index}; expected {describe_first(expected)}")
+        self.index = index
+        self.value = value
+        self.grammar = grammar
+        self.expected = expected
+
+
+def describe_first(first: FirstSet) -> str:
+    if not first.toks and not first.pats:
+        return "the end of the input"
+    return "one of " + ", ".join(sorted(map(repr, first.toks)) + sorted(f"/{p.pattern}/" for p in first.pats))
+
+
+class Parser(Generic[Value]):
+    """
+    An incremental parser for a grammar. Values are fed to the parser one at a time, and each is consumed by replacing
+    the current grammar with its compacted derivative. Only the current derivative is retained, so the input can be
+    any iterable (including a generator) and is never materialized. Derivatives are taken and compacted with explicit
+    stacks, so the depth of the recursion needed to consume a value does not grow with the input, however deeply it
+    nests. For grammars whose derivatives stay bounded (e.g., left- or right-recursive rules, and repetitions), neither
+    does the time taken by each value.
+
+    All work is done within the parser's `ParseSession`, which is a fresh session unless one is given. The session is
+    collected after each value, so a session with `max_entries` set keeps the parser's memory bounded. When the session
+    builds forests, the parses are kept in a shared packed parse forest, which is returned by `forest`. When it builds
+    no trees, the parser only recognizes its input, and `accepts` is all that can be asked.
+
+    When `classify` is set, values are derived by their token class (see `TokenClassifier`), so that the derivatives of
+    values which match the same leaves of the grammar are shared. The values themselves are kept aside and put back
+    into the trees when they are built, which requires a session that builds forests (a fresh one unless one is given),
+    as reductions must not see the placeholders. Values must then be hashable. This pays off when many values of the
+    same classes restart the same rules (e.g., the items of a long list drawn from a large alternation), whose
+    derivatives are then shared instead of taken again for each value; otherwise, it takes about as long as deriving
+    by value (see `benchmarks/classify.py`).
+
+    When the session was given `ParseStats`, each value consumed is recorded in them (see `ParseStats`), along with the
+    operations counted in any session.
+
+    When the session has a `ParseBudget`, its clock starts with the parser, and the consumption of each value is checked
+    against it, as is the extraction of the parses: the trees built are counted against `max_eps_trees` (the list of
+    the parses included), and tick the clock. The parser is left as it was before a value whose consumption exceeded
+    the budget.
+
+    Derivatives are built by the grammar's constructors, which already apply the compaction rules that only depend on
+    the classes of the children. Unless `compact` is unset, each derivative is also compacted by `make_compact`, which
+    applies the rest (those which need the emptiness or the nullability of a node), at the cost of a pass over it.
+    Without that pass, the parts of a derivative which can no longer match are kept, so that for many grammars the
+    derivatives (and the time taken by each value) grow with the input.
+    """
+
+    def __init__(self, g: Grammar, session: Optional[ParseSession] = None, classify: bool = False,
+                 compact: bool = True):
+        if session is None:
+            session = ParseSession(forest=classify)
+        elif classify and not session.forest:
+            raise ValueError("Parsing by token class requires a session which builds forests.")
+        if session.budget is not None:
+            session.budget.start()
+        self._classifier = None
+        # The grammar is compacted up front, so that the nodes the derivatives will refer to are those of the grammar
+        # (compacted rules are not copied again), and their FIRST sets are solved. Those of most derivatives are then
+        # settled as they are built, and `derive` skips the nodes whose sets do not hold the value.
+        with session:
+            if compact:
+                g = make_compact(g)
+            first_set(g)
+        if classify:
+            # The classes keep derivatives of the nodes of the compacted grammar.
+            self._classifier = TokenClassifier(g)
+        self._grammar = g
+        self._compact = compact
+        self._count = 0
+        self._session = session
+        self._values: List[Value] = []
+
+    @property
+    def grammar(self) -> Grammar:
+        """The current derivative, i.e., the grammar of the suffixes of the input which remain acceptable."""
+        return self._grammar
+
+    @property
+    def count(self) -> int:
+        """The number of values consumed so far."""
+        return self._count
+
+    @property
+    def session(self) -> ParseSession:
+        return self._session
+
+    @property
+    def stats(self) -> Optional[OperationCounts]:
+        """The operations counted by the parser's session, if it counts them."""
+        return self._session.stats
+
+    def feed(self, c: Value):
+        """
+        Consumes a value. If the grammar cannot accept the values consumed so far followed by this one, whatever follows
+        them, raises a `ParseException` instead, and the parser is left as it was before the value.
+        """
+        value = c
+        if self._classifier is not None:
+            c = self._classifier.classify(c)
+        stats = self._session.stats
+        if isinstance(stats, ParseStats):
+            before = stats.totals()
+            start = perf_counter()
+            d = self._consume(value, c)
+            stats.record_step(self._count, d, before, perf_counter() - start)
+        else:
+            d = self._consume(value, c)
+        self._grammar = d
+        if self._classifier is not None:
+            self._values.append(value)
+        self._count += 1
+        self._session.collect()
+
+    def _consume(self, value: Value, c: Value) -> Grammar:
+        budget = self._session.budget
+        if budget is not None:
+            # Only the nodes of the derivative are counted against the budget: measuring them takes a walk over it.
+            budget.start_value(self._count, measure_grammar(self._grammar)[0] if budget.max_nodes is not None else 0)
+        with self._session:
+            d = self._derive(c)
+            if self._is_empty(d):
+                raise ParseException(self._count, value, self._grammar, first_set(self._grammar))
+        return d
+
+    def _derive(self, c: Value) -> Grammar:
+        d = derive(self._grammar, c)
+        return make_compact(d) if self._compact else d
+
+    def _is_empty(self, d: Grammar) -> bool:
+        # Compaction leaves nothing but `Nil` of an empty derivative, so emptiness is only solved without it.
+        return d.__class__ is Nil or (not self._compact and is_empty(d))
+
+    def fork(self) -> 'Parser[Value]':
+        """
+        Returns a parser in the same state as this one, which consumes values independently of it. Both parsers share
+        their session, and the derivative they start from, so values consumed before the fork are only derived once.
+        """
+        other = copy(self)
+        other._values = list(self._values)
+        return other
+
+    def feed_many(self, cs: Iterable[Value]):
+        for c in cs:
+            self.feed(c)
+
+    def accepts(self) -> bool:
+        """Returns whether the values consumed so far are accepted by the grammar."""
+        with self._session:
+            return is_nullable(self._grammar)
+
+    def _check_trees(self):
+        if not self._session.trees:
+            raise ValueError("The parser's session builds no trees, so it only recognizes its input.")
+
+    def forest(self) -> Optional[Tree[Value]]:
+        """Returns the forest of the parse trees of the values consumed so far, or None if there are no parses."""
+        self._check_trees()
+        if self._session.budget is not None:
+            self._session.budget.start_extraction()
+        with self._session:
+            ts = pack(parse_null_forest(self._grammar))
+        if not ts:
+            return None
+        if self._classifier is not None:
+            return fill_tokens(ts[0], self._values)
+        return ts[0]
+
+    def finish(self) -> List[Tree[Value]]:
+        """Returns the parse trees of the values consumed so far."""
+        self._check_trees()
+        budget = self._session.budget
+        if self._session.forest:
+            forest = self.forest()
+            if forest is None:
+                return []
+            if budget is None:
+                return list(iter_trees(forest))
+            trees = []
+            for t in iter_trees(forest, budget):
+                trees.append(t)
+                budget.check_trees(len(trees))
+            return trees
+        if budget is not None:
+            budget.start_extraction()
+        with self._session:
+            return parse_null(self._grammar)
+
+
+def parse(values: Iterable[Value], g: Grammar, session: Optional[ParseSession] = None) -> List[Tree[Value]]:
+    parser = Parser(g, session)
+    try:
+        parser.feed_many(values)
+    except ParseException:
+        return []
+    return parser.finish()
+
+
+def recognize(values: Iterable[Value], g: Grammar, session: Optional[ParseSession] = None) -> bool:
+    """
+    Returns whether the grammar accepts the values. Unless a session is given, they are parsed in a session which builds
+    no trees (see `ParseSession`), so that the derivatives hold no parses and no reductions.
+    """
+    parser = Parser(g, ParseSession(trees=False) if session is None else session)
+    try:
+        parser.feed_many(values)
+    except ParseException:
+        return False
+    return parser.accepts()
+
+
+# The functions below only need some of the parses, or none of them, so they parse into a forest (in a fresh forest
+# session, unless a session is given) and extract just what is needed from it.
+
+
+def parse_forest(values: Iterable[Value], g: Grammar, session: Optional[ParseSession] = None) -> Optional[Tree[Value]]:
+    """Returns the forest of the parse trees of the values, or None if there are no parses."""
+    parser = Parser(g, ParseSession(forest=True) if session is None else session)
+    try:
+        parser.feed_many(values)
+    except ParseException:
+        return None
+    return parser.forest()
+
+
+def parse_iter(values: Iterable[Value], g: Grammar, session: Optional[ParseSession] = None) -> Iterator[Tree[Value]]:
+    """Generates the parse trees of the values one at a time. The values are parsed when the first tree is requested."""
+    forest = parse_forest(values, g, session)
+    if forest is not None:
+        yield from iter_trees(forest)
+
+
+def parse_first(values: Iterable[Value], g: Grammar, session: Optional[ParseSession] = None) -> Optional[Tree[Value]]:
+    """Returns the first of the parse trees of the values, or None if there are no parses."""
+    return next(parse_iter(values, g, session), None)
+
+
+def count_parses(values: Iterable[Value], g: Grammar, session: Optional[ParseSession] = None) -> int:
+    """Counts the parse trees of the values without building them."""
+    forest = parse_forest(values, g, session)
+    return 0 if forest is None else count_trees(forest)
+
+
+# Name the memoized and fixed-point functions after themselves, which is how their operations are counted.
+rename_marked_funcs()
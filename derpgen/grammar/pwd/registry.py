@@ -0,0 +1,65 @@
+from .tree import Tree
+
+from typing import Callable, Dict, Optional, TypeVar
+
+
+__all__ = ['NamedReduction', 'register_reduction', 'UnknownReductionException']
+
+
+Value = TypeVar('Value')
+RedFunc = Callable[[Tree[Value]], Tree[Value]]
+
+
+# Reductions are pickled along with the grammars which hold them, and closures and lambdas cannot be. A reduction which
+# is registered under a name is pickled as that name instead, and unpickled as whatever function is registered under the
+# same name in the process which loads it. Registrations are typically made when a module is imported, so that any
+# process which imports the module can load grammars which use them (e.g., the workers of `parse_many`).
+REDUCTIONS: Dict[str, RedFunc] = {}
+
+
+class UnknownReductionException(Exception):
+    def __init__(self, name: str):
+        super().__init__(f"No reduction is registered under the name {name!r}.")
+        self.name = name
+
+
+class NamedReduction:
+    """A reduction which applies the function registered under a name (see `register_reduction`)."""
+
+    __slots__ = ('name', 'f')
+
+    def __init__(self, name: str):
+        f = REDUCTIONS.get(name)
+        if f is None:
+            raise UnknownReductionException(name)
+        self.name = name
+        self.f = f
+
+    def __call__(self, t: Tree[Value]) -> Tree[Value]:
+        return self.f(t)
+
+    def __reduce__(self) -> tuple:
+        return NamedReduction, (self.name,)
+
+    def __eq__(self, other) -> bool:
+        return other.__class__ is NamedReduction and other.name == self.name
+
+    def __hash__(self) -> int:
+        return hash(self.name)
+
+    def __repr__(self) -> str:
+        return f"NamedReduction({self.name!r})"
+
+
+def register_reduction(name: str, f: Optional[RedFunc] = None):
+    """
+    Registers a reduction under a name, and returns the `NamedReduction` which refers to it, to be used in grammars in
+    place of the function. When no function is given, returns a decorator which registers the function it decorates.
+    Registering a different function under a name which is taken is an error.
+    """
+    if f is None:
+        return lambda func: register_reduction(name, func)
+    registered = REDUCTIONS.setdefault(name, f)
+    if registered is not f:
+        raise ValueError(f"Another reduction is already registered under the name {name!r}.")
+    return NamedReduction(name)
@@ -0,0 +1,88 @@
+from .grammar import *
+
+from derpgen.utility import OperationCounts
+
+from typing import Any, Callable, List, NamedTuple, Optional, Set, Tuple
+
+
+__all__ = ['ParseStats', 'TokenStats']
+
+
+TokenStats = NamedTuple('TokenStats', [('index', int),
+                                       ('nodes', int),
+                                       ('eps_nodes', int),
+                                       ('eps_trees', int),
+                                       ('max_eps_trees', int),
+                                       ('derives', int),
+                                       ('rewrites', int),
+                                       ('fix_iterations', int),
+                                       ('seconds', float)])
+
+
+def measure_grammar(g: Grammar) -> Tuple[int, int, int, int]:
+    # The number of nodes reachable from a grammar, following references, and the number of those which are `Eps`
+    # nodes, along with the total and the largest number of trees they hold.
+    seen: Set[int] = set()
+    stack: List[Grammar] = [g]
+    eps_nodes = eps_trees = max_eps_trees = 0
+    while stack:
+        g = stack.pop()
+        if id(g) in seen:
+            continue
+        seen.add(id(g))
+        cls = g.__class__
+        if cls is Eps:
+            eps_nodes += 1
+            eps_trees += len(g.ts)
+            max_eps_trees = max(max_eps_trees, len(g.ts))
+        elif cls is Rep or cls is Red:
+            stack.append(g.g)
+        elif cls is Alt or cls is Seq:
+            stack.append(g.g1)
+            stack.append(g.g2)
+        elif cls is Ref:
+            stack.append(g.rd[g.n])
+    return len(seen), eps_nodes, eps_trees, max_eps_trees
+
+
+class ParseStats(OperationCounts):
+    """
+    The operations counted during a parse (see `OperationCounts`), along with a record of each value consumed by a
+    `Parser` whose session was given these stats. Each record (see `TokenStats`) gives the size of the derivative left
+    by the value, in nodes reachable from it, the number of `Eps` nodes among them and of the trees those hold, and the
+    work done to consume the value: derivatives taken, compaction rules applied, evaluations of fixed points solved, and
+    the time taken, which includes that of counting everything else. Derivatives are counted by the lookups of
+    their memos in `derive`, so those kept by token classes (see `TokenClass`) are not.
+
+    Records are passed to `on_step`, when it is given, as soon as they are made, and are also kept in `steps` unless
+    `keep_steps` is unset. Measuring the size of each derivative takes time proportional to it, so it is only done when
+    `measure` is set.
+    """
+
+    def __init__(self, on_step: Optional[Callable[[TokenStats], Any]] = None, keep_steps: bool = True,
+                 measure: bool = True):
+        super().__init__()
+        self.on_step = on_step
+        self.keep_steps = keep_steps
+        self.measure = measure
+        self.steps: List[TokenStats] = []
+
+    def totals(self) -> Tuple[int, int, int]:
+        """The total numbers of derivatives taken, compaction rules applied, and fixed-point evaluations so far."""
+        return self.calls('derive'), sum(self.rules.values()), sum(self.fix_iterations.values())
+
+    def record_step(self, index: int, g: Grammar, before: Tuple[int, int, int], seconds: float):
+        """Records the consumption of a value, given the derivative it left, and the `totals` from before it."""
+        nodes, eps_nodes, eps_trees, max_eps_trees = measure_grammar(g) if self.measure else (0, 0, 0, 0)
+        derives, rewrites, fix_iterations = (after - b for after, b in zip(self.totals(), before))
+        step = TokenStats(index, nodes, eps_nodes, eps_trees, max_eps_trees, derives, rewrites, fix_iterations,
+                          seconds)
+        if self.keep_steps:
+            self.steps.append(step)
+        if self.on_step is not None:
+            self.on_step(step)
+
+    def as_dict(self) -> dict:
+        d = super().as_dict()
+        d['steps'] = [step._asdict() for step in self.steps]
+        return d
@@ -1,10 +1,17 @@
 from .tokens import *
 from .tokenizer import *
 
-from typing import List
+from mmap import mmap
+from typing import BinaryIO, Iterable, Iterator, TextIO, Union
 
 
-__all__ = ['BRACE_PAIRS', 'Token', 'TokenTypes', 'TokenTypeClasses', 'tokenize_file', 'tokenize_text']
+__all__ = [
+    'BRACE_PAIRS', 'Token', 'TokenTypes', 'TokenTypeClasses',
+    'tokenize_file', 'tokenize_stream', 'tokenize_text', 'tokenize_lines',
+]
+
+
+Stream = Union[TextIO, BinaryIO, mmap]
 
 
 class InvalidTokenError(Exception):
@@ -15,15 +22,35 @@ class InvalidTokenError(Exception):
         super().__init__(msg)
 
 
-def tokenize_file(filename: str) -> List[Token]:
+# Tokens are generated lazily, one line at a time, so only the current line of the input needs to be held in memory.
+# Any errors in the input are raised when the tokens of the erroneous line are reached.
+
+
+def tokenize_file(filename: str) -> Iterator[Token]:
     with open(filename) as f:
-        text = f.read()
-    return tokenize_text(text)
+        yield from tokenize_stream(f)
+
+
+def tokenize_stream(stream: Stream) -> Iterator[Token]:
+    """Tokenizes a file object or a memory-mapped file. Binary streams are decoded as UTF-8."""
+    def read_lines() -> Iterator[str]:
+        while True:
+            chunk = stream.readline()
+            if not chunk:
+                return
+            if isinstance(chunk, bytes):
+                chunk = chunk.decode('utf-8')
+            # Split the lines exactly as `str.splitlines` would split the whole text.
+            yield from chunk.splitlines()
+    return tokenize_lines(read_lines())
+
+
+def tokenize_text(text: str) -> Iterator[Token]:
+    return tokenize_lines(text.splitlines())
 
 
-def tokenize_text(text: str) -> List[Token]:
-    tokens = []
-    lines = text.splitlines()
+def tokenize_lines(lines: Iterable[str]) -> Iterator[Token]:
+    line_no = 0
     for line_no, line in enumerate(lines, start=1):
         line_tokens = []
         tokenizer = LineTokenizer(line, line_no)
@@ -32,6 +59,5 @@ def tokenize_text(text: str) -> List[Token]:
                 line_tokens.append(token)
         except TokenizerError:
             raise InvalidTokenError(line_no, line, tokenizer.position)
-        tokens.extend(line_tokens)
-    tokens.append(Token('', len(lines), 0, TokenTypes.ENDMARKER))
-    return tokens
+        yield from line_tokens
+    yield Token('', line_no, 0, TokenTypes.ENDMARKER)
@@ -1,6 +1,7 @@
 from .tokens import *
 
-from typing import Iterable, Iterator, Match, Optional
+from re import compile as re_compile
+from typing import Iterable, Iterator, List, Optional, Pattern, Tuple
 
 
 __all__ = ['LineTokenizer', 'TokenizerError']
@@ -10,17 +11,42 @@ class TokenizerError(Exception):
     pass
 
 
+def compile_master_pattern() -> Tuple[Pattern, Tuple[Tuple[TokenTypes, int, int], ...]]:
+    """
+    Combines the regular expressions of all of the `TokenTypes` into a single pattern, so that a token is found with
+    one match instead of one match per type. Each type's expression is placed in a lookahead with its own capturing
+    group, which leaves the match itself empty but records the span that the type would match. The longest match can
+    then be chosen from the spans, as an alternation of the types would instead choose the first type that matches.
+
+    Returns the pattern along with, for each type in order, the group holding the type's match and the group holding
+    the token's text (the first group of the type's own expression, if it has one).
+    """
+    parts: List[str] = []
+    groups: List[Tuple[TokenTypes, int, int]] = []
+    group = 1
+    for token_type in TokenTypes:
+        if token_type == TokenTypes.ENDMARKER:
+            continue
+        regex = token_type.regex
+        parts.append(f"(?:(?=({regex.pattern}))|)")
+        groups.append((token_type, group, group + 1 if regex.groups else group))
+        group += 1 + regex.groups
+    return re_compile(''.join(parts)), tuple(groups)
+
+
+MASTER_PATTERN, TYPE_GROUPS = compile_master_pattern()
+
+
 class LineTokenizer(Iterable[Token]):
     def __init__(self, line: str, line_no: int):
         self._line = line
         self._line_no = line_no
+        self._offset = 0
         self._position = 1
-        self._match: Optional[Match] = None
-        self._token_type: Optional[TokenTypes] = None
         self._finished = False
 
     def __bool__(self) -> bool:
-        return bool(self._line)
+        return self._offset < len(self._line)
 
     def __iter__(self) -> Iterator[Token]:
         return self
@@ -32,18 +58,24 @@ class LineTokenizer(Iterable[Token]):
             self._finished = True
             return Token('\n', self._line_no, self._position + 1, TokenTypes.NEWLINE)
         else:
-            self._match = None
-            for token_type in TokenTypes:
-                self._match_if_longest(token_type)
-            if self._match is None:
+            spans = MASTER_PATTERN.match(self._line, self._offset).regs
+            # Take the longest match, preferring the earliest type among matches of the same length. Types which do not
+            # match have an end of -1.
+            end = -1
+            token_type: Optional[TokenTypes] = None
+            text_group = 0
+            for candidate_type, group, candidate_text_group in TYPE_GROUPS:
+                if spans[group][1] > end:
+                    end = spans[group][1]
+                    token_type = candidate_type
+                    text_group = candidate_text_group
+            if token_type is None:
                 raise TokenizerError()
-            if self._match.groups():
-                text = self._match.groups()[0]
-            else:
-                text = self._match.group(0)
-            self._line = self._line[len(self._match.group(0)):]
+            text_start, text_end = spans[text_group]
+            text = self._line[text_start:text_end]
+            self._offset = end
             self._position += len(text)
-            return Token(text, self._line_no, self._position, self._token_type)
+            return Token(text, self._line_no, self._position, token_type)
 
     @property
     def position(self) -> int:
@@ -51,11 +83,4 @@ class LineTokenizer(Iterable[Token]):
 
     @property
     def remaining_text(self) -> str:
-        return self._line
-
-    def _match_if_longest(self, token_type: TokenTypes):
-        match = token_type.regex.match(self._line)
-        # Only update the _match if the new match is longer.
-        if match is not None and (self._match is None or len(match.group(0)) > len(self._match.group(0))):
-            self._match = match
-            self._token_type = token_type
+        return self._line[self._offset:]
@@ -1,3 +1,4 @@
+from .budget import *
 from .eq_type import *
 from .fix import *
 from .functional import *
@@ -6,3 +7,5 @@ from .lazy import *
 from .match import *
 from .memoize import *
 from .rename import *
+from .session import *
+from .stats import *
@@ -0,0 +1,118 @@
+from time import perf_counter
+from typing import Optional
+
+
+__all__ = ['ParseBudget', 'BudgetExceededException']
+
+
+class BudgetExceededException(Exception):
+    def __init__(self, limit: str, bound: float, index: Optional[int], extracting: bool = False):
+        if extracting:
+            where = "while extracting the parses"
+        elif index is None:
+            where = "before any value was consumed"
+        else:
+            where = f"while consuming the value at index {index}"
+        super().__init__(f"Parse budget exceeded: {limit} (at most {bound}) {where}")
+        self.limit = limit
+        self.bound = bound
+        self.index = index
+        self.extracting = extracting
+
+
+class ParseBudget:
+    """
+    Limits the resources taken by the work done in a `ParseSession` which was given this budget, so that no input can
+    take more than its share of memory or time. Once a limit is exceeded, a `BudgetExceededException` is raised, which
+    names the limit and gives the index of the value being consumed (see `start_value`), or tells that the parses were
+    being extracted (see `start_extraction`). Limits which are None are not enforced.
+
+    `max_nodes` bounds the grammar nodes alive while a value is consumed: those of the derivative it is consumed from,
+    along with the nodes built since. `max_eps_trees` bounds the trees held by any single `Eps` node, and any single list
+    of trees built while finding the empty parses of a grammar (see `parse_null`), including the list of the parses
+    which are extracted in the end. `max_seconds` bounds the time taken since the budget was made, or since `start` was
+    last called (e.g., by a `Parser`). `max_fix_iterations` bounds the evaluations taken to solve any single fixed point
+    (see `fix`).
+
+    Checks are made as nodes are built, fixed points are evaluated, and trees are built, and cost an increment and a
+    comparison or two. The clock is only read every `CLOCK_INTERVAL` of those, where each tree of a list counts as one.
+    """
+
+    CLOCK_INTERVAL = 256
+
+    def __init__(self, max_nodes: Optional[int] = None, max_eps_trees: Optional[int] = None,
+                 max_seconds: Optional[float] = None, max_fix_iterations: Optional[int] = None):
+        self.max_nodes = max_nodes
+        self.max_eps_trees = max_eps_trees
+        self.max_seconds = max_seconds
+        self.max_fix_iterations = max_fix_iterations
+        self.index: Optional[int] = None
+        self.extracting = False
+        self.nodes = 0
+        self._ticks = 0
+        self._deadline: Optional[float] = None
+        self.start()
+
+    def start(self):
+        """Starts the clock again, before any value is consumed."""
+        self._deadline = None if self.max_seconds is None else perf_counter() + self.max_seconds
+        self.index = None
+        self.extracting = False
+        self.nodes = 0
+
+    def start_value(self, index: int, nodes: int):
+        """Starts the consumption of the value at an index of the input, from a derivative with this many nodes."""
+        self.index = index
+        self.extracting = False
+        self.nodes = nodes
+        self.check_nodes()
+        self.check_time()
+
+    def start_extraction(self):
+        """Starts the extraction of the parses of the values consumed so far."""
+        self.extracting = True
+        self.check_time()
+
+    def exceeded(self, limit: str, bound: float):
+        raise BudgetExceededException(limit, bound, self.index, self.extracting)
+
+    def check_nodes(self):
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            self.exceeded('max_nodes', self.max_nodes)
+
+    def check_time(self):
+        if self._deadline is not None and perf_counter() > self._deadline:
+            self.exceeded('max_seconds', self.max_seconds)
+
+    def tick(self, ticks: int = 1):
+        self._ticks += ticks
+        if self._ticks >= self.CLOCK_INTERVAL:
+            self._ticks = 0
+            self.check_time()
+
+    def count_node(self):
+        """Counts a node built."""
+        self.nodes += 1
+        self.check_nodes()
+        self.tick()
+
+    def count_eps(self, trees: int):
+        """Counts an `Eps` node built with this many trees."""
+        if self.max_eps_trees is not None and trees > self.max_eps_trees:
+            self.exceeded('max_eps_trees', self.max_eps_trees)
+        self.count_node()
+
+    def check_trees(self, trees: int):
+        if self.max_eps_trees is not None and trees > self.max_eps_trees:
+            self.exceeded('max_eps_trees', self.max_eps_trees)
+
+    def count_trees(self, trees: int):
+        """Counts a list of this many trees about to be built."""
+        self.check_trees(trees)
+        self.tick(trees)
+
+    def count_fix_iteration(self, iterations: int):
+        """Counts an evaluation of a fixed point, given the number taken to solve it so far."""
+        if self.max_fix_iterations is not None and iterations > self.max_fix_iterations:
+            self.exceeded('max_fix_iterations', self.max_fix_iterations)
+        self.tick()
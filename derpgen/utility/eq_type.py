@@ -2,7 +2,7 @@ from enum import Enum, auto, unique
 from typing import Any
 
 
-__all__ = ['EqType', 'hash_of_eq']
+__all__ = ['EqType', 'hash_of_eq', 'is_eq']
 
 
 @unique
@@ -18,3 +18,12 @@ def hash_of_eq(eq_type: EqType, o: Any) -> int:
         return hash(o)
     else:
         raise RuntimeError(f"Invalid EqType: {eq_type}.")
+
+
+def is_eq(eq_type: EqType, a: Any, b: Any) -> bool:
+    if eq_type is EqType.Eq:
+        return a is b
+    elif eq_type is EqType.Equal:
+        return a == b
+    else:
+        raise RuntimeError(f"Invalid EqType: {eq_type}.")
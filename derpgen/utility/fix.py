@@ -1,8 +1,8 @@
 from .eq_type import *
+from .session import *
 
-from dataclasses import dataclass
 from functools import wraps
-from typing import Any, Callable, Dict, Optional, Set, Tuple, TypeVar
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypeVar
 
 
 __all__ = ['fix', 'EqType']
@@ -13,74 +13,153 @@ Key = Tuple[int, ...]
 Val = TypeVar('Val')
 
 
-@dataclass
-class Parameters:
-    visited: Set[Key]
-    changed: bool
-    running: bool
+_MISSING = object()
 
 
-def fix(mk_bottom: Callable[[], Val], *eqs: EqType):
-    cache: Dict[Key, Val] = {}
-    params = Parameters(set(), False, False)
+class Solver:
+    """
+    The state of a running fixed-point computation. Every key reached so far has a current value, and the keys whose
+    evaluation read it are recorded as its dependents. Whenever a value changes, only its dependents are re-evaluated.
+    """
 
-    def is_cached(k: Key) -> bool:
-        return k in cache
+    __slots__ = ('values', 'args', 'dependents', 'worklist', 'pending', 'current')
 
-    def is_visited(k: Key) -> bool:
-        return k in params.visited
+    def __init__(self):
+        self.values: Dict[Key, Any] = {}
+        self.args: Dict[Key, Args] = {}
+        self.dependents: Dict[Key, Set[Key]] = {}
+        self.worklist: List[Key] = []
+        self.pending: Set[Key] = set()
+        self.current: Optional[Key] = None
 
-    def cached_val(k: Key) -> Val:
-        val = cache.get(k)
-        if val is None:
-            return mk_bottom()
-        else:
-            return val
+    def schedule(self, key: Key):
+        if key not in self.pending:
+            self.pending.add(key)
+            self.worklist.append(key)
+
+
+class FixState:
+    """The state of a fixed-point function within a single `ParseSession`."""
+
+    __slots__ = ('cache', 'solver')
+
+    def __init__(self):
+        self.cache: GenerationalTable[Key, Tuple[Any, Args]] = GenerationalTable()
+        self.solver: Optional[Solver] = None
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def age(self):
+        self.cache.age()
+
+    def clear(self):
+        self.cache.clear()
+        self.solver = None
 
-    def clear_cache(k: Optional[Key] = None):
-        nonlocal cache
-        nonlocal params
-        if k is None:
-            cache = {}
-            params = Parameters(set(), False, False)
-        else:
-            if k in cache:
-                del(cache[k])
-            params.remove(k)
-
-    def f(func: Callable[..., Val], key: Key, *args: Any) -> Val:
-        if is_visited(key):
-            if is_cached(key):
-                return cached_val(key)
+
+def fix(mk_bottom: Callable[[], Val], *eqs: EqType, slot: Optional[str] = None):
+    """
+    Computes the fixed point of a recursive function over a (possibly cyclic) graph, starting from the value given by
+    `mk_bottom`. Arguments are compared according to the corresponding `EqType`.
+
+    The fixed point is found with a worklist. Recursive calls made while evaluating the function do not recurse: they
+    return the callee's current value (scheduling the callee for evaluation if it has not been reached yet) and record
+    the caller as depending on it. Each time a value changes, only the evaluations that read it are repeated, and the
+    stack depth does not depend on the size of the graph.
+
+    By default, results are cached in a table of the current `ParseSession`. When a `slot` is given, the function must
+    take a single argument, and results are instead stored in that attribute of the argument, which must be initialized
+    to None. Only the results of a finished computation are stored; the session holds just the state of a running one.
+
+    When the session counts operations, each fixed point which is solved is counted under the name of the function,
+    along with the number of evaluations it took. When the session has a budget, the evaluations are checked against it.
+    """
+    def decorate(func: Callable[..., Val]):
+        def get_state() -> FixState:
+            return current_session().table(wrapper, FixState)
+
+        def settled_val(state: FixState, key: Key, args: Args) -> Any:
+            if slot is not None:
+                val = getattr(args[0], slot)
+                if val is not None:
+                    return val
             else:
-                return mk_bottom()
-        else:
-            params.visited.add(key)
-            val = func(*args)
-            if val != cached_val(key):
-                params.changed = True
-                cache[key] = val
+                entry = state.cache.get(key)
+                if entry is not None:
+                    return entry[0]
+            return _MISSING
+
+        def clear_cache(k: Optional[Key] = None):
+            state = get_state()
+            if k is None:
+                state.clear()
+            elif k in state.cache:
+                del(state.cache[k])
+
+        def lookup(solver: Solver, state: FixState, key: Key, args: Args) -> Val:
+            val = solver.values.get(key, _MISSING)
+            if val is _MISSING:
+                val = settled_val(state, key, args)
+                if val is not _MISSING:
+                    return val
+                val = solver.values[key] = mk_bottom()
+                solver.args[key] = args
+                solver.schedule(key)
+            dependents = solver.dependents.get(key)
+            if dependents is None:
+                dependents = solver.dependents[key] = set()
+            dependents.add(solver.current)
             return val
 
-    def decorate(func: Callable[[Key], Val]):
+        def solve(state: FixState, key: Key, args: Args) -> Val:
+            solver = state.solver = Solver()
+            solver.values[key] = mk_bottom()
+            solver.args[key] = args
+            solver.schedule(key)
+            budget = current_session().budget
+            iterations = 0
+            while solver.worklist:
+                iterations += 1
+                if budget is not None:
+                    budget.count_fix_iteration(iterations)
+                k = solver.worklist.pop()
+                solver.pending.discard(k)
+                solver.current = k
+                val = func(*solver.args[k])
+                if val != solver.values[k]:
+                    solver.values[k] = val
+                    for dependent in solver.dependents.get(k, ()):
+                        solver.schedule(dependent)
+            # Every value that was reached is now settled.
+            for k, val in solver.values.items():
+                if slot is not None:
+                    setattr(solver.args[k][0], slot, val)
+                else:
+                    state.cache[k] = (val, solver.args[k])
+            stats = current_session().stats
+            if stats is not None:
+                stats.count_fix(wrapper.__name__, iterations)
+            return solver.values[key]
+
         @wraps(func)
         def wrapper(*args: Any):
+            if slot is not None:
+                val = getattr(args[0], slot)
+                if val is not None:
+                    return val
+            state = get_state()
             key = tuple(hash_of_eq(eqs[i], arg) for (i, arg) in enumerate(args))
-            if params.running:
-                return f(func, key, *args)
-            elif is_cached(key):
-                return cached_val(key)
-            else:
-                val = mk_bottom()
-                params.visited = set()
-                params.changed = True
-                params.running = True
-                while params.changed:
-                    params.changed = False
-                    params.visited = set()
-                    val = f(func, key, *args)
-                params.running = False
+            solver = state.solver
+            if solver is not None:
+                return lookup(solver, state, key, args)
+            val = settled_val(state, key, args)
+            if val is not _MISSING:
                 return val
+            try:
+                return solve(state, key, args)
+            finally:
+                state.solver = None
         wrapper.__dict__.update(func.__dict__)
         wrapper.clear_cache = clear_cache
         return wrapper
@@ -1,6 +1,7 @@
 from .rename import RENAME_MARKER
 
 from inspect import findsource, getframeinfo, getmodule, signature, stack, Traceback
+import linecache
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, TypeVar, Union
 
 
@@ -53,6 +54,18 @@ class DuplicatedNamesError(MatchDefinitionError):
                          f"  Duplicated names: {', '.join(names)}")
 
 
+def compile_function(name: str, lines: List[str], namespace: Dict[str, Any], mdfn: str, mdln: int) -> Callable:
+    """
+    Compiles the source `lines` of a function definition, resolving free names in the `namespace`, and returns the
+    function. The source is registered with `linecache` so that tracebacks through the function show its code.
+    """
+    source = '\n'.join(lines) + '\n'
+    filename = f"<{name} generated for match in {mdfn}, line {mdln}>"
+    linecache.cache[filename] = (len(source), None, source.splitlines(keepends=True), filename)
+    exec(compile(source, filename, 'exec'), namespace)
+    return namespace[name]
+
+
 def get_param_names(func: Callable) -> Tuple[str]:
     if not callable(func):
         return tuple()
@@ -67,6 +80,9 @@ class ParamGetFunc(Callable[[Tuple[Any], Any], Any]):
     def __call__(self, ps, x):
         return ps[self.pos]
 
+    def source(self) -> str:
+        return f"p{self.pos}"
+
     def __repr__(self) -> str:
         return f"<function match.ParamGetFunc<{self.pos}> at {id(self)}>"
 
@@ -78,6 +94,9 @@ class AttrGetFunc(Callable[[Tuple[Any], Any], Any]):
     def __call__(self, ps, x):
         return getattr(x, self.attr)
 
+    def source(self) -> str:
+        return f"x.{self.attr}"
+
     def __repr__(self) -> str:
         return f"<function match.AttrGetFunc<{self.attr}> at {id(self)}>"
 
@@ -202,26 +221,29 @@ def match(table: Dict[Type, Callable[..., Val]], base: Optional[Type] = None, pa
         if missing_subclasses:
             raise NonExhaustiveMatchError(_mdfn, _mdln, missing_subclasses)
 
-    # Define the actual match function.
-    def do_match(*args: Any) -> Val:
+    # Define the actual match function. Its code is generated here, once: each clause becomes a class test followed by a
+    # direct call of the clause function, whose arguments are loaded positionally from the parameters and attributes.
+    # This way, dispatch does not need to build any intermediate structures.
+    arg_names = [f"p{i}" for i in range(max(len(params), pos + 1))]
+    namespace: Dict[str, Any] = {
+        'NoMatchError': NoMatchError,
+        'before_match_callback': before_match_callback,
+        '_mdfn': _mdfn,
+        '_mdln': _mdln,
+    }
+    lines = [f"def do_match({', '.join(arg_names)}):"]
+    if before_match_callback is not None:
         # Give the ability to perform an action prior to matching.
-        if before_match_callback is not None:
-            before_match_callback(do_match, *args)
-        # Perform matching.
-        x = args[pos]
-        cls = x.__class__
-        fgs = funcs.get(cls)
-        if fgs is None:
-            raise NoMatchError(_mdfn, _mdln, cls)
-        func, gs = fgs
-        call_params: Dict[str, Any] = {}
-        for name in gs:
-            try:
-                val = gs[name](args, x)
-            except Exception:
-                raise MatchError(_mdfn, _mdln, f"Could not obtain param by name: {cls.__name__}.{name}")
-            call_params[name] = val
-        return func(**call_params)
+        lines.append(f"    before_match_callback(do_match, {', '.join(arg_names)})")
+    lines.append(f"    x = p{pos}")
+    lines.append(f"    cls = x.__class__")
+    for i, (t, (f, getters)) in enumerate(funcs.items()):
+        namespace[f"c{i}"] = t
+        namespace[f"f{i}"] = f
+        lines.append(f"    if cls is c{i}:")
+        lines.append(f"        return f{i}({', '.join(getter.source() for getter in getters.values())})")
+    lines.append(f"    raise NoMatchError(_mdfn, _mdln, cls)")
+    do_match = compile_function('do_match', lines, namespace, _mdfn, _mdln)
 
     # Mark function for renaming and fix the module assignment.
     setattr(do_match, RENAME_MARKER, True)
@@ -231,28 +253,67 @@ def match(table: Dict[Type, Callable[..., Val]], base: Optional[Type] = None, pa
     return do_match
 
 
-# TODO: Update `match_pred` to work like `match` does now.
 def match_pred(table: Dict[Type, Dict[Callable[..., bool], Union[Val, Callable[..., Val]]]],
-               params: Optional[Tuple[str, ...]] = None, pos: int = 0) -> Callable[..., Val]:
+               params: Optional[Tuple[str, ...]] = None, pos: int = 0,
+               clause_callback: Optional[Callable[[Type, int], Any]] = None) -> Callable[..., Val]:
+    """
+    Returns a function which performs dispatch based on the type of an input, like `match`, and then on a series of
+    predicates. For each type, the table gives an ordered mapping of predicates to results. The result of the first
+    predicate that holds is returned, or called if it is callable. The arguments of predicates and of callable results
+    are passed by name: names in `params` refer to the parameters of the function, and other names are attributes of
+    the matched object.
+
+    As with `match`, the code of the returned function is generated when `match_pred` is called. When a
+    `clause_callback` is given, it is called with the matched type and the index of the predicate which held before
+    each result is produced. Otherwise, no code is generated for it.
+    """
+    _frame = stack()[1][0]
+    _caller: Traceback = getframeinfo(_frame)
+    _mdfn = _caller.filename    # MDFN = Match Definition File Name.
+    _mdln = _caller.lineno      # MDLN = Match Definition Line Number.
+    _mdm = getmodule(_frame)    # MDM  = Match Definition Module.
+    _mdmn = _mdm.__name__       # MDMN = Match Definition Module Name.
+
     if params is None:
         params = ()
 
-    names = {t: {p: get_param_names(v) for p, v in table[t].items()} for t in table}
-    pred_names = {t: {p: get_param_names(p) for p in table[t]} for t in table}
-
-    def do_pred_match(*args: Any):
-        x = args[pos]
-        cls = x.__class__
-        preds = table[cls]
-        for pred, v in preds.items():
-            param_args = {param: args[i] for (i, param) in enumerate(params)}
-            pred_args = (param_args[name] if name in param_args else getattr(x, name) for name in pred_names[cls][pred])
-            if not pred(*pred_args):
-                continue
+    def arg_source(name: str) -> str:
+        if name in params:
+            return ParamGetFunc(params.index(name)).source()
+        return AttrGetFunc(name).source()
+
+    def call_source(func_name: str, func: Callable) -> str:
+        return f"{func_name}({', '.join(map(arg_source, get_param_names(func)))})"
+
+    arg_names = [f"p{i}" for i in range(max(len(params), pos + 1))]
+    namespace: Dict[str, Any] = {
+        'NoMatchError': NoMatchError,
+        'clause_callback': clause_callback,
+        '_mdfn': _mdfn,
+        '_mdln': _mdln,
+    }
+    lines = [f"def do_pred_match({', '.join(arg_names)}):",
+             f"    x = p{pos}",
+             f"    cls = x.__class__"]
+    for i, (t, preds) in enumerate(table.items()):
+        namespace[f"c{i}"] = t
+        lines.append(f"    if cls is c{i}:")
+        for j, (pred, v) in enumerate(preds.items()):
+            namespace[f"q{i}_{j}"] = pred
+            namespace[f"v{i}_{j}"] = v
+            lines.append(f"        if {call_source(f'q{i}_{j}', pred)}:")
+            if clause_callback is not None:
+                lines.append(f"            clause_callback(c{i}, {j})")
             if callable(v):
-                call_args = (param_args[name] if name in param_args else getattr(x, name) for name in names[cls][pred])
-                return v(*call_args)
+                lines.append(f"            return {call_source(f'v{i}_{j}', v)}")
             else:
-                return v
+                lines.append(f"            return v{i}_{j}")
+        lines.append(f"        return None")
+    lines.append(f"    raise NoMatchError(_mdfn, _mdln, cls)")
+    do_pred_match = compile_function('do_pred_match', lines, namespace, _mdfn, _mdln)
+
+    # Mark function for renaming and fix the module assignment.
+    setattr(do_pred_match, RENAME_MARKER, True)
+    do_pred_match.__module__ = _mdmn
 
     return do_pred_match
@@ -1,8 +1,9 @@
 from .eq_type import *
-from .lazy import *
+from .session import *
 
 from functools import wraps
-from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+from typing import Any, Callable, Optional, Tuple, TypeVar
+from weakref import ref as weak_ref
 
 
 __all__ = ['memoize', 'EqType']
@@ -13,26 +14,70 @@ Key = Tuple[int, ...]
 Val = TypeVar('Val')
 
 
-def memoize(*eqs: EqType):
-    cache: Dict[Key, Val] = {}
+def memoize(*eqs: EqType, slot: Optional[str] = None, weak: bool = False):
+    """
+    Memoizes a function, comparing each argument according to the corresponding `EqType`.
 
-    def clear_cache(k: Optional[Key]):
-        nonlocal cache
-        if k is None:
-            cache = {}
-        else:
-            if k in cache:
-                del(cache[k])
+    By default, results are cached in a table of the current `ParseSession`. When a `slot` is given, the most recent
+    result is instead stored in that attribute of the first argument, which must be initialized to None. Each lookup is
+    then a single attribute read, and the result is collected along with the object it was computed for. A `weak` slot
+    only holds a weak reference to the result, so the result does not outlive its other references. Slot results can
+    also be supplied ahead of time with the function's `prime(val, o, *args)`.
 
+    When the session counts operations, lookups are counted as hits or misses under the name of the function.
+    """
     def decorate(func: Callable[..., Val]):
+        def clear_cache(k: Optional[Key] = None):
+            cache = current_session().table(wrapper)
+            if k is None:
+                cache.clear()
+            elif k in cache:
+                del(cache[k])
+
         @wraps(func)
         def wrapper(*args: Any):  # This decorator does not support keyword arguments.
+            session = current_session()
+            cache: GenerationalTable[Key, Tuple[Val, Args]] = session.table(wrapper)
             key: Key = tuple(hash_of_eq(eqs[i], arg) for (i, arg) in enumerate(args))
-            val: Val = cache.get(key)
-            if val is None:
-                val = delay(lambda: func(*args))
-                cache[key] = val
-            return force(val)
+            entry = cache.get(key)
+            if entry is None:
+                if session.stats is not None:
+                    session.stats.count_miss(wrapper.__name__)
+                # The value is only cached once it has been fully computed, so a re-entrant call with the same key
+                # computes its own result instead of observing an unfinished one. The arguments are kept alongside the
+                # value so that identity-based keys cannot be reused by other objects while the entry exists.
+                entry = (func(*args), args)
+                cache[key] = entry
+            elif session.stats is not None:
+                session.stats.count_hit(wrapper.__name__)
+            return entry[0]
+
+        @wraps(func)
+        def slot_wrapper(o: Any, *args: Any):
+            session = current_session()
+            tag = session.tag
+            # Entries are (tag, args, value) triples, replaced as a whole so that concurrent readers never see a mix of
+            # two entries.
+            entry = getattr(o, slot)
+            if entry is not None and entry[0] is tag and all(map(is_eq, eqs[1:], entry[1], args)):
+                val = entry[2]() if weak else entry[2]
+                if val is not None:
+                    if session.stats is not None:
+                        session.stats.count_hit(slot_wrapper.__name__)
+                    return val
+            if session.stats is not None:
+                session.stats.count_miss(slot_wrapper.__name__)
+            val = func(o, *args)
+            setattr(o, slot, (tag, args, weak_ref(val) if weak else val))
+            return val
+
+        def prime(val: Val, o: Any, *args: Any):
+            setattr(o, slot, (current_session().tag, args, weak_ref(val) if weak else val))
+
+        if slot is not None:
+            slot_wrapper.__dict__.update(func.__dict__)
+            slot_wrapper.prime = prime
+            return slot_wrapper
         wrapper.__dict__.update(func.__dict__)
         wrapper.clear_cache = clear_cache
         return wrapper
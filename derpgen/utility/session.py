@@ -0,0 +1,164 @@
+from .budget import *
+from .stats import *
+
+from contextvars import ContextVar
+from threading import local
+from typing import Any, Callable, Dict, Generic, Hashable, Iterator, Optional, TypeVar
+from weakref import WeakValueDictionary
+
+
+__all__ = ['ParseSession', 'GenerationalTable', 'current_session']
+
+
+K = TypeVar('K')
+V = TypeVar('V')
+T = TypeVar('T')
+
+
+_MISSING = object()
+
+
+class GenerationalTable(Generic[K, V]):
+    """
+    A dictionary-like table split into a young and an old generation. New entries and entries that are used go into the
+    young generation. Aging the table discards the old generation and makes the young generation old, so entries which
+    have not been used since the previous aging are dropped.
+    """
+
+    __slots__ = ('young', 'old')
+
+    def __init__(self):
+        self.young: Dict[K, V] = {}
+        self.old: Dict[K, V] = {}
+
+    def get(self, k: K, default: Optional[V] = None) -> Optional[V]:
+        v = self.young.get(k, _MISSING)
+        if v is _MISSING:
+            if not self.old:
+                return default
+            v = self.old.pop(k, _MISSING)
+            if v is _MISSING:
+                return default
+            self.young[k] = v
+        return v
+
+    def __contains__(self, k: K) -> bool:
+        return k in self.young or k in self.old
+
+    def __setitem__(self, k: K, v: V):
+        self.young[k] = v
+
+    def __delitem__(self, k: K):
+        self.young.pop(k, None)
+        self.old.pop(k, None)
+
+    def __len__(self) -> int:
+        return len(self.young) + len(self.old)
+
+    def __iter__(self) -> Iterator[K]:
+        yield from self.young
+        yield from self.old
+
+    def age(self):
+        self.old = self.young
+        self.young = {}
+
+    def clear(self):
+        self.young = {}
+        self.old = {}
+
+
+class ParseSession:
+    """
+    Owns the caches used by the memoized and fixed-point functions (see `memoize` and `fix`), along with any other
+    scratch state needed while parsing. Each decorated function gets its own table in each session, so parses run in
+    different sessions never observe each other's intermediate results.
+
+    A session is activated for the current context (thread or task) with a `with` block. Outside of any such block, each
+    thread uses its own default session. A session must not be active in more than one thread at a time.
+
+    When `max_entries` is given, the session's tables are aged each time `collect` finds that more entries than that have
+    been added since the previous aging. Aging drops everything that was not used since the previous aging, so the
+    session holds at most about twice `max_entries` entries and a long-lived session keeps a steady footprint. `collect`
+    must only be called between top-level operations (e.g., between tokens), since intermediate results of a running
+    computation cannot be discarded.
+
+    When `hash_cons` is set, the session also keeps a table of the nodes built by the grammar's smart constructors, so
+    that structurally identical nodes are shared instead of allocated again. The table only holds weak references.
+
+    When `forest` is set, parses in the session build a shared packed parse forest instead of lists of trees, and trees
+    are only extracted from the forest on request.
+
+    When `stats` is given, the work done in the session is counted into it (see `OperationCounts`). Counting is off by
+    default, in which case it costs no more than a test of this attribute wherever something would be counted.
+
+    When `trees` is unset, parses in the session only recognize their input: no trees are built at all, and only
+    whether the input is accepted can be asked (see `recognize`).
+
+    When `budget` is given, the work done in the session is checked against its limits (see `ParseBudget`), and is
+    aborted as soon as one of them is exceeded.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, hash_cons: bool = False, forest: bool = False,
+                 stats: Optional[OperationCounts] = None, trees: bool = True, budget: Optional[ParseBudget] = None):
+        self.max_entries = max_entries
+        self.forest = forest
+        self.trees = trees
+        self.stats = stats
+        self.budget = budget
+        self.nodes: Optional[WeakValueDictionary] = WeakValueDictionary() if hash_cons else None
+        self.generation = 0
+        # Marks results which are stored on the objects they were computed for (see `memoize`) as belonging to this
+        # session. Unlike the session itself, the tag holds no references to the session's tables.
+        self.tag = object()
+        self._tables: Dict[Hashable, Any] = {}
+        self._aged_size = 0
+        self._tokens = []
+
+    def table(self, owner: Hashable, mk_table: Callable[[], T] = GenerationalTable) -> T:
+        """Returns the table belonging to the `owner`, creating it with `mk_table` if needed."""
+        t = self._tables.get(owner)
+        if t is None:
+            t = self._tables[owner] = mk_table()
+        return t
+
+    @property
+    def size(self) -> int:
+        """The total number of entries in all of the session's tables."""
+        return sum(map(len, self._tables.values()))
+
+    def collect(self):
+        """Starts a new generation, aging the tables if the session has grown past `max_entries`."""
+        self.generation += 1
+        if self.max_entries is not None:
+            size = self.size
+            if size - self._aged_size > self.max_entries:
+                for t in self._tables.values():
+                    t.age()
+                self._aged_size = self.size
+
+    def release(self):
+        """Discards all tables."""
+        self._tables = {}
+        self._aged_size = 0
+
+    def __enter__(self) -> 'ParseSession':
+        self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _current.reset(self._tokens.pop())
+
+
+_current: ContextVar[Optional[ParseSession]] = ContextVar('current_session', default=None)
+_defaults = local()
+
+
+def current_session() -> ParseSession:
+    """Returns the session active in the current context, or else the current thread's default session."""
+    session = _current.get()
+    if session is None:
+        session = getattr(_defaults, 'session', None)
+        if session is None:
+            session = _defaults.session = ParseSession()
+    return session
@@ -0,0 +1,52 @@
+from typing import Dict
+
+
+__all__ = ['OperationCounts']
+
+
+class OperationCounts:
+    """
+    Counts the work done by the memoized and fixed-point functions (see `memoize` and `fix`) run in a `ParseSession`
+    which was given these counts. Counts are kept per function, by name.
+
+    `hits` and `misses` count the lookups of memoized functions which did and did not find a result. `fix_queries`
+    counts the fixed points which had to be solved, `fix_iterations` the evaluations of the function which solving them
+    took in total, and `fix_max_iterations` the most evaluations taken by any single one of them. `rules` counts the
+    rules applied by rewriting functions which report them (see `match_pred`), by the names they give them.
+    """
+
+    def __init__(self):
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.fix_queries: Dict[str, int] = {}
+        self.fix_iterations: Dict[str, int] = {}
+        self.fix_max_iterations: Dict[str, int] = {}
+        self.rules: Dict[str, int] = {}
+
+    def count_hit(self, name: str):
+        self.hits[name] = self.hits.get(name, 0) + 1
+
+    def count_miss(self, name: str):
+        self.misses[name] = self.misses.get(name, 0) + 1
+
+    def count_fix(self, name: str, iterations: int):
+        self.fix_queries[name] = self.fix_queries.get(name, 0) + 1
+        self.fix_iterations[name] = self.fix_iterations.get(name, 0) + iterations
+        self.fix_max_iterations[name] = max(self.fix_max_iterations.get(name, 0), iterations)
+
+    def count_rule(self, name: str):
+        self.rules[name] = self.rules.get(name, 0) + 1
+
+    def calls(self, name: str) -> int:
+        """The number of calls of a memoized function."""
+        return self.hits.get(name, 0) + self.misses.get(name, 0)
+
+    def as_dict(self) -> dict:
+        return {
+            'hits': dict(self.hits),
+            'misses': dict(self.misses),
+            'fix_queries': dict(self.fix_queries),
+            'fix_iterations': dict(self.fix_iterations),
+            'fix_max_iterations': dict(self.fix_max_iterations),
+            'rules': dict(self.rules),
+        }
@@ -0,0 +1,62 @@
+from benchmarks.grammars import ambiguous_grammar, ambiguous_tokens, minpy_source
+
+from derpgen.grammar import build_grammar_from_file, compile_grammar, compile_lexer
+from derpgen.grammar.pwd import *
+from derpgen.utility import ParseSession
+
+from pickle import dumps, loads
+
+import pytest
+
+
+def wrap(t: Tree) -> Tree:
+    return Branch(Leaf('w'), t)
+
+
+WRAP = register_reduction('tests.test_batch.wrap', wrap)
+
+
+def test_parse_many_parses_like_parse():
+    grammar = build_grammar_from_file('tests/minpy.grammar')
+    g = compile_grammar(grammar).start
+    lexer = compile_lexer(grammar)
+    inputs = [list(lexer.values(minpy_source(n))) for n in range(10, 20)]
+    # An input which ends in the middle of a statement has no parses.
+    inputs[3] = inputs[3][:-2]
+    parses = list(parse_many(inputs, g, workers=2, window=3))
+    assert parses == [parse(values, g) for values in inputs]
+    assert [len(trees) for trees in parses] == [1, 1, 1, 0, 1, 1, 1, 1, 1, 1]
+
+
+def test_parse_many_with_registered_reductions():
+    g = rep(red(alt('a', 'b'), WRAP))
+    inputs = [list('ab'), list('abc'), [], list('bbb')]
+    assert list(parse_many(iter(inputs), g, workers=2)) == [parse(values, g) for values in inputs]
+
+
+def test_registered_reductions_are_pickled_by_name():
+    assert loads(dumps(WRAP)) == WRAP
+    assert loads(dumps(WRAP))(Leaf('a')) == wrap(Leaf('a'))
+    assert register_reduction('tests.test_batch.wrap', wrap) == WRAP
+    with pytest.raises(ValueError):
+        register_reduction('tests.test_batch.wrap', lambda t: t)
+    with pytest.raises(UnknownReductionException):
+        NamedReduction('tests.test_batch.unknown')
+
+
+def test_parse_shared_parses_like_parse():
+    g = rep(red(alt('a', 'b'), wrap))
+    inputs = [list('abab'), list('aba'), list('ab'), list('abab'), [], list('acab'), list('acb'), list('bb')]
+    shared = parse_shared(inputs, g)
+    assert shared.parses == [parse(values, g) for values in inputs]
+    assert shared.values == 22
+    # The prefixes a, ab, aba and abab are derived once, and nothing which follows ac is: a, b, a, b, c, b and b.
+    assert shared.derived == 7
+    assert shared.saved == 15
+
+
+def test_parse_shared_forks_forest_sessions():
+    inputs = [ambiguous_tokens(n) for n in range(6)]
+    shared = parse_shared(inputs, ambiguous_grammar(), ParseSession(forest=True))
+    assert [sorted(map(repr, trees)) for trees in shared.parses] == \
+        [sorted(map(repr, parse(values, ambiguous_grammar()))) for values in inputs]
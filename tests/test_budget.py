@@ -0,0 +1,46 @@
+from benchmarks.grammars import ambiguous_grammar, ambiguous_tokens
+
+from derpgen.grammar.pwd import *
+from derpgen.utility import BudgetExceededException, ParseBudget, ParseSession
+
+from time import perf_counter
+
+import pytest
+
+
+@pytest.mark.parametrize('forest', [False, True])
+def test_max_seconds_covers_extraction(forest):
+    # Consuming the values is quick, but there are 208012 parses to extract.
+    session = ParseSession(forest=forest, budget=ParseBudget(max_seconds=0.2))
+    start = perf_counter()
+    with pytest.raises(BudgetExceededException) as info:
+        parse(ambiguous_tokens(12), ambiguous_grammar(), session)
+    assert info.value.limit == 'max_seconds'
+    assert perf_counter() - start < 1
+
+
+def test_max_eps_trees_covers_extraction():
+    session = ParseSession(forest=True, budget=ParseBudget(max_eps_trees=1000))
+    with pytest.raises(BudgetExceededException) as info:
+        parse(ambiguous_tokens(9), ambiguous_grammar(), session)
+    assert info.value.limit == 'max_eps_trees'
+    assert info.value.extracting
+
+
+def test_max_eps_trees_in_list_mode():
+    session = ParseSession(budget=ParseBudget(max_eps_trees=1000))
+    with pytest.raises(BudgetExceededException) as info:
+        parse(ambiguous_tokens(9), ambiguous_grammar(), session)
+    assert info.value.limit == 'max_eps_trees'
+
+
+def test_within_budget():
+    budget = ParseBudget(max_nodes=10000, max_eps_trees=5000, max_seconds=10, max_fix_iterations=100000)
+    assert len(parse(ambiguous_tokens(7), ambiguous_grammar(), ParseSession(budget=budget))) == 429
+
+
+def test_max_nodes():
+    with pytest.raises(BudgetExceededException) as info:
+        parse(ambiguous_tokens(30), ambiguous_grammar(), ParseSession(forest=True, budget=ParseBudget(max_nodes=50)))
+    assert info.value.limit == 'max_nodes'
+    assert info.value.index is not None
@@ -0,0 +1,57 @@
+from benchmarks.grammars import minpy_source
+
+from derpgen.grammar import build_grammar_from_file, compile_grammar_from_file, compile_lexer
+from derpgen.grammar import cache
+from derpgen.grammar.cache import cache_path, file_fingerprint, grammar_fingerprint
+from derpgen.grammar.pwd import parse
+
+from shutil import copyfile
+
+import pytest
+
+
+def test_file_fingerprint_matches_text_fingerprint():
+    with open('tests/minpy.grammar', 'rb') as f:
+        assert file_fingerprint('tests/minpy.grammar', chunk_size=7) == grammar_fingerprint(f.read())
+
+
+def test_cached_grammar_parses_like_compiled_grammar(tmp_path):
+    values = list(compile_lexer(build_grammar_from_file('tests/minpy.grammar')).values(minpy_source(40)))
+    compiled = compile_grammar_from_file('tests/minpy.grammar', cache_dir=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+    cached = compile_grammar_from_file('tests/minpy.grammar', cache_dir=tmp_path)
+    assert cached is not compiled
+    assert parse(values, cached.start) == parse(values, compiled.start)
+
+
+def test_changes_invalidate_the_cache(tmp_path, monkeypatch):
+    grammar_file = tmp_path / 'minpy.grammar'
+    copyfile('tests/minpy.grammar', grammar_file)
+    cache_dir = tmp_path / 'cache'
+    compile_grammar_from_file(str(grammar_file), cache_dir=cache_dir)
+    [first] = cache_dir.iterdir()
+    # A change to the grammar file.
+    with open(grammar_file, 'a') as f:
+        f.write('\n')
+    compile_grammar_from_file(str(grammar_file), cache_dir=cache_dir)
+    [second] = cache_dir.iterdir()
+    assert second != first
+    # A new version of the compiled grammars.
+    monkeypatch.setattr(cache, 'CACHE_VERSION', cache.CACHE_VERSION + 1)
+    compile_grammar_from_file(str(grammar_file), cache_dir=cache_dir)
+    [third] = cache_dir.iterdir()
+    assert third not in (first, second)
+
+
+@pytest.mark.parametrize('garbage', [b'', b'not a pickle', b'\x80\x05\x95', b'\x80\x04K\x01.',
+                                     b'\x80\x04\x8c\x08no_such\x94\x8c\x04name\x94\x93\x94.'])
+def test_corrupt_caches_are_rebuilt(tmp_path, garbage):
+    with open('tests/minpy.grammar', 'rb') as f:
+        path = cache_path('tests/minpy.grammar', grammar_fingerprint(f.read()), tmp_path)
+    path.write_bytes(garbage)
+    compiled = compile_grammar_from_file('tests/minpy.grammar', cache_dir=tmp_path)
+    assert parse(['x', '=', '1'], compiled.start) == parse(['x', '=', '1'], compile_grammar_from_file(
+        'tests/minpy.grammar', use_cache=False).start)
+    # The corrupt cache was replaced.
+    assert path.read_bytes() != garbage
+    assert compile_grammar_from_file('tests/minpy.grammar', cache_dir=tmp_path) is not None
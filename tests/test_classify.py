@@ -0,0 +1,61 @@
+from benchmarks.grammars import *
+
+from derpgen.grammar.compile import compile_grammar
+from derpgen.grammar.lexer import compile_lexer
+from derpgen.grammar.parse import parse_tokens
+from derpgen.grammar.pwd import *
+from derpgen.grammar.tokenize import tokenize_text
+from derpgen.utility import ParseSession
+
+from itertools import islice
+
+import pytest
+
+
+def read(grammar_file: str) -> str:
+    with open(grammar_file) as f:
+        return f.read()
+
+
+CASES = {
+    'minpy': lambda: (read('tests/minpy.grammar'), minpy_source(80)),
+    'arithmetic': lambda: (read('tests/arithmetic.grammar'), arithmetic_source(80)),
+    'ambiguous': lambda: (AMBIGUOUS_GRAMMAR, ambiguous_source(6)),
+    'wide': lambda: (wide_grammar(20), wide_source(80, 20)),
+    'fields': lambda: (fields_grammar(20), fields_source(40, 20)),
+}
+
+
+def forest(grammar_text: str, source: str, classify: bool, compact: bool = True):
+    grammar = parse_tokens(tokenize_text(grammar_text))
+    values = list(compile_lexer(grammar).values(source))
+    parser = Parser(compile_grammar(grammar).start, ParseSession(forest=True), classify=classify, compact=compact)
+    parser.feed_many(values)
+    return parser.forest()
+
+
+@pytest.mark.parametrize('case', CASES)
+@pytest.mark.parametrize('compact', [True, False])
+def test_classes_parse_like_values(case, compact):
+    grammar_text, source = CASES[case]()
+    by_value = forest(grammar_text, source, False, compact)
+    by_class = forest(grammar_text, source, True, compact)
+    assert by_value is not None
+    assert count_trees(by_class) == count_trees(by_value)
+    assert list(islice(iter_trees(by_class), 50)) == list(islice(iter_trees(by_value), 50))
+
+
+def test_classes_reject_like_values():
+    grammar_text, source = CASES['fields']()
+    assert forest(grammar_text, source + ' k1', True) is None
+
+
+def test_classes_require_forests():
+    with pytest.raises(ValueError):
+        Parser(arithmetic_grammar(), ParseSession(), classify=True)
+
+
+def test_fill_tokens_checks_the_number_of_values():
+    with pytest.raises(ValueError):
+        fill_tokens(Branch(TOKEN_LEAF, TOKEN_LEAF), ['a'])
+    assert fill_tokens(Branch(TOKEN_LEAF, TOKEN_LEAF), ['a', 'b']) == Branch(Leaf('a'), Leaf('b'))
@@ -0,0 +1,96 @@
+from derpgen.grammar.pwd import *
+from derpgen.utility import OperationCounts, ParseSession
+
+
+def wrap(t: Tree) -> Tree:
+    return Branch(Leaf('w'), t)
+
+
+def mark(t: Tree) -> Tree:
+    return Branch(t, Leaf('m'))
+
+
+def compact(g: Grammar, stats: OperationCounts = None) -> Grammar:
+    with ParseSession(stats=stats):
+        return make_compact(g)
+
+
+def test_reductions_of_reductions_compose():
+    g = red(red(tok('a'), wrap), mark)
+    assert isinstance(g, Red) and isinstance(g.g, Tok)
+    assert parse(['a'], g) == [mark(wrap(Leaf('a')))]
+    # Built without the constructors, the nested reductions are fused by `make_compact`.
+    g = compact(Red(Red(Tok('a'), wrap), mark))
+    assert isinstance(g, Red) and isinstance(g.g, Tok)
+    assert parse(['a'], g) == [mark(wrap(Leaf('a')))]
+
+
+def test_reductions_of_eps_are_applied():
+    assert red(eps([Leaf('x'), Leaf('y')]), wrap) == Eps([wrap(Leaf('x')), wrap(Leaf('y'))])
+    assert red(nil(), wrap) is nil()
+
+
+def test_single_eps_in_seq_becomes_a_reduction():
+    for g in [seq(eps([Leaf('x')]), tok('a')), compact(Seq(Eps([Leaf('x')]), Tok('a')))]:
+        assert isinstance(g, Red)
+        assert parse(['a'], g) == [Branch(Leaf('x'), Leaf('a'))]
+    for g in [seq(tok('a'), eps([Leaf('x')])), compact(Seq(Tok('a'), Eps([Leaf('x')])))]:
+        assert isinstance(g, Red)
+        assert parse(['a'], g) == [Branch(Leaf('a'), Leaf('x'))]
+
+
+def test_nil_is_dropped():
+    a = tok('a')
+    assert alt(nil(), a) is a
+    assert alt(a, nil()) is a
+    assert seq(nil(), a) is nil()
+    assert seq(a, nil()) is nil()
+    assert compact(Alt(Nil(), Tok('a'))) == Tok('a')
+    assert compact(Seq(Tok('a'), Seq(Nil(), Tok('b')))) is nil()
+
+
+def test_repetitions_of_nil_and_eps():
+    assert rep(nil()) == Eps([Empty()])
+    assert rep(eps([Leaf('x')])) == Eps([Empty()])
+    assert compact(Rep(Seq(Tok('a'), Nil()))) == Eps([Empty()])
+    assert rep(rep(tok('a'))) == rep(tok('a'))
+
+
+def test_empty_rules_compact_to_nil():
+    rd: GrammarDict = {}
+    rd['r'] = seq(tok('a'), ref('r', rd))
+    assert compact(ref('r', rd)) is nil()
+    assert compact(alt(tok('b'), ref('r', rd))) == Tok('b')
+
+
+def test_rules_which_are_not_recursive_are_replaced_by_their_bodies():
+    rd: GrammarDict = {}
+    rd['s'] = alt(ref('t', rd), tok('b'))
+    rd['t'] = tok('a')
+    assert compact(ref('s', rd)) == Alt(Tok('a'), Tok('b'))
+    r = ref('r', rd)
+    rd['r'] = alt(seq(tok('a'), r), tok('b'))
+    with ParseSession():
+        g = make_compact(r)
+        assert isinstance(g, Ref)
+        # A compacted rule is its own compaction.
+        assert make_compact(g) is g
+
+
+def test_rules_are_counted():
+    stats = OperationCounts()
+    compact(Alt(Nil(), Seq(Tok('a'), Nil())), stats)
+    assert stats.rules['Alt/empty-left'] == 1
+    assert stats.rules['Seq/empty'] == 1
+
+
+def test_hash_consing_shares_identical_nodes():
+    a = tok('a')
+    b = tok('b')
+    with ParseSession(hash_cons=True):
+        assert alt(a, b) is alt(a, b)
+        assert seq(a, red(b, wrap)) is seq(a, red(b, wrap))
+        assert rep(a) is rep(a)
+        assert alt(a, b) is not alt(b, a)
+    assert alt(a, b) is not alt(a, b)
+    assert nil() is nil()
@@ -0,0 +1,30 @@
+from benchmarks.grammars import ambiguous_grammar, ambiguous_tokens
+
+from derpgen.grammar.pwd import *
+from derpgen.utility import ParseSession
+
+import pytest
+
+
+def test_requires_forests():
+    with pytest.raises(ValueError):
+        CubicParser(ambiguous_grammar(), ParseSession())
+
+
+def test_counts_ambiguous_parses_like_pwd():
+    # There are 208012 parses, which are only counted, not listed.
+    parser = CubicParser(ambiguous_grammar())
+    parser.feed_many(ambiguous_tokens(12))
+    assert count_trees(parser.forest()) == count_parses(ambiguous_tokens(12), ambiguous_grammar()) == 208012
+
+
+def test_parses_like_pwd():
+    assert sorted(map(repr, parse_cubic(ambiguous_tokens(5), ambiguous_grammar()))) == \
+        sorted(map(repr, parse(ambiguous_tokens(5), ambiguous_grammar())))
+
+
+def test_rejects_like_pwd():
+    parser = CubicParser(ambiguous_grammar())
+    with pytest.raises(ParseException) as info:
+        parser.feed_many(ambiguous_tokens(3) + ambiguous_tokens(3))
+    assert info.value.index == len(ambiguous_tokens(3))
@@ -0,0 +1,223 @@
+"""
+Checks the parses of random grammars on short inputs against those of a brute-force reference, which finds the spans of
+the input each node matches as a least fixed point, and then enumerates the derivations of each span.
+"""
+
+from derpgen.grammar.pwd import *
+from derpgen.utility import ParseSession
+
+from random import Random
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytest
+
+
+Span = Tuple[int, int]
+
+
+def wrap(t: Tree) -> Tree:
+    return Branch(Leaf('w'), t)
+
+
+def random_grammar(rng: Random, rules: int = 3, depth: int = 3) -> Grammar:
+    rd: GrammarDict = {}
+    refs = [ref(f'r{i}', rd) for i in range(rules)]
+
+    def node(depth: int) -> Grammar:
+        k = rng.randrange(10 if depth > 0 else 4)
+        if k == 0:
+            return tok(rng.choice('ab'))
+        if k == 1:
+            return eps([Leaf('e')])
+        if k == 2:
+            return rng.choice(refs)
+        if k == 3:
+            return tok(rng.choice('abc'))
+        if k == 4:
+            return alt(node(depth - 1), node(depth - 1))
+        if k == 5:
+            return seq(node(depth - 1), node(depth - 1))
+        if k == 6:
+            return red(node(depth - 1), wrap)
+        if k == 7:
+            return rep(node(depth - 1))
+        if k == 8:
+            return seq(node(depth - 1), eps([Leaf('z')]))
+        return nil()
+
+    for g in refs:
+        rd[g.n] = node(depth)
+    return refs[0]
+
+
+def children(g: Grammar) -> Tuple[Grammar, ...]:
+    cls = g.__class__
+    if cls is Alt or cls is Seq:
+        return g.g1, g.g2
+    if cls is Rep or cls is Red:
+        return g.g,
+    if cls is Ref:
+        return g.rd[g.n],
+    return ()
+
+
+def nodes(g: Grammar) -> List[Grammar]:
+    seen: Dict[int, Grammar] = {}
+    stack = [g]
+    while stack:
+        g = stack.pop()
+        if id(g) not in seen:
+            seen[id(g)] = g
+            stack.extend(children(g))
+    return list(seen.values())
+
+
+class InfinitelyAmbiguous(Exception):
+    pass
+
+
+class Reference:
+    """The spans of an input matched by each node of a grammar, and the trees of each of those spans."""
+
+    def __init__(self, g: Grammar, values: List[str]):
+        self.values = values
+        self.nodes = nodes(g)
+        self.spans: Dict[int, Set[Span]] = {id(h): set() for h in self.nodes}
+        changed = True
+        while changed:
+            changed = False
+            for h in self.nodes:
+                spans = self.match(h)
+                if spans - self.spans[id(h)]:
+                    self.spans[id(h)] |= spans
+                    changed = True
+        self.trees_memo: Dict[Tuple[int, Span], List[Tree]] = {}
+        self.active: Set[Tuple[int, Span]] = set()
+
+    def match(self, g: Grammar) -> Set[Span]:
+        n = len(self.values)
+        cls = g.__class__
+        if cls is Eps:
+            return {(i, i) for i in range(n + 1)}
+        if cls is Tok:
+            return {(i, i + 1) for i in range(n) if self.values[i] == g.t}
+        if cls is Alt:
+            return self.spans[id(g.g1)] | self.spans[id(g.g2)]
+        if cls is Seq:
+            return {(i, k) for i, j in self.spans[id(g.g1)] for j2, k in self.spans[id(g.g2)] if j == j2}
+        if cls is Red or cls is Ref:
+            return set(self.spans[id(children(g)[0])])
+        if cls is Rep:
+            # Each repetition consumes at least one value.
+            return {(i, i) for i in range(n + 1)} | {(i, k) for i, j in self.spans[id(g.g)] if i < j
+                                                     for j2, k in self.spans[id(g)] if j == j2}
+        return set()
+
+    def finitely_ambiguous(self) -> bool:
+        """
+        Whether every span of every node has finitely many trees. Otherwise, the derivatives of some prefix of the input
+        have infinitely many empty parses, which parsers which build trees cannot extract, even when the input is
+        rejected.
+        """
+        try:
+            for h in self.nodes:
+                for span in self.spans[id(h)]:
+                    self.trees(h, span)
+        except InfinitelyAmbiguous:
+            return False
+        return True
+
+    def accepts(self, g: Grammar) -> bool:
+        return (0, len(self.values)) in self.spans[id(g)]
+
+    def trees(self, g: Grammar, span: Optional[Span] = None) -> List[Tree]:
+        """The trees of a span, one for each derivation. Raises `InfinitelyAmbiguous` if there are infinitely many."""
+        i, k = span = (0, len(self.values)) if span is None else span
+        if span not in self.spans[id(g)]:
+            return []
+        key = (id(g), span)
+        if key in self.trees_memo:
+            return self.trees_memo[key]
+        # A derivation of a span which goes through the same node and span again can be repeated any number of times.
+        if key in self.active:
+            raise InfinitelyAmbiguous()
+        self.active.add(key)
+        cls = g.__class__
+        if cls is Eps:
+            ts = list(g.ts)
+        elif cls is Tok:
+            ts = [Leaf(self.values[i])]
+        elif cls is Alt:
+            ts = self.trees(g.g1, span) + self.trees(g.g2, span)
+        elif cls is Seq:
+            ts = [Branch(t1, t2) for j in range(i, k + 1) if (j, k) in self.spans[id(g.g2)]
+                  for t1 in self.trees(g.g1, (i, j)) for t2 in self.trees(g.g2, (j, k))]
+        elif cls is Red:
+            ts = [g.f(t) for t in self.trees(g.g, span)]
+        elif cls is Ref:
+            ts = self.trees(g.rd[g.n], span)
+        elif i == k:
+            ts = [Empty()]
+        else:
+            ts = [Branch(t1, t2) for j in range(i + 1, k + 1) if (j, k) in self.spans[id(g)]
+                  for t1 in self.trees(g.g, (i, j)) for t2 in self.trees(g, (j, k))]
+        self.active.discard(key)
+        self.trees_memo[key] = ts
+        return ts
+
+
+def cases(seed: int, grammars: int = 40, inputs: int = 4):
+    rng = Random(seed)
+    for _ in range(grammars):
+        g = random_grammar(rng)
+        for _ in range(inputs):
+            yield g, [rng.choice('abc') for _ in range(rng.randrange(6))]
+
+
+def plain(trees: List[Tree]) -> List[str]:
+    return sorted(map(repr, trees))
+
+
+def cubic_accepts(values: List[str], g: Grammar) -> bool:
+    parser = CubicParser(g)
+    try:
+        parser.feed_many(values)
+    except ParseException:
+        return False
+    return parser.accepts()
+
+
+def parse_with(values: List[str], g: Grammar, session: ParseSession, compact: bool = True) -> List[Tree]:
+    parser = Parser(g, session, compact=compact)
+    try:
+        parser.feed_many(values)
+    except ParseException:
+        return []
+    return parser.finish()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_recognize(seed):
+    for g, values in cases(seed):
+        expected = Reference(g, values).accepts(g)
+        assert recognize(values, g) == expected, values
+        assert cubic_accepts(values, g) == expected, values
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_parses(seed):
+    checked = 0
+    for g, values in cases(seed):
+        reference = Reference(g, values)
+        if not reference.finitely_ambiguous():
+            continue
+        expected = plain(reference.trees(g))
+        checked += 1
+        assert plain(parse(values, g)) == expected, values
+        assert plain(parse_with(values, g, ParseSession(hash_cons=True))) == expected, values
+        assert plain(parse_with(values, g, ParseSession(), compact=False)) == expected, values
+        assert plain(parse_with(values, g, ParseSession(forest=True))) == expected, values
+        assert count_parses(values, g) == len(expected), values
+        assert plain(parse_iter(values, g)) == expected, values
+        assert plain(parse_cubic(values, g)) == expected, values
+    assert checked
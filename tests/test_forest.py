@@ -0,0 +1,114 @@
+from benchmarks.grammars import ambiguous_grammar, ambiguous_tokens
+
+from derpgen.grammar.pwd import *
+from derpgen.utility import ParseSession
+
+from random import Random
+from typing import Iterator
+
+
+def wrap(t: Tree) -> Tree:
+    return Branch(Leaf('w'), t)
+
+
+def expand(forest: Tree) -> Iterator[Tree]:
+    # The trees of a forest, with each node generating the product of those of its children.
+    cls = forest.__class__
+    if cls is Packed:
+        for t in forest.alternatives:
+            yield from expand(t)
+    elif cls is Reduction:
+        for t in expand(forest.tree):
+            yield forest.f(t)
+    elif cls is Branch:
+        for left in expand(forest.left):
+            for right in expand(forest.right):
+                yield Branch(left, right)
+    elif cls is Deferred:
+        yield from expand(forest.forest)
+    else:
+        yield forest
+
+
+def random_forest(rng: Random, depth: int) -> Tree:
+    k = rng.randrange(6 if depth > 0 else 2)
+    if k == 0:
+        return Leaf(rng.choice('xyz'))
+    if k == 1:
+        return Empty()
+    if k == 2:
+        return Packed(tuple(random_forest(rng, depth - 1) for _ in range(rng.randrange(2, 4))))
+    if k == 3:
+        return Reduction(wrap, random_forest(rng, depth - 1))
+    if k == 4:
+        t = random_forest(rng, depth - 1)
+        return Deferred(lambda: t)
+    return Branch(random_forest(rng, depth - 1), random_forest(rng, depth - 1))
+
+
+def test_iter_trees_expands_in_order():
+    rng = Random(0)
+    for _ in range(500):
+        forest = random_forest(rng, 5)
+        trees = list(iter_trees(forest))
+        assert trees == list(expand(forest))
+        assert count_trees(forest) == len(trees)
+
+
+def test_forests_hold_the_parses_of_lists():
+    for n in range(7):
+        forest = parse_forest(ambiguous_tokens(n), ambiguous_grammar())
+        trees = parse(ambiguous_tokens(n), ambiguous_grammar())
+        assert count_trees(forest) == len(trees)
+        assert sorted(map(repr, iter_trees(forest))) == sorted(map(repr, trees))
+
+
+def test_forests_share_subtrees():
+    # 208012 parses, in a forest which is polynomial in the input.
+    forest = parse_forest(ambiguous_tokens(12), ambiguous_grammar())
+    assert count_trees(forest) == 208012
+    nodes = set()
+    stack = [forest]
+    while stack:
+        t = stack.pop()
+        if id(t) in nodes:
+            continue
+        nodes.add(id(t))
+        if isinstance(t, Packed):
+            stack.extend(t.alternatives)
+        elif isinstance(t, Branch):
+            stack.extend((t.left, t.right))
+        elif isinstance(t, Reduction):
+            stack.append(t.tree)
+        elif isinstance(t, Deferred):
+            stack.append(t.forest)
+    assert len(nodes) < 10000
+
+
+def test_reductions_are_applied_when_trees_are_extracted():
+    applied = []
+
+    def f(t: Tree) -> Tree:
+        applied.append(t)
+        return wrap(t)
+
+    forest = parse_forest(['a'], alt(red(tok('a'), f), tok('a')))
+    assert isinstance(forest, Packed)
+    assert not applied
+    assert list(iter_trees(forest)) == [wrap(Leaf('a')), Leaf('a')]
+    assert applied == [Leaf('a')]
+
+
+def test_pack():
+    a = Leaf('a')
+    b = Leaf('b')
+    assert pack([]) == []
+    assert pack([a]) == [a]
+    assert pack([a, Packed((b, a))]) == [Packed((a, b, a))]
+
+
+def test_parse_iter_starts_with_parse_first():
+    trees = parse_iter(ambiguous_tokens(12), ambiguous_grammar(), ParseSession(forest=True))
+    first = next(trees)
+    assert first == parse_first(ambiguous_tokens(12), ambiguous_grammar())
+    assert next(trees) != first
@@ -0,0 +1,65 @@
+from benchmarks.grammars import minpy_source
+
+from derpgen.generate import generate_parser_module
+from derpgen.grammar import Node, build_grammar_from_file, compile_grammar, compile_lexer
+from derpgen.grammar.pwd import parse
+
+from importlib.util import module_from_spec, spec_from_file_location
+
+import sys
+
+
+def load_module(grammar_file: str, path) -> object:
+    module_file = path / 'generated.py'
+    module_file.write_text(generate_parser_module(grammar_file))
+    spec = spec_from_file_location('generated', module_file)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def plain(value) -> object:
+    # Nodes of compiled grammars and of generated modules, as comparable (name, fields) pairs.
+    if isinstance(value, Node):
+        return value.name, {name: plain(v) for name, v in value.fields.items() if v is not None}
+    if hasattr(value, '__slots__') and value.__class__.__name__ not in ('Empty', 'Leaf', 'Branch'):
+        return value.__class__.__name__, {name: plain(getattr(value, name)) for name in value.__slots__
+                                          if getattr(value, name) is not None}
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    return value
+
+
+def test_generated_minpy_parses_like_compiled_grammar(tmp_path):
+    module = load_module('tests/minpy.grammar', tmp_path)
+    grammar = build_grammar_from_file('tests/minpy.grammar')
+    values = list(compile_lexer(grammar).values(minpy_source(60)))
+    expected = parse(values, compile_grammar(grammar).start)
+    assert expected
+    assert sorted(map(repr, map(plain, module.parse(values)))) == sorted(map(repr, map(plain, expected)))
+
+
+def nested_source(depth: int) -> str:
+    return 'def f ( ) { ' + 'while 1 { ' * depth + 'pass' + ' }' * depth + ' }'
+
+
+def test_generated_minpy_parses_nested_statements(tmp_path):
+    # Derivatives, compactions and reductions are taken with explicit stacks, so nesting needs no more frames.
+    module = load_module('tests/minpy.grammar', tmp_path)
+    grammar = build_grammar_from_file('tests/minpy.grammar')
+    values = list(compile_lexer(grammar).values(nested_source(50)))
+    expected = parse(values, compile_grammar(grammar).start)
+    # The recursion limit is lowered to the current depth of the stack, plus fewer frames than the input nests.
+    depth = 0
+    frame = sys._getframe()
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(depth + 50)
+    try:
+        trees = module.parse(values)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert len(trees) == 1
+    assert repr(plain(trees[0])) == repr(plain(expected[0]))
@@ -0,0 +1,65 @@
+from benchmarks.grammars import minpy_source
+
+from derpgen.grammar import build_grammar_from_file, compile_lexer
+from derpgen.grammar.lexer import Lexer, LexerException
+
+from io import BytesIO, StringIO
+from mmap import ACCESS_READ, mmap
+
+import pytest
+import re
+
+
+def kinds(lexer: Lexer, text: str):
+    return [(lexeme.kind, lexeme.text) for lexeme in lexer.tokens(text)]
+
+
+def test_longest_match():
+    lexer = Lexer({'=': '=', '==': '==', 'if': 'if'}, [('ID', re.compile(r'[a-z]+')), ('NUM', re.compile(r'\d+'))])
+    assert kinds(lexer, 'a == b=c iffy if 12') == [
+        ('ID', 'a'), ('==', '=='), ('ID', 'b'), ('=', '='), ('ID', 'c'), ('ID', 'iffy'), ('if', 'if'), ('NUM', '12'),
+    ]
+
+
+def test_literals_are_preferred_over_expressions():
+    lexer = Lexer({'if': 'IF'}, [('ID', re.compile(r'[a-z]+')), ('WORD', re.compile(r'[a-z]+'))])
+    assert kinds(lexer, 'if iff') == [('IF', 'if'), ('ID', 'iff')]
+
+
+def test_skip_patterns_with_groups():
+    lexer = Lexer({'+': '+'}, [('NUM', re.compile(r'\d+'))], skip=r'(\s|(#[^\n]*))+')
+    assert kinds(lexer, '1 + # one\n 2') == [('NUM', '1'), ('+', '+'), ('NUM', '2')]
+
+
+def test_expressions_with_groups():
+    lexer = Lexer({}, [('STR', re.compile(r'''(['"]).*?\1''')), ('ID', re.compile(r'(?P<first>[a-z])\w*')),
+                       ('KEY', re.compile(r'(?i:key)'))])
+    assert kinds(lexer, '"a\'b" \'c\' x1 KEY') == [('STR', '"a\'b"'), ('STR', "'c'"), ('ID', 'x1'), ('KEY', 'KEY')]
+
+
+def test_offsets_and_errors():
+    lexer = Lexer({'+': '+'}, [('NUM', re.compile(r'\d+'))])
+    assert [lexeme.offset for lexeme in lexer.tokens(' 1 +22')] == [1, 3, 4]
+    with pytest.raises(LexerException) as info:
+        list(lexer.tokens('1 + x'))
+    assert info.value.offset == 4
+
+
+def test_streams_match_text():
+    lexer = compile_lexer(build_grammar_from_file('tests/minpy.grammar'))
+    text = minpy_source(100) + ' "é, ü and \\"ß\\""'
+    expected = list(lexer.tokens(text))
+    # Tokens cross the boundaries of chunks this small, and multi-byte characters are split between them.
+    for chunk_size in (16, 17, 64):
+        assert list(lexer.tokens_from_stream(StringIO(text), chunk_size)) == expected
+        assert list(lexer.tokens_from_stream(BytesIO(text.encode()), chunk_size)) == expected
+    assert list(lexer.values_from_stream(StringIO(text), 16)) == list(lexer.values(text))
+
+
+def test_memory_mapped_files(tmp_path):
+    lexer = compile_lexer(build_grammar_from_file('tests/minpy.grammar'))
+    text = minpy_source(100)
+    path = tmp_path / 'source.py'
+    path.write_text(text)
+    with open(path, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as mapped:
+        assert list(lexer.tokens_from_stream(mapped, 32)) == list(lexer.tokens(text))
@@ -0,0 +1,175 @@
+"""
+Inputs much longer than the recursion limit, which the parsers must handle without recursing once per value, and inputs
+which nest deeply, which they must handle without recursing once per level.
+"""
+
+from benchmarks.grammars import arithmetic_grammar
+
+from derpgen.grammar.pwd import *
+from derpgen.utility import ParseSession
+
+from contextlib import contextmanager
+from typing import List
+
+import pytest
+import sys
+
+
+LENGTH = 5000
+
+
+def right_recursion() -> Grammar:
+    # S ::= 'a' S | 'a'
+    d: GrammarDict = {}
+    s = ref('S', d)
+    d['S'] = alt(seq('a', s), 'a')
+    return s
+
+
+def left_recursion() -> Grammar:
+    # S ::= S 'a' | 'a'
+    d: GrammarDict = {}
+    s = ref('S', d)
+    d['S'] = alt(seq(s, 'a'), 'a')
+    return s
+
+
+def repetition() -> Grammar:
+    return rep('a')
+
+
+GRAMMARS = [right_recursion, left_recursion, repetition]
+
+
+def count_leaves(t: Tree) -> int:
+    # Trees are as deep as the input is long, so they are walked with an explicit stack.
+    count = 0
+    stack = [t]
+    while stack:
+        t = stack.pop()
+        if isinstance(t, Branch):
+            stack.append(t.left)
+            stack.append(t.right)
+        elif isinstance(t, Leaf):
+            count += 1
+    return count
+
+
+@pytest.mark.parametrize('grammar', GRAMMARS)
+def test_parse(grammar):
+    trees = parse(['a'] * LENGTH, grammar())
+    assert len(trees) == 1
+    assert count_leaves(trees[0]) == LENGTH
+
+
+@pytest.mark.parametrize('grammar', GRAMMARS)
+def test_parse_forest_mode(grammar):
+    trees = parse(['a'] * LENGTH, grammar(), ParseSession(forest=True))
+    assert len(trees) == 1
+    assert count_leaves(trees[0]) == LENGTH
+
+
+@pytest.mark.parametrize('grammar', GRAMMARS)
+def test_recognize(grammar):
+    assert recognize(['a'] * LENGTH, grammar())
+    assert not recognize(['a'] * LENGTH + ['b'], grammar())
+
+
+@pytest.mark.parametrize('grammar', GRAMMARS)
+def test_count_parses(grammar):
+    assert count_parses(['a'] * LENGTH, grammar()) == 1
+
+
+@pytest.mark.parametrize('grammar', GRAMMARS)
+def test_parse_iter(grammar):
+    trees = list(parse_iter(['a'] * LENGTH, grammar()))
+    assert len(trees) == 1
+    assert count_leaves(trees[0]) == LENGTH
+
+
+@pytest.mark.parametrize('grammar', GRAMMARS)
+def test_parse_first(grammar):
+    tree = parse_first(['a'] * LENGTH, grammar())
+    assert tree is not None
+    assert count_leaves(tree) == LENGTH
+    assert parse_first(['a'] * LENGTH + ['b'], grammar()) is None
+
+
+@pytest.mark.parametrize('grammar', GRAMMARS)
+def test_parse_cubic(grammar):
+    trees = parse_cubic(['a'] * LENGTH, grammar())
+    assert len(trees) == 1
+    assert count_leaves(trees[0]) == LENGTH
+    assert parse_cubic(['a'] * LENGTH + ['b'], grammar()) == []
+
+
+DEPTH = 50
+
+# The parsers may use this many frames, whatever the depth of the input, which is far fewer than they would need to
+# recurse once per level of nesting (each level of the arithmetic grammar goes through several rules).
+FRAMES = 100
+
+
+def nested(depth: int) -> List[str]:
+    return ['('] * depth + ['1'] + [')'] * depth
+
+
+@contextmanager
+def frames_left(frames: int):
+    # Lowers the recursion limit to the current depth of the stack, plus the given number of frames.
+    depth = 0
+    frame = sys._getframe()
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(depth + frames)
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+@pytest.mark.parametrize('session', [ParseSession, lambda: ParseSession(forest=True)])
+def test_parse_nested(session):
+    with frames_left(FRAMES):
+        trees = parse(nested(DEPTH), arithmetic_grammar(), session())
+        assert parse(nested(DEPTH)[:-1], arithmetic_grammar(), session()) == []
+    assert len(trees) == 1
+    assert count_leaves(trees[0]) == 2 * DEPTH + 1
+
+
+def test_recognize_nested():
+    with frames_left(FRAMES):
+        assert recognize(nested(DEPTH), arithmetic_grammar())
+        assert not recognize(nested(DEPTH)[:-1], arithmetic_grammar())
+        assert not recognize(nested(DEPTH) + [')'], arithmetic_grammar())
+
+
+def test_count_parses_nested():
+    with frames_left(FRAMES):
+        assert count_parses(nested(DEPTH), arithmetic_grammar()) == 1
+
+
+def test_parse_cubic_nested():
+    with frames_left(FRAMES):
+        trees = parse_cubic(nested(DEPTH), arithmetic_grammar())
+        assert parse_cubic(nested(DEPTH)[:-1], arithmetic_grammar()) == []
+    assert len(trees) == 1
+    assert count_leaves(trees[0]) == 2 * DEPTH + 1
+
+
+def test_compact_nested():
+    # A grammar built without the constructors, whose sequences nest as deeply as those of a derivative can.
+    g = Tok('a')
+    for _ in range(10 * DEPTH):
+        g = Seq(Alt(Nil(), Tok('(')), Seq(g, Tok(')')))
+    with ParseSession(), frames_left(FRAMES):
+        g = make_compact(g)
+    depth = 0
+    while isinstance(g, Seq):
+        assert g.g1 == Tok('(') and g.g2.g2 == Tok(')')
+        g = g.g2.g1
+        depth += 1
+    assert g == Tok('a')
+    assert depth == 10 * DEPTH
@@ -0,0 +1,88 @@
+from derpgen.grammar.pwd import *
+from derpgen.utility import EqType, ParseSession, memoize
+
+from gc import collect
+from weakref import ref as weak_ref
+
+
+class Node:
+    __slots__ = ('memo', '__weakref__')
+
+    def __init__(self):
+        self.memo = None
+
+
+class Result:
+    pass
+
+
+calls = []
+
+
+@memoize(EqType.Eq, EqType.Equal, slot='memo')
+def result_of(o: Node, x: int) -> Result:
+    calls.append(x)
+    return Result()
+
+
+@memoize(EqType.Eq, slot='memo', weak=True)
+def weak_result_of(o: Node) -> Result:
+    calls.append(o)
+    return Result()
+
+
+def test_slots_hold_the_latest_result_of_the_session():
+    calls.clear()
+    o = Node()
+    session = ParseSession()
+    with session:
+        r = result_of(o, 1)
+        assert result_of(o, 1) is r
+        assert result_of(o, 2) is not r
+        assert result_of(o, 1) is not r
+    with ParseSession():
+        result_of(o, 1)
+    assert calls == [1, 2, 1, 1]
+
+
+def test_weak_slots_do_not_keep_results_alive():
+    calls.clear()
+    o = Node()
+    with ParseSession():
+        r = weak_result_of(o)
+        assert weak_result_of(o) is r
+        dead = weak_ref(r)
+        del r
+        collect()
+        assert dead() is None
+        weak_result_of(o)
+    assert calls == [o, o]
+
+
+def test_prime():
+    o = Node()
+    r = Result()
+    with ParseSession():
+        weak_result_of.prime(r, o)
+        assert weak_result_of(o) is r
+
+
+def test_fixed_points_settle_on_the_nodes():
+    rd: GrammarDict = {}
+    s = ref('S', rd)
+    rd['S'] = alt(seq(s, 'a'), eps([Empty()]))
+    with ParseSession():
+        assert is_nullable(s)
+    assert s.nullable_memo is True
+    assert rd['S'].nullable_memo is True
+
+
+def test_derivatives_are_not_kept_alive_by_their_grammars():
+    g = seq(tok('a'), tok('b'))
+    with ParseSession():
+        d = derive(g, 'a')
+        assert derive(g, 'a') is d
+        dead = weak_ref(d)
+        del d
+        collect()
+        assert dead() is None
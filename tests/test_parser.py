@@ -0,0 +1,40 @@
+from benchmarks.grammars import arithmetic_grammar
+
+from derpgen.grammar.pwd import *
+
+import pytest
+
+
+def test_rejected_values_are_reported():
+    parser = Parser(arithmetic_grammar())
+    parser.feed_many(['(', '1', '+'])
+    with pytest.raises(ParseException) as info:
+        parser.feed(')')
+    assert info.value.index == 3
+    assert info.value.value == ')'
+    assert info.value.expected.toks == frozenset(['('])
+    assert [p.pattern for p in info.value.expected.pats] == [r'-?\d+']
+    assert "Unexpected value ')' at index 3; expected one of '(', /-?\\d+/" == str(info.value)
+
+
+def test_rejected_values_leave_the_parser_as_it_was():
+    parser = Parser(arithmetic_grammar())
+    parser.feed_many(['(', '1', '+'])
+    with pytest.raises(ParseException):
+        parser.feed(')')
+    with pytest.raises(ParseException) as info:
+        parser.feed('+')
+    assert info.value.index == 3
+    parser.feed_many(['2', ')'])
+    assert parser.accepts()
+    assert parser.finish() == parse(['(', '1', '+', '2', ')'], arithmetic_grammar())
+
+
+def test_the_end_of_the_input_is_expected_after_a_complete_parse():
+    parser = Parser(seq(tok('a'), tok('b')))
+    parser.feed_many(['a', 'b'])
+    with pytest.raises(ParseException) as info:
+        parser.feed('c')
+    assert info.value.index == 2
+    assert not info.value.expected.toks and not info.value.expected.pats
+    assert str(info.value).endswith('expected the end of the input')
@@ -0,0 +1,91 @@
+from derpgen.grammar.pwd import *
+from derpgen.utility import EqType, OperationCounts, ParseSession, current_session, fix, memoize
+
+from threading import Thread
+
+
+calls = []
+
+
+@memoize(EqType.Eq)
+def remember(x: int) -> int:
+    calls.append(x)
+    return x
+
+
+@fix(lambda: 0, EqType.Eq, EqType.Equal)
+def reachable(graph: dict, node: str) -> int:
+    # A monotone function over the nodes of a (possibly cyclic) graph, bounded by the size of the graph.
+    return min(len(graph), 1 + sum(reachable(graph, n) for n in graph[node]))
+
+
+def test_with_blocks_activate_sessions():
+    default = current_session()
+    outer = ParseSession()
+    inner = ParseSession()
+    with outer:
+        assert current_session() is outer
+        with inner:
+            assert current_session() is inner
+        assert current_session() is outer
+    assert current_session() is default
+
+
+def test_threads_have_their_own_default_sessions():
+    sessions = []
+    threads = [Thread(target=lambda: sessions.append(current_session())) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(s) for s in sessions + [current_session()]}) == 3
+
+
+def test_sessions_do_not_share_results():
+    calls.clear()
+    first = ParseSession()
+    with first:
+        remember(1)
+        remember(1)
+    with ParseSession():
+        remember(1)
+    with first:
+        remember(1)
+    assert calls == [1, 1]
+
+
+def test_fixed_points_are_solved_per_session():
+    graph = {'a': ['b'], 'b': ['a', 'c'], 'c': []}
+    for _ in range(2):
+        stats = OperationCounts()
+        with ParseSession(stats=stats):
+            assert reachable(graph, 'a') == 3
+            assert reachable(graph, 'c') == 1
+        assert stats.fix_queries == {'reachable': 1}
+
+
+def test_aging_drops_unused_entries():
+    session = ParseSession(max_entries=10)
+    table = session.table('owner')
+    for i in range(20):
+        table[i] = i
+    session.collect()
+    assert table.get(0) == 0
+    for i in range(20, 40):
+        table[i] = i
+    session.collect()
+    assert 0 in table and 20 in table
+    assert 1 not in table
+    session.release()
+    assert session.size == 0
+
+
+def test_parsers_derive_in_their_own_sessions():
+    rd: GrammarDict = {}
+    s = ref('S', rd)
+    rd['S'] = alt(seq(s, 'a'), 'a')
+    stats = [OperationCounts(), OperationCounts()]
+    for counts in stats:
+        assert len(parse(['a'] * 20, s, ParseSession(stats=counts))) == 1
+    # Derivatives are not shared between sessions, but what the grammar's nodes settle about themselves is.
+    assert stats[0].misses['derive'] == stats[1].misses['derive'] > 0
@@ -0,0 +1,47 @@
+from benchmarks.grammars import arithmetic_grammar
+
+from derpgen.grammar.pwd import *
+from derpgen.utility import ParseSession
+
+
+def test_each_value_is_recorded():
+    seen = []
+    stats = ParseStats(on_step=seen.append)
+    values = ['(', '1', '+', '2', ')', '*', '3']
+    parser = Parser(arithmetic_grammar(), ParseSession(stats=stats))
+    # The grammar is compacted before the first value, and the rules this applies are counted outside the records.
+    initial = stats.totals()
+    assert not stats.steps
+    parser.feed_many(values)
+    assert parser.finish() == parse(values, arithmetic_grammar())
+    assert seen == stats.steps
+    assert [step.index for step in stats.steps] == list(range(len(values)))
+    for step in stats.steps:
+        assert step.nodes > 0
+        assert 0 <= step.eps_nodes <= step.nodes
+        assert step.max_eps_trees <= step.eps_trees
+        assert step.derives > 0
+        assert step.seconds >= 0
+    derives, rewrites, _ = stats.totals()
+    assert sum(step.derives for step in stats.steps) == derives - initial[0] == stats.calls('derive')
+    assert sum(step.rewrites for step in stats.steps) == rewrites - initial[1]
+    assert stats.rules['Alt/empty-left'] > 0
+
+
+def test_steps_need_not_be_kept_or_measured():
+    seen = []
+    stats = ParseStats(on_step=seen.append, keep_steps=False, measure=False)
+    parse(['1', '+', '2'], arithmetic_grammar(), ParseSession(stats=stats))
+    assert stats.steps == []
+    assert [step.index for step in seen] == [0, 1, 2]
+    assert all(step.nodes == step.eps_nodes == step.eps_trees == 0 for step in seen)
+    assert stats.as_dict()['steps'] == []
+
+
+def test_sizes_follow_the_derivatives():
+    # Each open parenthesis leaves one more pending `)`, and so a larger derivative.
+    stats = ParseStats()
+    parser = Parser(arithmetic_grammar(), ParseSession(stats=stats))
+    parser.feed_many(['('] * 4)
+    nodes = [step.nodes for step in stats.steps]
+    assert nodes == sorted(nodes) and nodes[0] < nodes[-1]
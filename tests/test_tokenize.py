@@ -0,0 +1,92 @@
+from derpgen.grammar.tokenize import *
+from derpgen.grammar.tokenize.tokenizer import LineTokenizer, TokenizerError
+
+from glob import glob
+from io import BufferedReader, BytesIO, StringIO
+from mmap import ACCESS_READ, mmap
+from typing import List, Optional
+
+import pytest
+
+
+GRAMMAR_FILES = sorted(glob('tests/*.grammar'))
+
+
+def read(grammar_file: str) -> str:
+    with open(grammar_file) as f:
+        return f.read()
+
+
+def reference_line_tokens(line: str, line_no: int) -> List[Optional[Token]]:
+    # The tokens of a line as found by matching each of the types in turn, keeping the first of the longest matches.
+    # When no type matches, the tokens found so far are returned, followed by None.
+    tokens: List[Optional[Token]] = []
+    position = 1
+    while line:
+        best = None
+        best_type = None
+        for token_type in TokenTypes:
+            m = token_type.regex.match(line)
+            if m is not None and (best is None or len(m.group(0)) > len(best.group(0))):
+                best = m
+                best_type = token_type
+        if best is None:
+            return tokens + [None]
+        text = best.groups()[0] if best.groups() else best.group(0)
+        line = line[len(best.group(0)):]
+        position += len(text)
+        tokens.append(Token(text, line_no, position, best_type))
+    tokens.append(Token('\n', line_no, position + 1, TokenTypes.NEWLINE))
+    return tokens
+
+
+TIES = [
+    # Matches of the same length go to the earliest type, longer ones to the longest.
+    'abc aB a_b A_B Ab AB ABc',
+    '=<< = ^= ::= : | %tokens% %a b%',
+    '"a \\" b" \'c\' "" \'\'',
+    'rule ::= [ x ] { y } < z > ( w ) # comment',
+    '   ',
+    '',
+]
+
+
+def line_tokens(line: str, line_no: int) -> List[Optional[Token]]:
+    tokens: List[Optional[Token]] = []
+    try:
+        tokens.extend(LineTokenizer(line, line_no))
+    except TokenizerError:
+        tokens.append(None)
+    return tokens
+
+
+# Some lines of `tests/grammar.grammar` hold characters which are not tokens, such as `*`, and fail in both.
+@pytest.mark.parametrize('line', TIES + [line for grammar_file in GRAMMAR_FILES
+                                         for line in read(grammar_file).splitlines()])
+def test_lines_tokenize_as_with_a_match_per_type(line):
+    assert line_tokens(line, 7) == reference_line_tokens(line, 7)
+
+
+def test_invalid_tokens():
+    tokenizer = LineTokenizer('a ? b', 1)
+    with pytest.raises(TokenizerError):
+        list(tokenizer)
+    assert tokenizer.remaining_text == '? b'
+
+
+STREAMED_FILES = ['tests/arithmetic.grammar', 'tests/minpy.grammar']
+
+
+@pytest.mark.parametrize('grammar_file', STREAMED_FILES)
+def test_streams_tokenize_as_text(grammar_file, tmp_path):
+    # Mixed line endings and multi-byte characters, read through a buffer so small that tokens cross its boundaries.
+    text = read(grammar_file).replace('\n', '\r\n', 3) + "\rlast ::= 'é' 'ü'\n"
+    expected = list(tokenize_text(text))
+    data = text.encode()
+    assert list(tokenize_stream(StringIO(text, newline=''))) == expected
+    assert list(tokenize_stream(BufferedReader(BytesIO(data), buffer_size=8))) == expected
+    path = tmp_path / 'streamed.grammar'
+    path.write_bytes(data)
+    with open(path, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as mapped:
+        assert list(tokenize_stream(mapped)) == expected
+    assert list(tokenize_file(grammar_file)) == list(tokenize_text(read(grammar_file)))